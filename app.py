@@ -1,35 +1,149 @@
-import customtkinter as ctk
+import time
 
-# Import all componentes
+# Taken before anything else is imported, the startup report counts from here
+STARTED_AT = time.perf_counter()
+
+import argparse
+import logging
+import threading
+from contextlib import contextmanager
+
+# Import the model componentes, the GUI toolkit is imported inside main() once the database is ready
 from model.database import Database
+from model.instrumentation import Instrumentation
+from model.person_cache import PersonCache
+from model.person_dedup import PersonDeduplicator
+from model.person_index import PersonIndex
 from model.person_model import PersonModel
-from controller.person_controller import PersonController
-from view.person_view import PersonView
+from model.sharded_database import ShardedDatabase
+from model.sharded_person_model import ShardedPersonModel
+
+class StartupTimer:
+    """Measures how long each startup phase takes, for the --profile-startup report"""
+    def __init__(self):
+        self.phases = [("imports", time.perf_counter() - STARTED_AT)]
+
+    @contextmanager
+    def phase(self, name: str):
+        """Time the block as one startup phase"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases.append((name, time.perf_counter() - start))
+
+    def report_first_frame(self, start: float):
+        """Record the first frame phase, started at start, and print the report"""
+        self.phases.append(("first frame", time.perf_counter() - start))
+        self.report()
+
+    def report(self):
+        """Print every phase and the total time until the window is ready"""
+        print("Startup phases:")
+        for name, seconds in self.phases:
+            print(f"  {name:<12} {seconds * 1000:8.1f} ms")
+        print(f"  {'total':<12} {(time.perf_counter() - STARTED_AT) * 1000:8.1f} ms")
 
 def main():
-    db = Database("database.db")
-    db.create_tables()
-    
-    # Set the appearance and color theme for customtkinter
-    ctk.set_appearance_mode("Dark")
-    #ctk.set_default_color_theme("Default")
-    
-    # Create the window main
-    window = ctk.CTk()
-    
-    # Instantiate Model and View
-    model = PersonModel()
-    view = PersonView(window)
-    
-    # Instantiate Controller, passing Model and View to link them
-    # The Controller handles the wiring 
-    controller = PersonController(model, view)
-    
+    parser = argparse.ArgumentParser(description="Person registration")
+    parser.add_argument("--server", help="URL of a registry server (server.py) to use instead of the local database")
+    parser.add_argument("--shards", type=int, default=0,
+                        help="Split the registry over this many database files (default: a single file)")
+    parser.add_argument("--profile-startup", action="store_true", help="Report the time spent in each startup phase")
+    parser.add_argument("--profile-gui", nargs="?", const="gui_profile.jsonl", metavar="FILE",
+                        help="Measure event loop lag and the time of each handler and widget update, "
+                             "appending a report every minute to FILE (default: gui_profile.jsonl)")
+    args = parser.parse_args()
+    timer = StartupTimer()
+
+    # Model errors and the slow-query log are written through logging
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    db = None
+    with timer.phase("database"):
+        if args.shards and not args.server:
+            db = ShardedDatabase("database.db", args.shards, instrumentation=Instrumentation(slow_query_ms=100))
+        elif not args.server:
+            db = Database("database.db", instrumentation=Instrumentation(slow_query_ms=100))
+        # Every shard must be on the current schema, the error is already logged
+        if db is not None and not db.create_tables():
+            db.close()
+            raise SystemExit(1)
+
+    with timer.phase("gui imports"):
+        import customtkinter as ctk
+        from controller.dispatcher import Dispatcher
+        from controller.gui_profiler import GuiProfiler
+        from controller.person_controller import PersonController
+        from view.person_view import PersonView
+
+    with timer.phase("window"):
+        # Set the appearance and color theme for customtkinter
+        ctk.set_appearance_mode("Dark")
+        #ctk.set_default_color_theme("Default")
+
+        # Create the window main
+        window = ctk.CTk()
+
+    deduplicator = None
+    with timer.phase("view"):
+        # Instantiate Model and View
+        # The cache TTL bounds how stale a row changed by another station can be
+        if args.server:
+            # Only remote stations pay for loading the HTTP client
+            from model.remote_person_model import RemotePersonModel
+            model = RemotePersonModel(args.server)
+        elif args.shards:
+            model = ShardedPersonModel(db, PersonCache(capacity=1024, ttl=30))
+        else:
+            # The ID index is built in the background, lookups use SQLite until it is ready
+            index = PersonIndex()
+            threading.Thread(target=index.build, args=(db,), name="person-index", daemon=True).start()
+            model = PersonModel(db, PersonCache(capacity=1024, ttl=30), index=index)
+            # Duplicates are looked for within one database, so only without shards
+            deduplicator = PersonDeduplicator(db)
+        if not args.server:
+            # Old change feed rows are only needed by stations far behind, trimmed off the UI thread
+            threading.Thread(target=model.prune_changes, name="prune-changes", daemon=True).start()
+        view = PersonView(window)
+
+    with timer.phase("controller"):
+        # Worker threads that run the database operations off the UI thread
+        dispatcher = Dispatcher(window)
+
+        profiler = None
+        if args.profile_gui:
+            profiler = GuiProfiler(window, args.profile_gui)
+            profiler.instrument_view(view)
+
+        # Instantiate Controller, passing Model and View to link them
+        # The Controller handles the wiring
+        controller = PersonController(model, view, dispatcher, deduplicator, profiler)
+
+    if args.profile_startup:
+        # Reported once the event loop is idle, after the first frame is drawn
+        window.after_idle(timer.report_first_frame, time.perf_counter())
+
+    if profiler is not None:
+        profiler.start()
+
     # Start the application
     print("Application started")
     window.mainloop()
+
+    if profiler is not None:
+        # The window is gone, write the last samples without touching it
+        profiler.report()
+        print(f"GUI profile written to {args.profile_gui}")
+
+    # Let pending writes finish, then release the pooled database connections
+    dispatcher.shutdown()
+    if args.shards and not args.server:
+        model.close()
+    if db is not None:
+        db.close()
     print("Application closed")
-    
-    
+
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,49 @@
+import random
+
+# Field limits of the person table (see Database.create_tables)
+ID_LENGTH = 11
+NAME_LENGTH = 20
+ADDRESS_LENGTH = 100
+PHONE_LENGTH = 11
+
+# Multiplier coprime with 10**11, so identity_document(i) is a bijection over [0, 10**11)
+ID_STRIDE = 7_919_393
+
+NAMES = (
+    "Juan", "Maria", "Jose", "Ana", "Luis", "Carmen", "Carlos", "Laura", "Miguel", "Sofia",
+    "Pedro", "Lucia", "Jorge", "Elena", "Pablo", "Marta", "Diego", "Paula", "Andres", "Isabel"
+)
+SURNAMES = (
+    "Garcia", "Rodriguez", "Gonzalez", "Fernandez", "Lopez", "Martinez", "Sanchez", "Perez",
+    "Gomez", "Martin", "Jimenez", "Ruiz", "Hernandez", "Diaz", "Moreno", "Alvarez", "Romero",
+    "Alonso", "Gutierrez", "Navarro", "Torres", "Dominguez", "Vazquez", "Ramos", "Gil", "Parra"
+)
+STREETS = (
+    "Calle Mayor", "Avenida del Sol", "Calle Real", "Paseo de la Castellana", "Calle Luna",
+    "Avenida Libertad", "Calle del Rio", "Plaza Nueva", "Camino Viejo", "Calle Alta"
+)
+CITIES = ("Madrid", "Sevilla", "Valencia", "Bilbao", "Zaragoza", "Malaga", "Murcia", "Granada")
+
+def identity_document(index: int) -> str:
+    """Return the unique, scattered 11-digit identity document of the index-th synthetic person"""
+    return f"{(index * ID_STRIDE) % 10 ** ID_LENGTH:0{ID_LENGTH}d}"
+# End of identity_document
+
+def person(index: int, seed: int = 0) -> tuple:
+    """Return the index-th synthetic person, always the same for the same index and seed"""
+    rng = random.Random(seed * 1_000_003 + index)
+    address = f"{rng.choice(STREETS)} {rng.randint(1, 300)}, {rng.choice(CITIES)}"
+    return (
+        identity_document(index),
+        rng.choice(NAMES)[:NAME_LENGTH],
+        f"{rng.choice(SURNAMES)} {rng.choice(SURNAMES)}"[:NAME_LENGTH],
+        address[:ADDRESS_LENGTH],
+        f"6{rng.randrange(10 ** (PHONE_LENGTH - 1)):0{PHONE_LENGTH - 1}d}"
+    )
+# End of person
+
+def persons(count: int, start: int = 0, seed: int = 0):
+    """Yield count synthetic persons starting at index start"""
+    for index in range(start, start + count):
+        yield person(index, seed)
+# End of persons
\ No newline at end of file
@@ -0,0 +1,245 @@
+"""
+Load test: N registration clerks working on one shared registry file at the same time, as threads
+or as separate processes (like separate stations), each running a mix of PersonModel calls.
+Reports throughput, tail latency, busy/locked errors, retries and failed calls per run, to size
+how many stations one registry takes and to tune the busy timeout and retry policy.
+Usage: python -m benchmarks.load_test --clerks 1 2 4 8 --mode threads processes --duration 10 --mix create=10,read=70,update=15,delete=5
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import sqlite3
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from benchmarks import generator
+from benchmarks.model_benchmark import fill, percentile
+from model.database import Database
+from model.person_model import PersonModel
+from model.retry import RetryPolicy
+
+OPERATIONS = ("create", "read", "update", "delete")
+MIX = "create=10,read=70,update=15,delete=5"
+CLERKS = (1, 2, 4, 8)
+MODES = ("threads", "processes")
+# Persons in the registry before the clerks start
+SIZE = 10_000
+DURATION = 10.0
+# Time given to every clerk to open its connections before the common start
+STARTUP = 1.0
+# Each clerk creates persons in its own range of synthetic indexes, so creates never collide
+CLERK_RANGE = 1_000_000
+
+def parse_mix(text: str) -> dict[str, float]:
+    """Parse "create=10,read=70,..." into operation weights"""
+    mix = {}
+    for item in text.split(","):
+        operation, _, weight = item.partition("=")
+        operation = operation.strip()
+        if operation not in OPERATIONS:
+            raise ValueError(f"Unknown operation '{operation}', use: {', '.join(OPERATIONS)}")
+        mix[operation] = float(weight)
+    if not any(mix.values()):
+        raise ValueError("The mix needs at least one operation with a weight")
+    return mix
+# End of parse_mix
+
+def open_database(config: dict) -> Database:
+    """Open the registry the way a station does, with the busy timeout and retry policy under test"""
+    return Database(
+        config["db"], journal_mode=config["journal_mode"], synchronous=config["synchronous"],
+        busy_timeout_ms=config["busy_timeout_ms"],
+        retry_policy=RetryPolicy(config["retry_attempts"], config["retry_base_ms"] / 1000, config["retry_max_ms"] / 1000)
+    )
+# End of open_database
+
+def clerk(number: int, config: dict, start_at: float, db: Database | None = None) -> dict:
+    """
+    Run one clerk from start_at (time.time()) for the configured duration and return its samples:
+    latencies in seconds and failed calls per operation, and its retry counters unless db is shared.
+    Deletes only remove persons this clerk created, so reads and updates always find their person
+    """
+    own = db is None
+    if own:
+        db = open_database(config)
+    model = PersonModel(db)
+    rng = random.Random(config["seed"] * 7919 + number)
+    operations = list(config["mix"])
+    weights = list(config["mix"].values())
+    next_index = config["size"] + (config["run"] * config["max_clerks"] + number + 1) * CLERK_RANGE
+    created = []
+    latencies = {operation: [] for operation in operations}
+    failures = dict.fromkeys(operations, 0)
+
+    # Open the connections before the clock starts
+    model.read_person(generator.identity_document(0))
+    time.sleep(max(start_at - time.time(), 0))
+    deadline = time.perf_counter() + config["duration"]
+    try:
+        while time.perf_counter() < deadline:
+            operation = rng.choices(operations, weights)[0]
+            if operation == "delete" and not created:
+                operation = "create"
+            start = time.perf_counter()
+            if operation == "create":
+                person = generator.person(next_index, config["seed"])
+                ok = model.create_person(person)
+                if ok:
+                    created.append(person[0])
+                next_index += 1
+            elif operation == "read":
+                ok = model.read_person(generator.identity_document(rng.randrange(config["size"]))) is not None
+            elif operation == "update":
+                person = generator.person(rng.randrange(config["size"]), config["seed"] + rng.randrange(1000))
+                ok = model.update_person((*person[1:], person[0]))
+            else:
+                ok = model.delete_person(created.pop(rng.randrange(len(created))))
+            latencies.setdefault(operation, []).append(time.perf_counter() - start)
+            failures[operation] = failures.get(operation, 0) + (not ok)
+    finally:
+        if own:
+            db.close()
+    return {"latencies": latencies, "failures": failures, "retry": db.retry_policy.snapshot() if own else None}
+# End of clerk
+
+def run(config: dict, mode: str, clerks: int) -> dict:
+    """Run clerks at once in the given mode and merge their samples into one result"""
+    start_at = time.time() + STARTUP
+    shared = None
+    if mode == "processes":
+        with ProcessPoolExecutor(max_workers=clerks) as executor:
+            results = list(executor.map(clerk, range(clerks), [config] * clerks, [start_at] * clerks))
+    else:
+        if config["shared_pool"]:
+            # One Database for all the threads, as inside the server: writes queue on its writer lock
+            shared = open_database(config)
+        try:
+            with ThreadPoolExecutor(max_workers=clerks) as executor:
+                results = list(executor.map(clerk, range(clerks), [config] * clerks, [start_at] * clerks, [shared] * clerks))
+        finally:
+            if shared is not None:
+                shared.close()
+
+    retry = {"busy_errors": 0, "retries": 0, "gave_up": 0}
+    for snapshot in [shared.retry_policy.snapshot()] if shared is not None else [result["retry"] for result in results]:
+        for key in retry:
+            retry[key] += snapshot[key]
+
+    operations = {}
+    total = 0
+    for operation in config["mix"]:
+        samples = sorted(sample for result in results for sample in result["latencies"].get(operation, ()))
+        total += len(samples)
+        operations[operation] = {
+            "calls": len(samples),
+            "failed": sum(result["failures"].get(operation, 0) for result in results),
+            "p50_ms": percentile(samples, 0.50) * 1000,
+            "p95_ms": percentile(samples, 0.95) * 1000,
+            "p99_ms": percentile(samples, 0.99) * 1000,
+            "max_ms": samples[-1] * 1000 if samples else 0.0
+        }
+    every = sorted(sample for result in results for samples in result["latencies"].values() for sample in samples)
+    return {
+        "mode": mode,
+        "clerks": clerks,
+        "calls": total,
+        "throughput_ops_s": total / config["duration"],
+        "p99_ms": percentile(every, 0.99) * 1000,
+        "failed": sum(entry["failed"] for entry in operations.values()),
+        **retry,
+        "operations": operations
+    }
+# End of run
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate concurrent clerks sharing one registry file")
+    parser.add_argument("--clerks", type=int, nargs="+", default=CLERKS, help="Concurrent clerks of each run")
+    parser.add_argument("--mode", nargs="+", choices=MODES, default=MODES,
+                        help="Run clerks as threads of one process, as separate processes, or both")
+    parser.add_argument("--shared-pool", action="store_true",
+                        help="Threads share one Database (as in the server) instead of one each (as separate stations)")
+    parser.add_argument("--mix", default=MIX, help=f"Weights of the operations (default: {MIX})")
+    parser.add_argument("--duration", type=float, default=DURATION, help="Seconds each run lasts")
+    parser.add_argument("--size", type=int, default=SIZE, help="Persons in the registry before the runs")
+    parser.add_argument("--busy-timeout-ms", type=float, default=Database.BUSY_TIMEOUT_MS,
+                        help="SQLite busy timeout of every connection")
+    parser.add_argument("--retry-attempts", type=int, default=RetryPolicy.ATTEMPTS, help="Attempts of a busy write transaction")
+    parser.add_argument("--retry-base-ms", type=float, default=RetryPolicy.BASE_DELAY * 1000, help="Wait before the first retry")
+    parser.add_argument("--retry-max-ms", type=float, default=RetryPolicy.MAX_DELAY * 1000, help="Longest wait between retries")
+    parser.add_argument("--journal-mode", default="WAL", help="PRAGMA journal_mode (WAL, DELETE, ...)")
+    parser.add_argument("--synchronous", default="NORMAL", help="PRAGMA synchronous (OFF, NORMAL, FULL)")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the synthetic registry and the clerks")
+    parser.add_argument("--db", help="Database file to use, a temporary one by default")
+    parser.add_argument("--output", default="load_test_report.json", help="Path of the JSON report")
+    args = parser.parse_args()
+
+    # Failed calls are counted in the report, the model's error log would only flood the output
+    logging.basicConfig(level=logging.CRITICAL)
+    try:
+        mix = parse_mix(args.mix)
+    except ValueError as e:
+        parser.error(str(e))
+
+    directory = None
+    if args.db is None:
+        directory = tempfile.TemporaryDirectory()
+        args.db = os.path.join(directory.name, "load_test.db")
+    config = {
+        "db": args.db,
+        "mix": mix,
+        "duration": args.duration,
+        "size": args.size,
+        "busy_timeout_ms": args.busy_timeout_ms,
+        "retry_attempts": args.retry_attempts,
+        "retry_base_ms": args.retry_base_ms,
+        "retry_max_ms": args.retry_max_ms,
+        "journal_mode": args.journal_mode,
+        "synchronous": args.synchronous,
+        "shared_pool": args.shared_pool,
+        "seed": args.seed,
+        "max_clerks": max(args.clerks),
+        "run": 0
+    }
+
+    results = []
+    try:
+        db = open_database(config)
+        db.create_tables()
+        present = db.write(lambda connection: connection.execute("SELECT COUNT(*) FROM person").fetchone()[0])
+        start = time.perf_counter()
+        fill(PersonModel(db), min(present, args.size), args.size, args.seed)
+        db.close()
+        print(f"Registry of {args.size} persons ready in {time.perf_counter() - start:.1f}s")
+
+        for mode in args.mode:
+            for clerks in args.clerks:
+                result = run(config, mode, clerks)
+                config["run"] += 1
+                results.append(result)
+                print(f"  {mode:<9} {clerks:>3} clerks {result['throughput_ops_s']:>9.0f} ops/s  p99 {result['p99_ms']:.1f}ms  "
+                      f"busy {result['busy_errors']}  retries {result['retries']}  failed {result['failed']}")
+    finally:
+        if directory is not None:
+            directory.cleanup()
+
+    report = {
+        "config": {key: value for key, value in config.items() if key not in ("db", "run")},
+        "environment": {
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "cpus": os.cpu_count()
+        },
+        "results": results
+    }
+    with open(args.output, "w", encoding="utf-8") as file:
+        json.dump(report, file, indent=2)
+    print(f"Report written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
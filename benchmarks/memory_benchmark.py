@@ -0,0 +1,125 @@
+"""
+Memory benchmark of the person records a large listing holds, per representation of a row:
+the tuples SQLite returns by default, dicts keyed by column, sqlite3.Row and the Person records
+PersonModel returns. Reports the bytes each row keeps alive, the peak while reading, the allocated
+blocks per row and the read time, to size how many rows pages, search results and the cache can hold.
+The strings of a row dominate: a Person keeps only 8 bytes (about 2%) less than a tuple and its Python
+row factory reads a few percent slower, its savings are against dicts (112 bytes) and sqlite3.Row (56 bytes).
+Usage: python -m benchmarks.memory_benchmark --sizes 10000 100000 1000000 --output memory_report.json
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import sqlite3
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks.model_benchmark import fill
+from model.database import Database
+from model.person import PERSON_COLUMNS, Person
+from model.person_model import PersonModel
+
+SIZES = (10_000, 100_000, 1_000_000)
+
+def dict_row(cursor, row: tuple) -> dict:
+    """Row factory building the dict a person used to be passed around as"""
+    return dict(zip(PERSON_COLUMNS, row))
+# End of dict_row
+
+# Row factory of each representation, None being SQLite's plain tuples
+ROW_FACTORIES = {
+    "tuple": None,
+    "dict": dict_row,
+    "sqlite3.Row": sqlite3.Row,
+    "Person": Person.from_row
+}
+
+def measure(db: Database, name: str, rows: int) -> dict:
+    """Read rows persons as one listing with the row factory of name and report what it costs"""
+    with db.reader() as connection:
+        cursor = connection.cursor()
+        cursor.row_factory = ROW_FACTORIES[name]
+        gc.collect()
+        blocks = sys.getallocatedblocks()
+        tracemalloc.start()
+        start = time.perf_counter()
+        persons = cursor.execute("SELECT * FROM person ORDER BY identity_document LIMIT ?", (rows,)).fetchall()
+        elapsed = time.perf_counter() - start
+        retained, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        blocks = sys.getallocatedblocks() - blocks
+        count = len(persons)
+        record = sys.getsizeof(persons[0]) if persons else 0
+        del persons
+    return {
+        "representation": name,
+        "rows": count,
+        "record_bytes": record,
+        "retained_bytes_per_row": retained / count if count else 0.0,
+        "peak_bytes_per_row": peak / count if count else 0.0,
+        "blocks_per_row": blocks / count if count else 0.0,
+        "read_us_per_row": elapsed / count * 1e6 if count else 0.0
+    }
+# End of measure
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the memory a large listing of persons takes per row representation")
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES, help="Rows of each listing")
+    parser.add_argument("--representations", nargs="+", choices=ROW_FACTORIES, default=list(ROW_FACTORIES),
+                        help="Row representations to compare")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the synthetic registry")
+    parser.add_argument("--db", help="Database file to use, a temporary one by default")
+    parser.add_argument("--output", default="memory_report.json", help="Path of the JSON report")
+    args = parser.parse_args()
+
+    directory = None
+    if args.db is None:
+        directory = tempfile.TemporaryDirectory()
+        args.db = os.path.join(directory.name, "memory_benchmark.db")
+
+    db = Database(args.db)
+    db.create_tables()
+    model = PersonModel(db)
+    results = []
+    try:
+        present = db.write(lambda connection: connection.execute("SELECT COUNT(*) FROM person").fetchone()[0])
+        size = max(args.sizes)
+        start = time.perf_counter()
+        fill(model, min(present, size), size, args.seed)
+        print(f"Registry of {size} persons ready in {time.perf_counter() - start:.1f}s")
+
+        for rows in sorted(args.sizes):
+            baseline = None
+            for name in args.representations:
+                result = measure(db, name, rows)
+                baseline = baseline or result
+                result["saved_bytes_per_row"] = baseline["retained_bytes_per_row"] - result["retained_bytes_per_row"]
+                results.append(result)
+                print(f"  {rows:>9} rows {name:<12} {result['retained_bytes_per_row']:>7.1f} B/row kept  "
+                      f"peak {result['peak_bytes_per_row']:>7.1f} B/row  {result['blocks_per_row']:>5.2f} blocks/row  "
+                      f"{result['read_us_per_row']:.2f} us/row")
+    finally:
+        db.close()
+        if directory is not None:
+            directory.cleanup()
+
+    report = {
+        "config": {"sizes": sorted(args.sizes), "seed": args.seed, "baseline": args.representations[0]},
+        "environment": {
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform()
+        },
+        "results": results
+    }
+    with open(args.output, "w", encoding="utf-8") as file:
+        json.dump(report, file, indent=2)
+    print(f"Report written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
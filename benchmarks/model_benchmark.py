@@ -0,0 +1,160 @@
+"""
+Benchmark the PersonModel operations against registries of growing size.
+Usage: python -m benchmarks.model_benchmark --sizes 10000 100000 1000000 --output benchmark_report.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sqlite3
+import tempfile
+import time
+
+from benchmarks import generator
+from model.database import Database
+from model.instrumentation import Instrumentation
+from model.person_cache import PersonCache
+from model.person_model import PersonModel
+
+SIZES = (10_000, 100_000, 1_000_000)
+# Calls timed per operation and size
+OPERATIONS = 1000
+# read_all_persons is timed fewer times, it reads the whole table
+READ_ALL_REPEAT = 3
+
+def percentile(sorted_samples: list[float], fraction: float) -> float:
+    """Return the nearest-rank percentile of already sorted samples"""
+    if not sorted_samples:
+        return 0.0
+    index = min(len(sorted_samples) - 1, max(0, round(fraction * len(sorted_samples)) - 1))
+    return sorted_samples[index]
+# End of percentile
+
+def summarize(operation: str, size: int, samples: list[float]) -> dict:
+    """Build the report entry for the latencies (in seconds) of one operation"""
+    samples = sorted(samples)
+    total = sum(samples)
+    return {
+        "operation": operation,
+        "size": size,
+        "calls": len(samples),
+        "throughput_ops_s": len(samples) / total if total else 0.0,
+        "p50_ms": percentile(samples, 0.50) * 1000,
+        "p95_ms": percentile(samples, 0.95) * 1000,
+        "p99_ms": percentile(samples, 0.99) * 1000,
+        "max_ms": samples[-1] * 1000 if samples else 0.0
+    }
+# End of summarize
+
+def time_calls(function, arguments) -> list[float]:
+    """Call function once per argument and return each call latency in seconds"""
+    samples = []
+    for argument in arguments:
+        start = time.perf_counter()
+        function(argument)
+        samples.append(time.perf_counter() - start)
+    return samples
+# End of time_calls
+
+def fill(model: PersonModel, current: int, size: int, seed: int):
+    """Grow the registry from current to size synthetic persons with the bulk API"""
+    for _, outcome in model.create_persons_bulk(generator.persons(size - current, current, seed)):
+        if outcome != PersonModel.INSERTED:
+            raise RuntimeError(f"Couldn't load the synthetic registry: {outcome}")
+# End of fill
+
+def benchmark_size(model: PersonModel, size: int, operations: int, seed: int) -> list[dict]:
+    """Time every operation against a registry holding size persons, leaving it at that size"""
+    rng = random.Random(seed + size)
+    existing = [rng.randrange(size) for _ in range(operations)]
+    new = range(size, size + operations)
+
+    results = []
+    results.append(summarize("create_person", size, time_calls(
+        model.create_person, [generator.person(index, seed) for index in new]
+    )))
+    results.append(summarize("read_person", size, time_calls(
+        model.read_person, [generator.identity_document(index) for index in existing]
+    )))
+    updates = []
+    for index in existing:
+        person = generator.person(index, seed + 1)
+        updates.append((*person[1:], person[0]))
+    results.append(summarize("update_person", size, time_calls(model.update_person, updates)))
+    results.append(summarize("delete_person", size, time_calls(
+        model.delete_person, [generator.identity_document(index) for index in new]
+    )))
+    results.append(summarize("read_all_persons", size, time_calls(
+        lambda _: model.read_all_persons(), range(READ_ALL_REPEAT)
+    )))
+    return results
+# End of benchmark_size
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the PersonModel operations")
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES, help="Registry sizes to measure")
+    parser.add_argument("--operations", type=int, default=OPERATIONS, help="Calls timed per operation and size")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the synthetic registry")
+    parser.add_argument("--journal-mode", default="WAL", help="PRAGMA journal_mode (WAL, DELETE, ...)")
+    parser.add_argument("--synchronous", default="NORMAL", help="PRAGMA synchronous (OFF, NORMAL, FULL)")
+    parser.add_argument("--cache-size-kib", type=int, default=Database.CACHE_SIZE_KIB, help="SQLite page cache in KiB")
+    parser.add_argument("--person-cache", type=int, default=0, help="PersonCache capacity, 0 disables it")
+    parser.add_argument("--instrument", action="store_true", help="Add the per-operation and per-statement stats to the report")
+    parser.add_argument("--db", help="Database file to use, a temporary one by default")
+    parser.add_argument("--output", default="benchmark_report.json", help="Path of the JSON report")
+    args = parser.parse_args()
+
+    directory = None
+    if args.db is None:
+        directory = tempfile.TemporaryDirectory()
+        args.db = os.path.join(directory.name, "benchmark.db")
+
+    instrumentation = Instrumentation() if args.instrument else None
+    db = Database(args.db, args.cache_size_kib, args.journal_mode, args.synchronous, instrumentation)
+    db.create_tables()
+    model = PersonModel(db, PersonCache(args.person_cache) if args.person_cache else None)
+
+    results = []
+    current = 0
+    try:
+        for size in sorted(args.sizes):
+            start = time.perf_counter()
+            fill(model, current, size, args.seed)
+            current = size
+            print(f"Loaded {size} persons in {time.perf_counter() - start:.1f}s")
+
+            for result in benchmark_size(model, size, args.operations, args.seed):
+                results.append(result)
+                print(f"  {result['operation']:<18} {result['throughput_ops_s']:>10.0f} ops/s  "
+                      f"p50 {result['p50_ms']:.3f}ms  p95 {result['p95_ms']:.3f}ms  p99 {result['p99_ms']:.3f}ms")
+    finally:
+        db.close()
+        if directory is not None:
+            directory.cleanup()
+
+    report = {
+        "config": {
+            "journal_mode": args.journal_mode,
+            "synchronous": args.synchronous,
+            "cache_size_kib": args.cache_size_kib,
+            "person_cache": args.person_cache,
+            "operations": args.operations,
+            "seed": args.seed
+        },
+        "environment": {
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform()
+        },
+        "results": results
+    }
+    if instrumentation is not None:
+        report["instrumentation"] = instrumentation.snapshot()
+    with open(args.output, "w", encoding="utf-8") as file:
+        json.dump(report, file, indent=2)
+    print(f"Report written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
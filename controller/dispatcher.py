@@ -0,0 +1,98 @@
+import logging
+import queue
+from concurrent.futures import CancelledError, Future, ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+class Dispatcher:
+    """
+    Runs model calls off the Tk main thread and hands their results back to it.
+    Tk may only be called from the main thread, so finished requests are queued by the workers and the
+    Tk thread drains the queue every POLL_MS with window.after.
+    Reads run on a small pool, writes run one at a time on their own thread so they keep the order
+    they were requested in. A request submitted with a key supersedes the previous one with the same
+    key: it is cancelled if it hasn't started yet, otherwise its result is dropped.
+    Must be created on the Tk thread
+    """
+    READ_WORKERS = 2
+    # How often the Tk thread picks up finished requests
+    POLL_MS = 15
+
+    def __init__(self, window, read_workers: int = READ_WORKERS, poll_ms: int = POLL_MS):
+        self.window = window
+        self.poll_ms = poll_ms
+        self._readers = ThreadPoolExecutor(max_workers=read_workers, thread_name_prefix="model-read")
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="model-write")
+        self._latest = {}
+        self._closed = False
+        # Finished requests waiting for the Tk thread
+        self._done = queue.SimpleQueue()
+        self._poll_job = self.window.after(self.poll_ms, self._drain)
+
+    def submit(self, work, on_done, key=None, write=False, on_settled=None) -> Future:
+        """
+        Run work() on a worker thread.
+        on_done(result) is called on the Tk thread unless the request was superseded or failed,
+        on_settled() is always called on the Tk thread once the request is over
+        """
+        if key is not None and key in self._latest:
+            self._latest[key].cancel()
+
+        future = (self._writer if write else self._readers).submit(work)
+        if key is not None:
+            self._latest[key] = future
+        future.add_done_callback(lambda done: self._deliver(done, key, on_done, on_settled))
+        return future
+    # End of submit
+
+    def _deliver(self, future: Future, key, on_done, on_settled):
+        """Called on the worker thread (or the submitting one on cancel), queue the request for the Tk thread"""
+        if not self._closed:
+            self._done.put((future, key, on_done, on_settled))
+    # End of _deliver
+
+    def _drain(self):
+        """Runs on the Tk thread every poll_ms: finish every request queued since the last run"""
+        while True:
+            try:
+                request = self._done.get_nowait()
+            except queue.Empty:
+                break
+            self._finish(*request)
+        if not self._closed:
+            self._poll_job = self.window.after(self.poll_ms, self._drain)
+    # End of _drain
+
+    def _finish(self, future: Future, key, on_done, on_settled):
+        """Runs on the Tk thread: hand the result to on_done if it is still the latest one"""
+        superseded = False
+        if key is not None:
+            superseded = self._latest.get(key) is not future
+            if not superseded:
+                del self._latest[key]
+
+        try:
+            if not superseded:
+                on_done(future.result())
+        except CancelledError:
+            pass
+        except Exception:
+            logger.exception("A background database operation failed")
+        finally:
+            if on_settled is not None:
+                on_settled()
+    # End of _finish
+
+    def shutdown(self):
+        """Drop queued reads, let pending writes finish and stop the worker threads"""
+        self._closed = True
+        # Imported here so the controller package doesn't load Tk until a window exists
+        from tkinter import TclError
+        try:
+            self.window.after_cancel(self._poll_job)
+        except TclError:
+            # The window is already gone, and its timers with it
+            pass
+        self._readers.shutdown(wait=True, cancel_futures=True)
+        self._writer.shutdown(wait=True)
+    # End of shutdown
\ No newline at end of file
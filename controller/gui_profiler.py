@@ -0,0 +1,165 @@
+import functools
+import json
+import logging
+import threading
+import time
+from model.instrumentation import LatencyHistogram
+
+logger = logging.getLogger(__name__)
+
+class GuiProfiler:
+    """
+    Opt-in responsiveness profiler for the Tk event loop (app.py --profile-gui).
+    - Event loop lag: a probe reschedules itself every PROBE_MS with window.after, any delay past
+      that is time the loop was busy and the window couldn't react
+    - Controller handlers, end to end from the click: "input" is the handler itself on the Tk thread
+      (reading the form, validating), "queue" the wait for a worker, "model" the model call,
+      "callback" the wait for the Tk thread to pick the result up, "view" updating the widgets and
+      "redraw" the idle tasks Tk runs afterwards (geometry, drawing)
+    - PersonView widget updates, each on its own
+    Timings go to latency histograms. Every REPORT_SECONDS the window of samples is appended as one JSON
+    line to the report file (or logged without one) and the histograms start over
+    """
+    PROBE_MS = 50
+    REPORT_SECONDS = 60.0
+    # PersonView methods that update widgets. confirm() is left out, it waits for the user
+    VIEW_METHODS = (
+        "set_person", "display_message", "clear_all_inputs", "clear_inputs_after_save", "set_in_flight",
+        "show_table_page", "show_search_results", "apply_changes"
+    )
+
+    def __init__(self, window, path: str | None = None, probe_ms: int = PROBE_MS, report_seconds: float = REPORT_SECONDS):
+        self.window = window
+        self.path = path
+        self.probe_ms = probe_ms
+        self.report_seconds = report_seconds
+        # Model phases are recorded from the worker threads
+        self._lock = threading.Lock()
+        self._timings = {}
+        # Handler running on the Tk thread: (name, start), requests it dispatches are attributed to it
+        self._handler = None
+        self._window_start = time.time()
+        self._probe_job = None
+        self._report_job = None
+
+    def start(self):
+        """Start the lag probe and the periodic report"""
+        self._probe_job = self.window.after(self.probe_ms, self._probe, time.perf_counter())
+        self._report_job = self.window.after(int(self.report_seconds * 1000), self._report_periodically)
+    # End of start
+
+    def record(self, name: str, seconds: float):
+        """Add one sample, in seconds, to the named timing"""
+        with self._lock:
+            histogram = self._timings.get(name)
+            if histogram is None:
+                histogram = self._timings[name] = LatencyHistogram()
+            histogram.record(seconds * 1000)
+    # End of record
+
+    def _probe(self, scheduled_at: float):
+        """Runs every probe_ms: how late it runs is the event loop lag"""
+        now = time.perf_counter()
+        self.record("event_loop.lag", max(now - scheduled_at - self.probe_ms / 1000, 0.0))
+        self._probe_job = self.window.after(self.probe_ms, self._probe, now)
+    # End of _probe
+
+    def wrap_handler(self, name: str, handler):
+        """Return handler timing its own run as the input phase and marking it as the source of the requests it dispatches"""
+        @functools.wraps(handler)
+        def timed(*args, **kwargs):
+            previous = self._handler
+            start = time.perf_counter()
+            self._handler = (name, start)
+            try:
+                return handler(*args, **kwargs)
+            finally:
+                self._handler = previous
+                self.record(f"{name}.input", time.perf_counter() - start)
+        return timed
+    # End of wrap_handler
+
+    def trace(self, operation: str, work, on_done):
+        """
+        Wrap the work and on_done of a dispatched request to time its phases. They are recorded under
+        the handler that dispatched it, or under the operation when it wasn't dispatched from one
+        """
+        name, started = self._handler or (operation, time.perf_counter())
+        submitted = time.perf_counter()
+        marks = {}
+
+        def timed_work():
+            marks["model"] = time.perf_counter()
+            try:
+                return work()
+            finally:
+                marks["model_done"] = time.perf_counter()
+                self.record(f"{name}.queue", marks["model"] - submitted)
+                self.record(f"{name}.model", marks["model_done"] - marks["model"])
+
+        def timed_on_done(result):
+            start = time.perf_counter()
+            if "model_done" in marks:
+                self.record(f"{name}.callback", start - marks["model_done"])
+            try:
+                return on_done(result)
+            finally:
+                end = time.perf_counter()
+                self.record(f"{name}.view", end - start)
+                self.record(f"{name}.total", end - started)
+                # Idle callbacks run in order, so this one runs once the redraws queued by the view are done
+                self.window.after_idle(lambda: self.record(f"{name}.redraw", time.perf_counter() - end))
+
+        return timed_work, timed_on_done
+    # End of trace
+
+    def instrument_view(self, view, methods=VIEW_METHODS):
+        """Time the widget updates of view, replacing its methods by timed ones on the instance"""
+        for method in methods:
+            setattr(view, method, self._timed(f"view.{method}", getattr(view, method)))
+    # End of instrument_view
+
+    def _timed(self, name: str, function):
+        """Return function recording the duration of each call under name"""
+        @functools.wraps(function)
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self.record(name, time.perf_counter() - start)
+        return timed
+    # End of _timed
+
+    def snapshot(self, reset: bool = False) -> dict:
+        """Return every timing as plain data, and start a new window of samples if reset"""
+        with self._lock:
+            timings = {name: histogram.snapshot() for name, histogram in sorted(self._timings.items())}
+            start = self._window_start
+            if reset:
+                self._timings.clear()
+                self._window_start = time.time()
+        return {"from": start, "to": time.time(), "timings": timings}
+    # End of snapshot
+
+    def report(self):
+        """Append the current window of samples to the report file (or log it) and start a new one"""
+        snapshot = self.snapshot(reset=True)
+        if not snapshot["timings"]:
+            return
+        if self.path is None:
+            for name, timing in snapshot["timings"].items():
+                logger.info("%-36s %6d calls  p50 %7.1f ms  p99 %7.1f ms  max %7.1f ms",
+                            name, timing["count"], timing["p50_ms"], timing["p99_ms"], timing["max_ms"])
+            return
+        try:
+            with open(self.path, "a", encoding="utf-8") as file:
+                file.write(json.dumps(snapshot) + "\n")
+        except OSError as e:
+            logger.error("Can't write the GUI profile to '%s': %s", self.path, e)
+    # End of report
+
+    def _report_periodically(self):
+        self.report()
+        self._report_job = self.window.after(int(self.report_seconds * 1000), self._report_periodically)
+    # End of _report_periodically
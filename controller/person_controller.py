@@ -1,52 +1,128 @@
+import logging
+from collections import Counter
+from sqlite3 import Error
+from typing import TYPE_CHECKING
+from controller.dispatcher import Dispatcher
+from controller.gui_profiler import GuiProfiler
+from model.person_dedup import PersonDeduplicator
 from model.person_model import PersonModel
-from view.person_view import PersonView
+from model.person_validation import PersonValidator, format_errors, normalize_identity_document, normalize_phone_number
+
+# The view is only needed for type hints, importing it would load the GUI toolkit
+if TYPE_CHECKING:
+    from view.person_view import PersonView
+
+logger = logging.getLogger(__name__)
 
 class PersonController:
     """
-    The controller handles user inputs from the View, interacts with the Model to perform bussiness logic (database operations), and updated the view
+    The controller handles user inputs from the View, interacts with the Model to perform bussiness logic (database operations), and updated the view.
+    Model calls run on the Dispatcher's worker threads so the window stays responsive
     """
-    def __init__(self, model: PersonModel, view: PersonView):
+    def __init__(self, model: PersonModel, view: "PersonView", dispatcher: Dispatcher,
+                 deduplicator: PersonDeduplicator | None = None, profiler: GuiProfiler | None = None):
         self.model = model
         self.view = view
+        self.dispatcher = dispatcher
+        # Optional check for likely duplicates before creating a person
+        self.deduplicator = deduplicator
+        # Person the user was warned about, creating it again registers it anyway
+        self.confirmed_duplicate = None
+        # Last change feed seq applied to the table, None until it could be read
+        self.change_seq = None
+        # Normalizes and checks the records typed in the form before they reach the model
+        self.validator = PersonValidator()
+        # Optional responsiveness profiler, times every handler before the View gets them
+        self.profiler = profiler
+        if profiler is not None:
+            for name in dir(self):
+                if name.startswith("handle_"):
+                    setattr(self, name, profiler.wrap_handler(name, getattr(self, name)))
+        
+        # Requests in flight per operation, drives the buttons in-flight state
+        self.in_flight = Counter()
         self.view.set_command_callbacks(
             create_command=self.handle_create_person,
             read_command=self.handle_read_person,
             update_command=self.handle_update_person,
             delete_command=self.handle_delete_person
         )
+        self.view.set_batch_command_callbacks(
+            update_selected_command=self.handle_update_selected,
+            delete_selected_command=self.handle_delete_selected
+        )
+        self.view.set_table_loader(self.handle_load_page)
+        self.view.set_search_command(self.handle_search)
+        self.view.set_change_poller(self.handle_poll_changes)
+        self.handle_poll_changes()
+    
+    def dispatch(self, operation: str, work, on_done, key=None, write=False):
+        """
+        Run work() off the Tk thread and call on_done(result) back on it.
+        The operation is shown as in flight in the View until its request settles
+        """
+        self.in_flight[operation] += 1
+        self.view.set_in_flight(operation, True)
+        if self.profiler is not None:
+            work, on_done = self.profiler.trace(operation, work, on_done)
+        
+        def settled():
+            self.in_flight[operation] -= 1
+            if not self.in_flight[operation]:
+                self.view.set_in_flight(operation, False)
+        
+        self.dispatcher.submit(work, on_done, key=key, write=write, on_settled=settled)
+    # End of dispatch
         
     def handle_create_person(self):
         """
         Handle the "Create" click event.
-        1. Get inputs from the view
-        2. Calls the Model to save the data
-        3. Updates the View with the result.
+        1. Get inputs from the view, normalized and validated
+        2. Looks for likely duplicates of the person, if any the user is warned instead
+        3. Calls the Model to save the data
+        4. Updates the View with the result.
         """
         
-        person_data_dict = self.view.get_inputs()
+        person = self.view.get_person()
         
-        identity_document = person_data_dict["identity_document"]
-        if not identity_document:
+        if not person.identity_document:
             self.view.display_message("Error: Identity Document is required", "orange")
             return
         
-        person_data_tuple = (
-            identity_document,
-            person_data_dict["name"],
-            person_data_dict["surname"],
-            person_data_dict["address"],
-            person_data_dict["phone_number"]
-        )
-        
-        # Interact with model
-        success = self.model.create_person(person_data_tuple)
+        person, errors = self.validator.validate(person)
+        if errors:
+            self.view.display_message(f"Error: {format_errors(errors)}", "orange")
+            return
         
+        # A person already warned about as a duplicate is created on the second click
+        check = self.deduplicator is not None and person != self.confirmed_duplicate
+        self.confirmed_duplicate = None
+
+        def create():
+            if check:
+                duplicates = self.deduplicator.check_person(person)
+                if duplicates:
+                    return duplicates
+            return self.model.create_person(person)
+
         # Update view
-        if success:
-            self.view.display_message("Person created succesfully!", "#219ebc")
-            self.view.clear_inputs_after_save()
-        else:
-            self.view.display_message("Error: couldn't create person (ID already exist)", "red")
+        def on_done(result):
+            if isinstance(result, list):
+                duplicate, score = result[0]
+                self.confirmed_duplicate = person
+                self.view.display_message(
+                    f"Possible duplicate of {duplicate[1]} {duplicate[2]} (ID {duplicate[0]}, {score:.0%} alike). "
+                    "Press Create again to register anyway", "orange"
+                )
+            elif result:
+                self.view.display_message("Person created succesfully!", "#219ebc")
+                self.view.clear_inputs_after_save()
+                self.view.reload_table()
+            else:
+                self.view.display_message("Error: couldn't create person (ID already exist)", "red")
+        
+        # Interact with model
+        self.dispatch("create", create, on_done, write=True)
     # End of handle_create_person
     
     def handle_read_person(self):
@@ -56,22 +132,26 @@ class PersonController:
         2. Model search Identity Document if doesn't exist return a message
         3. If Identity Document exist in database return all data 
         """
-        person_data_dict = self.view.get_inputs()
-        
-        identity_document = person_data_dict["identity_document"]
+        identity_document = normalize_identity_document(self.view.get_person().identity_document)
         if not identity_document:
             self.view.display_message("Error: Identity Document is required to search person data", "orange")
             return 
         
-        # Interact with model
-        person_data = self.model.read_person(identity_document)
-        
         # Update view
-        if person_data:
-            self.view.set_inputs(person_data[0], person_data[1], person_data[2], person_data[3], person_data[4])
-            self.view.display_message("Person data loaded", "#8ecae6")
-        else:
-            self.view.display_message("Error: Person not found", "red")
+        def on_done(person_data):
+            if person_data:
+                self.view.set_person(person_data)
+                self.view.display_message("Person data loaded", "#8ecae6")
+            else:
+                self.view.display_message("Error: Person not found", "red")
+        
+        # Interact with model, a newer read of the same ID supersedes this one
+        self.dispatch(
+            "read",
+            lambda: self.model.read_person(identity_document),
+            on_done,
+            key=("read", identity_document)
+        )
     # End of handle_read_person
     
     def handle_update_person(self):
@@ -80,31 +160,30 @@ class PersonController:
         1. Get Identity Document from the View
         2. Model search Identity Document, if doesn't exist return a message
         3. If Identity Document exists search all data affiliated with itself
-        4. Get all data from entry fields to be updated
+        4. Get all data from entry fields to be updated, normalized and validated
         5. Update the database
         """
-        person_data_dict = self.view.get_inputs()
+        person = self.view.get_person()
         
-        identity_document = person_data_dict["identity_document"]
-        if not identity_document:
+        if not person.identity_document:
             print("Check if ID exists or database is available")
             self.view.display_message("Error: Identity Document is required to update person data", "orange")
             return
 
-        person_data_tuple = (
-            person_data_dict["name"],
-            person_data_dict["surname"],
-            person_data_dict["address"],
-            person_data_dict["phone_number"],
-            identity_document
-        )
+        person, errors = self.validator.validate(person)
+        if errors:
+            self.view.display_message(f"Error: {format_errors(errors)}", "orange")
+            return
         
-        success = self.model.update_person(person_data_tuple)
-        if success:
-            self.view.display_message("Person data has been modify successfully!", "#8ecae6")
-            self.view.clear_inputs_after_save()
-        else:
-            self.view.display_message("Person ID no exists", "red")
+        def on_done(success):
+            if success:
+                self.view.display_message("Person data has been modify successfully!", "#8ecae6")
+                self.view.clear_inputs_after_save()
+                self.view.reload_table()
+            else:
+                self.view.display_message("Person ID no exists", "red")
+        
+        self.dispatch("update", lambda: self.model.update_person(person.update_parameters()), on_done, write=True)
     # End of handle_update_person
     
     def handle_delete_person(self):
@@ -116,19 +195,146 @@ class PersonController:
         4. Delete all person data
         5. Update the database
         """
-        person_data_dict = self.view.get_inputs()
-        
-        identity_document = person_data_dict["identity_document"]
+        identity_document = normalize_identity_document(self.view.get_person().identity_document)
         if not identity_document:
             self.view.display_message("Error: Identity Document is required to delete person data", "orange")
             return
         
-        success = self.model.delete_person(identity_document)
+        def on_done(success):
+            if success:
+                self.view.display_message("Person has been deleted successfully!", "#8ecae6")
+                self.view.clear_inputs_after_save()
+                self.view.reload_table()
+            else:
+                self.view.display_message("Person ID no exists", "red")
         
-        if success:
-            self.view.display_message("Person has been deleted successfully!", "#8ecae6")
-            self.view.clear_inputs_after_save()
-        else:
-            self.view.display_message("Person ID no exists", "red")
+        self.dispatch("delete", lambda: self.model.delete_person(identity_document), on_done, write=True)
     # End of handle_delete_person
-      
+    
+    def handle_update_selected(self):
+        """
+        Handle the "Update" click with rows selected in the table and no Identity Document typed.
+        1. Get the selected IDs and the fields filled in the form
+        2. Model sets those fields on every selected person in one batch, the other fields are kept
+        3. Updates the View with how many were updated
+        """
+        identity_documents = self.view.get_selected_ids()
+        changes = {column: value for column, value in self.view.get_person().as_dict().items() if value}
+        if not changes:
+            self.view.display_message("Fill the fields to set on the selected persons", "orange")
+            return
+        changes, errors = self.validator.validate_fields(changes)
+        if errors:
+            self.view.display_message(f"Error: {format_errors(errors)}", "orange")
+            return
+        
+        def on_done(outcomes):
+            self.show_batch_result("updated", outcomes, len(identity_documents))
+        
+        # Only the filled columns are written, whatever else another station changed meanwhile is kept
+        self.dispatch("update", lambda: self.model.set_columns(identity_documents, changes), on_done, write=True)
+    # End of handle_update_selected
+    
+    def handle_delete_selected(self):
+        """
+        Handle the "Delete" click (or the Delete key) with rows selected in the table and no Identity Document typed.
+        1. Get the selected IDs and ask the user to confirm
+        2. Model deletes them all in one batch
+        3. Updates the View with how many were deleted
+        """
+        identity_documents = self.view.get_selected_ids()
+        if len(identity_documents) > 1 and not self.view.confirm(f"Delete the {len(identity_documents)} selected persons?"):
+            return
+        
+        def on_done(outcomes):
+            self.show_batch_result("deleted", outcomes, len(identity_documents))
+        
+        self.dispatch("delete", lambda: self.model.delete_persons(identity_documents), on_done, write=True)
+    # End of handle_delete_selected
+    
+    def show_batch_result(self, action: str, outcomes: list[tuple[str, str]], requested: int):
+        """Report the outcomes of a batch update or delete and reload the table"""
+        counts = Counter(outcome for _, outcome in outcomes)
+        done = counts[PersonModel.UPDATED] + counts[PersonModel.DELETED]
+        if counts[PersonModel.ERROR]:
+            self.view.display_message(f"Error: only {done} of {requested} persons {action}", "red")
+        else:
+            self.view.display_message(f"{done} of {requested} persons {action}", "#8ecae6")
+        self.view.reload_table()
+    # End of show_batch_result
+    
+    def handle_poll_changes(self):
+        """
+        Handle the View's change feed timer, keeping the table current with other stations.
+        1. Model returns what changed after the last seq applied
+        2. The View applies those inserts, updates and removals to the rows it shows
+        Until the seq is known it is read first and the table is (re)loaded after it,
+        so nothing changed between the two is missed
+        """
+        if self.change_seq is None:
+            def read_seq():
+                try:
+                    return self.model.current_change_seq()
+                except (Error, OSError) as e:
+                    logger.error("Can't read the change seq: %s", e)
+                    return None
+            
+            def on_seq(seq):
+                self.change_seq = seq
+                self.view.reload_table()
+            
+            self.dispatch("changes", read_seq, on_seq, key="changes")
+            return
+        
+        seq = self.change_seq
+        def on_done(result):
+            self.change_seq, changes = result
+            if changes is None:
+                # The log was pruned past our seq
+                self.view.reload_table()
+            elif changes:
+                self.view.apply_changes(changes)
+        
+        self.dispatch("changes", lambda: self.model.changes_since(seq), on_done, key="changes")
+    # End of handle_poll_changes
+    
+    def handle_load_page(self, after_id, before_id, limit, order_by="identity_document", descending=False):
+        """
+        Handle the table asking for more rows while the user scrolls, or sorted by a column heading.
+        The page of persons after after_id, or before before_id, in order_by order is handed to the View.
+        SQLite sorts, reading from an index for the ID, surname and phone number columns.
+        A newer table request (page or search) supersedes this one
+        """
+        self.dispatch(
+            "table",
+            lambda: self.model.read_persons_page(after_id, limit, before_id, order_by=order_by, descending=descending),
+            lambda persons: self.view.show_table_page(persons, after_id, before_id),
+            key="table"
+        )
+    # End of handle_load_page
+    
+    def handle_search(self, query: str):
+        """
+        Handle the search box once the user stops typing.
+        1. Model looks up identity documents starting with the digits typed (and the persons with that
+           phone number), or a phone number typed with separators, or searches name, surname and address
+        2. The View shows the ranked matches in the table
+        """
+        def on_done(persons):
+            self.view.show_search_results(persons)
+            if not persons:
+                self.view.display_message(f"No persons match '{query}'", "orange")
+        
+        # Digits are the start of an identity document or a whole phone number, anything else is a full-text search
+        phone_number = normalize_phone_number(query)
+        if query.isdigit():
+            def work():
+                persons = self.model.find_by_id_prefix(query)
+                found = {person.identity_document for person in persons}
+                return persons + [person for person in self.model.find_by_phone(query) if person.identity_document not in found]
+        elif phone_number.isdigit():
+            work = lambda: self.model.find_by_phone(phone_number)
+        else:
+            work = lambda: self.model.search(query)
+        self.dispatch("search", work, on_done, key="table")
+    # End of handle_search
\ No newline at end of file
@@ -0,0 +1,51 @@
+import argparse
+import time
+from sqlite3 import Error
+
+from model.database import Database
+from model.person_export import EXPORT_FORMATS, export_persons
+from model.person_model import PersonModel, PERSON_COLUMNS
+from model.sharded_database import ShardedDatabase
+from model.sharded_person_model import ShardedPersonModel
+
+def main():
+    parser = argparse.ArgumentParser(description="Stream the person registry to a CSV, JSONL or columnar file")
+    parser.add_argument("path", help="Output file")
+    parser.add_argument("--db", default="database.db", help="Database file (default: database.db)")
+    parser.add_argument("--format", choices=EXPORT_FORMATS, default="csv", help="Output format (default: csv)")
+    parser.add_argument("--filter", action="append", default=[], metavar="COLUMN=VALUE",
+                        help=f"Only export rows where the column has the value, columns: {', '.join(PERSON_COLUMNS)}")
+    parser.add_argument("--checkpoint", help="Checkpoint file, an interrupted export resumes from it")
+    parser.add_argument("--shards", type=int, default=0,
+                        help="Read a registry split over this many database files with import_persons.py --shards")
+    parser.add_argument("--page-size", type=int, default=10000, help="Rows read per page")
+    args = parser.parse_args()
+
+    filters = {}
+    for item in args.filter:
+        column, _, value = item.partition("=")
+        filters[column] = value
+
+    if args.shards:
+        db = ShardedDatabase(args.db, args.shards)
+        model = ShardedPersonModel(db)
+    else:
+        db = Database(args.db)
+        model = PersonModel(db)
+    start = time.perf_counter()
+    try:
+        rows = export_persons(model, args.path, args.format, filters, args.checkpoint, args.page_size)
+    except (Error, ValueError) as e:
+        print(f"Export failed: {str(e)}")
+        if args.checkpoint:
+            print(f"Run it again with --checkpoint {args.checkpoint} to resume")
+        raise SystemExit(1)
+    finally:
+        if args.shards:
+            model.close()
+        db.close()
+    print(f"Exported {rows} persons to {args.path} in {time.perf_counter() - start:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
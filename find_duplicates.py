@@ -0,0 +1,42 @@
+import argparse
+import csv
+import sys
+import time
+from sqlite3 import Error
+
+from model.database import Database
+from model.person_dedup import PersonDeduplicator
+
+def main():
+    parser = argparse.ArgumentParser(description="Report persons that are likely registered more than once")
+    parser.add_argument("--db", default="database.db", help="Database file (default: database.db)")
+    parser.add_argument("--threshold", type=float, default=PersonDeduplicator.THRESHOLD,
+                        help=f"Lowest similarity reported, from 0 to 1 (default: {PersonDeduplicator.THRESHOLD})")
+    parser.add_argument("--output", help="CSV file for the pairs (default: standard output)")
+    args = parser.parse_args()
+
+    db = Database(args.db)
+    db.create_tables()
+    deduplicator = PersonDeduplicator(db, args.threshold)
+    output = open(args.output, "w", newline="", encoding="utf-8") if args.output else sys.stdout
+    writer = csv.writer(output)
+    writer.writerow(("identity_document", "duplicate_identity_document", "score"))
+
+    pairs = 0
+    start = time.perf_counter()
+    try:
+        for identity_document, other, score in deduplicator.find_duplicates():
+            writer.writerow((identity_document, other, f"{score:.3f}"))
+            pairs += 1
+    except Error as e:
+        print(f"Duplicate detection failed: {str(e)}", file=sys.stderr)
+        raise SystemExit(1)
+    finally:
+        if args.output:
+            output.close()
+        db.close()
+    print(f"Found {pairs} likely duplicate pairs in {time.perf_counter() - start:.2f}s", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+import argparse
+import csv
+import json
+import time
+from collections import Counter
+
+from model.database import Database
+from model.person_model import PersonModel, PERSON_COLUMNS
+from model.person_validation import PersonValidator, format_errors
+from model.sharded_database import ShardedDatabase
+from model.sharded_person_model import ShardedPersonModel
+
+def to_person_tuple(record: dict) -> tuple:
+    """Build a person tuple in table order from a record, missing fields become None"""
+    values = []
+    for column in PERSON_COLUMNS:
+        value = record.get(column)
+        values.append(str(value).strip() if value is not None else None)
+    return tuple(values)
+# End of to_person_tuple
+
+def read_csv(path: str):
+    """Yield person tuples from a CSV file whose header names the person columns"""
+    with open(path, newline="", encoding="utf-8") as file:
+        for record in csv.DictReader(file):
+            yield to_person_tuple(record)
+# End of read_csv
+
+def read_jsonl(path: str):
+    """Yield person tuples from a JSONL file with one person object per line"""
+    with open(path, encoding="utf-8") as file:
+        for line in file:
+            if line.strip():
+                yield to_person_tuple(json.loads(line))
+# End of read_jsonl
+
+def valid_persons(persons, counts: Counter, batch_size: int):
+    """Yield the normalized valid persons, reporting the invalid ones with their record number"""
+    validator = PersonValidator()
+    for number, (person, errors) in enumerate(validator.validate_stream(persons, batch_size), start=1):
+        if errors:
+            counts[PersonModel.INVALID] += 1
+            print(f"{PersonModel.INVALID}: record {number} ({person[0]}): {format_errors(errors)}")
+        else:
+            yield person
+# End of valid_persons
+
+def main():
+    parser = argparse.ArgumentParser(description="Stream a CSV or JSONL file of persons into the registry")
+    parser.add_argument("path", help="CSV (with header) or JSONL file to import")
+    parser.add_argument("--db", default="database.db", help="Database file (default: database.db)")
+    parser.add_argument("--format", choices=("csv", "jsonl"), help="Input format, guessed from the extension if omitted")
+    parser.add_argument("--shards", type=int, default=0,
+                        help="Split the registry over this many database files (default: a single file)")
+    parser.add_argument("--chunk-size", type=int, default=PersonModel.BULK_CHUNK_SIZE, help="Rows per transaction")
+    parser.add_argument("--skip-validation", action="store_true", help="Store the records as they are, without normalizing them")
+    args = parser.parse_args()
+
+    file_format = args.format or ("jsonl" if args.path.endswith((".jsonl", ".ndjson")) else "csv")
+    reader = read_jsonl if file_format == "jsonl" else read_csv
+
+    if args.shards:
+        db = ShardedDatabase(args.db, args.shards)
+        model = ShardedPersonModel(db)
+    else:
+        db = Database(args.db)
+        model = PersonModel(db)
+    if not db.create_tables():
+        raise SystemExit(1)
+
+    # Only the counters are kept, so memory stays flat whatever the file size
+    counts = Counter()
+    start = time.perf_counter()
+    persons = reader(args.path)
+    if not args.skip_validation:
+        persons = valid_persons(persons, counts, args.chunk_size)
+    try:
+        for identity_document, outcome in model.create_persons_bulk(persons, args.chunk_size):
+            counts[outcome] += 1
+            if outcome != PersonModel.INSERTED:
+                print(f"{outcome}: {identity_document}")
+    finally:
+        if args.shards:
+            model.close()
+        db.close()
+    elapsed = time.perf_counter() - start
+
+    total = sum(counts.values())
+    print(f"Imported {counts[PersonModel.INSERTED]} of {total} persons in {elapsed:.2f}s "
+          f"({total / elapsed if elapsed else 0:.0f} rows/s)")
+    for outcome in (PersonModel.INVALID, PersonModel.DUPLICATE, PersonModel.CONSTRAINT_ERROR, PersonModel.ERROR):
+        if counts[outcome]:
+            print(f"  {outcome}: {counts[outcome]}")
+
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -0,0 +1,70 @@
+import argparse
+import time
+from datetime import datetime
+from sqlite3 import Error
+
+from model.database import Database
+from model.maintenance import DatabaseMaintenance
+from model.sharded_database import ShardedDatabase
+
+OPERATIONS = ("backup", "vacuum", "enable-incremental-vacuum", "analyze", "optimize")
+
+def print_progress(operation: str, done: int, total: int):
+    """Progress line rewritten in place"""
+    percent = 100 * done / total if total else 100
+    print(f"\r{operation}: {done}/{total} pages ({percent:.0f}%)", end="", flush=True)
+# End of print_progress
+
+def run(maintenance: DatabaseMaintenance, operation: str, target: str | None) -> dict:
+    """Run one maintenance operation and return its report"""
+    if operation == "backup":
+        return maintenance.backup(target)
+    if operation == "vacuum":
+        return maintenance.incremental_vacuum()
+    if operation == "enable-incremental-vacuum":
+        return maintenance.enable_incremental_vacuum()
+    if operation == "analyze":
+        return maintenance.analyze()
+    return maintenance.optimize()
+# End of run
+
+def main():
+    parser = argparse.ArgumentParser(description="Back up, compact or refresh the statistics of the registry while it is in use")
+    parser.add_argument("operation", choices=OPERATIONS)
+    parser.add_argument("target", nargs="?",
+                        help="Backup file for backup, strftime codes allowed (e.g. backups/database-%%Y%%m%%d-%%H%%M.db)")
+    parser.add_argument("--db", default="database.db", help="Database file (default: database.db)")
+    parser.add_argument("--shards", type=int, default=0,
+                        help="Work on a registry split over this many database files, backups get one file per shard")
+    args = parser.parse_args()
+    if args.operation == "backup" and not args.target:
+        parser.error("backup needs a target file")
+
+    target = datetime.now().strftime(args.target) if args.target else None
+    if args.shards:
+        db = ShardedDatabase(args.db, args.shards)
+        jobs = [(shard, target and ShardedDatabase.shard_path(target, index)) for index, shard in enumerate(db.shards)]
+    else:
+        db = Database(args.db)
+        jobs = [(db, target)]
+
+    start = time.perf_counter()
+    try:
+        for shard, shard_target in jobs:
+            report = run(DatabaseMaintenance(shard, print_progress), args.operation, shard_target)
+            print(f"\r{shard.db_name}: {args.operation} done in {report['seconds']:.2f}s", end="")
+            if "bytes" in report:
+                print(f", {report['bytes']} bytes written to {report['target']}", end="")
+            if "pages" in report:
+                print(f", {report['pages']} pages freed", end="")
+            print()
+    except Error as e:
+        print(f"\n{args.operation} failed: {str(e)}")
+        raise SystemExit(1)
+    finally:
+        db.close()
+    print(f"Finished in {time.perf_counter() - start:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
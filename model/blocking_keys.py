@@ -0,0 +1,63 @@
+"""
+Blocking keys for duplicate detection. Persons that may be the same share at least one key,
+so only persons inside the same block have to be compared. The functions are also registered
+on every database connection, where the triggers keeping the person_blocking table current call them
+"""
+import re
+import unicodedata
+from functools import lru_cache
+
+# Phonetic rewrites applied in order to the accent-free, upper case surname. Spelling variants
+# that sound alike in Spanish end up with the same letters: Vásquez, Vazquez and Basques all give BSKS
+PHONETIC_RULES = [
+    (re.compile(pattern), replacement) for pattern, replacement in (
+        (r"[^A-Z]", ""),
+        (r"X", "KS"),
+        (r"CH", "X"),
+        (r"LL", "Y"),
+        (r"QU", "K"),
+        (r"C(?=[EI])", "S"),
+        (r"G(?=[EI])", "J"),
+        (r"GU(?=[EI])", "G"),
+        (r"C", "K"),
+        (r"Z", "S"),
+        (r"V", "B"),
+        (r"W", "B"),
+        (r"H", ""),
+        (r"Y(?![AEIOU])", "I"),
+    )
+]
+# Letters kept from the phonetic code, enough to tell most surnames apart
+PHONETIC_LENGTH = 6
+# Trailing digits kept from a phone number, dropping country and area prefixes
+PHONE_DIGITS = 7
+
+def normalize_text(text: str | None) -> str:
+    """Lower case text without accents and with single spaces, for comparisons"""
+    if not text:
+        return ""
+    decomposed = unicodedata.normalize("NFKD", text)
+    stripped = "".join(character for character in decomposed if not unicodedata.combining(character))
+    return " ".join(stripped.casefold().split())
+# End of normalize_text
+
+# Surnames repeat a lot, the insert trigger mostly hits the cache
+@lru_cache(maxsize=65536)
+def surname_key(surname: str | None) -> str | None:
+    """Phonetic code of surname: first sound, then its consonants without repeats. None if it has no letters"""
+    code = normalize_text(surname).upper()
+    for pattern, replacement in PHONETIC_RULES:
+        code = pattern.sub(replacement, code)
+    if not code:
+        return None
+    consonants = re.sub(r"[AEIOU]", "", code[1:])
+    return re.sub(r"(.)\1+", r"\1", code[0] + consonants)[:PHONETIC_LENGTH]
+# End of surname_key
+
+def phone_key(phone_number: str | None) -> str | None:
+    """Last digits of phone_number, None when it is too short to identify anyone"""
+    digits = re.sub(r"\D", "", phone_number or "")
+    if len(digits) < PHONE_DIGITS:
+        return None
+    return digits[-PHONE_DIGITS:]
+# End of phone_key
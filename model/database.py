@@ -1,43 +1,321 @@
+import logging
 import sqlite3
+import threading
+import time
+from collections.abc import Callable
+from contextlib import contextmanager, nullcontext
 from sqlite3 import Error
+from typing import TypeVar
+from model.blocking_keys import phone_key, surname_key
+from model.instrumentation import Instrumentation, InstrumentedConnection
+from model.retry import RetryPolicy
+
+T = TypeVar("T")
+
+logger = logging.getLogger(__name__)
 
 class Database:
     """
-    Create a connection with the database an create the tables inside it if isn't exists
+    Create a connection with the database an create the tables inside it if isn't exists.
+    Owns a small connection pool: one long-lived writer connection shared by all threads
+    and one reader connection per thread, all configured once when they are opened
     """
-    def __init__(self, db_name="database.db"):
+    # Page cache size for every pooled connection, in KiB
+    CACHE_SIZE_KIB = 8192
+    # How long a statement waits for a lock held by another process before failing as busy, in ms
+    BUSY_TIMEOUT_MS = 5000
+
+    def __init__(self, db_name="database.db", cache_size_kib=CACHE_SIZE_KIB, journal_mode="WAL", synchronous="NORMAL",
+                 instrumentation: Instrumentation | None = None, busy_timeout_ms: float = BUSY_TIMEOUT_MS,
+                 retry_policy: RetryPolicy | None = None):
         self.db_name = db_name
-        
+        self.cache_size_kib = cache_size_kib
+        self.journal_mode = journal_mode
+        self.synchronous = synchronous
+        # Optional statement and operation timings
+        self.instrumentation = instrumentation
+        self.busy_timeout_ms = busy_timeout_ms
+        # Retries the write transactions that still fail as busy, see write()
+        self.retry_policy = retry_policy or RetryPolicy()
+
+        # Pool state
+        self._writer = None
+        self._writer_lock = threading.RLock()
+        self._local = threading.local()
+        self._readers = []
+        self._readers_lock = threading.Lock()
+
     def get_connection(self):
-        """Get the connection to the database and return it"""
+        """Open a new configured connection to the database and return it"""
         try:
-            return sqlite3.connect(self.db_name)
+            # timeout is SQLite's busy timeout
+            timeout = self.busy_timeout_ms / 1000
+            if self.instrumentation is None:
+                connection = sqlite3.connect(self.db_name, timeout=timeout, check_same_thread=False)
+            else:
+                connection = sqlite3.connect(self.db_name, timeout=timeout, check_same_thread=False,
+                                             factory=InstrumentedConnection)
+                connection.instrumentation = self.instrumentation
+            self.configure_connection(connection)
+            return connection
         except Error as e:
-            print(f"Can't connect to the database: {str(e)}")
+            logger.error("Can't connect to the database: %s", e)
             return False
     # End of get_connection
-    
+
+    def configure_connection(self, connection):
+        """Apply the pragmas every pooled connection shares"""
+        # Only takes effect on a new file (before journal_mode writes its header), so space freed
+        # by deletes can later be given back in steps, see DatabaseMaintenance.incremental_vacuum
+        connection.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        connection.execute(f"PRAGMA journal_mode={self.journal_mode}")
+        connection.execute(f"PRAGMA synchronous={self.synchronous}")
+        connection.execute(f"PRAGMA cache_size=-{int(self.cache_size_kib)}")
+        connection.execute("PRAGMA temp_store=MEMORY")
+        # Called by the triggers that keep the duplicate detection keys current
+        connection.create_function("surname_key", 1, surname_key, deterministic=True)
+        connection.create_function("phone_key", 1, phone_key, deterministic=True)
+    # End of configure_connection
+
+    def measure(self, operation: str):
+        """Context manager timing one model operation, a no-op without instrumentation"""
+        if self.instrumentation is None:
+            return nullcontext()
+        return self.instrumentation.measure(operation)
+    # End of measure
+
+    @contextmanager
+    def writer(self):
+        """
+        Yield the shared writer connection holding the writer lock.
+        Commits when the block ends and rolls back if it raises
+        """
+        with self._writer_lock:
+            if self._writer is None:
+                self._writer = self.get_connection()
+                if not self._writer:
+                    self._writer = None
+                    raise Error(f"Can't open the writer connection to '{self.db_name}'")
+            try:
+                yield self._writer
+                self._writer.commit()
+            except BaseException:
+                self._writer.rollback()
+                raise
+    # End of writer
+
+    def write(self, work: Callable[[sqlite3.Connection], T]) -> T:
+        """
+        Run work with the writer connection in one transaction and return what it returns.
+        When another process holds the lock past the busy timeout the transaction is rolled back
+        and run again by the retry policy, so work must only touch the connection
+        """
+        def attempt():
+            with self.writer() as connection:
+                return work(connection)
+        return self.retry_policy.run(attempt)
+    # End of write
+
+    def yield_writer(self, seconds: float = 0.0):
+        """
+        Called inside writer() by long maintenance work: release the writer lock for a moment
+        so waiting writes run, then take it back
+        """
+        self._writer_lock.release()
+        try:
+            time.sleep(seconds)
+        finally:
+            self._writer_lock.acquire()
+    # End of yield_writer
+
+    @contextmanager
+    def reader(self):
+        """Yield the reader connection that belongs to the calling thread"""
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = self.get_connection()
+            if not connection:
+                raise Error(f"Can't open a reader connection to '{self.db_name}'")
+            self._local.connection = connection
+            with self._readers_lock:
+                self._readers.append(connection)
+        yield connection
+    # End of reader
+
+    def close(self):
+        """Close every pooled connection, used on application shutdown"""
+        with self._writer_lock:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+        with self._readers_lock:
+            for connection in self._readers:
+                connection.close()
+            self._readers.clear()
+        self._local = threading.local()
+    # End of close
+
     def create_tables(self):
-        """Create table into the database if this not exists"""
-        conexion = self.get_connection()
-        if conexion is None:
-            return False
-        
+        """
+        Create the tables if they don't exist, by applying the pending schema migrations.
+        The applied version is kept in PRAGMA user_version, so when the schema is current
+        startup only reads that integer instead of re-running the DDL
+        """
+        migrations = self.migrations()
         try:
-            with conexion:
+            with self.writer() as conexion:
                 cursor = conexion.cursor()
-                cursor.execute("""
-                    CREATE TABLE IF NOT EXISTS person(
-                        identity_document VARCHAR(11) PRIMARY KEY,
-                        name VARCHAR(20) NOT NULL,
-                        surname VARCHAR(20) NOT NULL,
-                        address VARCHAR(100),
-                        phone_number VARCHAR(11)
-                    )
-                """)
-                conexion.commit()
+                if cursor.execute("PRAGMA user_version").fetchone()[0] >= len(migrations):
+                    return True
+
+                # Read it again holding the write lock, another process may have migrated meanwhile
+                cursor.execute("BEGIN IMMEDIATE")
+                version = cursor.execute("PRAGMA user_version").fetchone()[0]
+                for number, migration in enumerate(migrations[version:], start=version + 1):
+                    logger.info("Applying schema migration %s: %s", number, migration.__name__)
+                    migration(cursor)
+                    cursor.execute(f"PRAGMA user_version={number}")
                 return True
         except Error as e:
-            print(f"An error occurred while try connecting with the database: {str(e)}")
+            logger.error("An error occurred while try connecting with the database: %s", e)
             return False
-    # End of create_tables
\ No newline at end of file
+    # End of create_tables
+
+    def migrations(self) -> list:
+        """Schema migrations in order, migration N brings the schema to user_version N. Only append to it"""
+        return [
+            self.create_person_table,
+            self.create_search_index,
+            self.create_blocking_keys,
+            self.create_change_log,
+            self.create_secondary_indexes
+        ]
+    # End of migrations
+
+    def create_person_table(self, cursor):
+        """Create the person table"""
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS person(
+                identity_document VARCHAR(11) PRIMARY KEY,
+                name VARCHAR(20) NOT NULL,
+                surname VARCHAR(20) NOT NULL,
+                address VARCHAR(100),
+                phone_number VARCHAR(11)
+            )
+        """)
+    # End of create_person_table
+
+    def create_search_index(self, cursor):
+        """
+        Create the FTS5 index over name, surname and address, kept in sync with the person
+        table by triggers. The index is filled from the existing rows the first time it is created
+        """
+        exists = cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE type='table' AND name='person_fts'"
+        ).fetchone()
+        try:
+            cursor.execute("""
+                CREATE VIRTUAL TABLE IF NOT EXISTS person_fts USING fts5(
+                    name, surname, address,
+                    content='person', content_rowid='rowid',
+                    tokenize='unicode61 remove_diacritics 2',
+                    prefix='2 3'
+                )
+            """)
+        except Error as e:
+            logger.warning("Full-text search is not available in this SQLite build: %s", e)
+            return
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS person_fts_insert AFTER INSERT ON person BEGIN
+                INSERT INTO person_fts(rowid, name, surname, address)
+                VALUES (new.rowid, new.name, new.surname, new.address);
+            END
+        """)
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS person_fts_delete AFTER DELETE ON person BEGIN
+                INSERT INTO person_fts(person_fts, rowid, name, surname, address)
+                VALUES ('delete', old.rowid, old.name, old.surname, old.address);
+            END
+        """)
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS person_fts_update AFTER UPDATE ON person BEGIN
+                INSERT INTO person_fts(person_fts, rowid, name, surname, address)
+                VALUES ('delete', old.rowid, old.name, old.surname, old.address);
+                INSERT INTO person_fts(rowid, name, surname, address)
+                VALUES (new.rowid, new.name, new.surname, new.address);
+            END
+        """)
+        if not exists:
+            cursor.execute("INSERT INTO person_fts(person_fts) VALUES ('rebuild')")
+    # End of create_search_index
+
+    def create_blocking_keys(self, cursor):
+        """
+        Create the person_blocking table with the duplicate detection keys of every person
+        (phonetic surname code and normalized phone), indexed so a block is one index range.
+        Triggers keep it in sync with the person table, it is filled from the existing rows here
+        """
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS person_blocking(
+                identity_document VARCHAR(11) PRIMARY KEY,
+                surname_key TEXT,
+                phone_key TEXT
+            )
+        """)
+        cursor.execute("CREATE INDEX IF NOT EXISTS person_blocking_surname ON person_blocking(surname_key)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS person_blocking_phone ON person_blocking(phone_key)")
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS person_blocking_insert AFTER INSERT ON person BEGIN
+                INSERT OR REPLACE INTO person_blocking(identity_document, surname_key, phone_key)
+                VALUES (new.identity_document, surname_key(new.surname), phone_key(new.phone_number));
+            END
+        """)
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS person_blocking_delete AFTER DELETE ON person BEGIN
+                DELETE FROM person_blocking WHERE identity_document = old.identity_document;
+            END
+        """)
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS person_blocking_update AFTER UPDATE OF surname, phone_number ON person BEGIN
+                UPDATE person_blocking
+                SET surname_key = surname_key(new.surname), phone_key = phone_key(new.phone_number)
+                WHERE identity_document = new.identity_document;
+            END
+        """)
+        cursor.execute("""
+            INSERT OR REPLACE INTO person_blocking(identity_document, surname_key, phone_key)
+            SELECT identity_document, surname_key(surname), phone_key(phone_number) FROM person
+        """)
+    # End of create_blocking_keys
+
+    def create_change_log(self, cursor):
+        """
+        Create the person_change log: triggers add one row per insert, update and delete of a person,
+        numbered by an AUTOINCREMENT seq that only grows, so other stations can ask for what changed since
+        the last seq they saw
+        """
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS person_change(
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                identity_document VARCHAR(11) NOT NULL,
+                operation TEXT NOT NULL
+            )
+        """)
+        for operation, row in (("insert", "new"), ("update", "new"), ("delete", "old")):
+            cursor.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS person_change_{operation} AFTER {operation.upper()} ON person BEGIN
+                    INSERT INTO person_change(identity_document, operation) VALUES ({row}.identity_document, '{operation}');
+                END
+            """)
+    # End of create_change_log
+
+    def create_secondary_indexes(self, cursor):
+        """
+        Index surname and phone number for filters, reverse phone lookups and sorted pages.
+        The identity document closes each index so pages sorted by the column (then by ID) are
+        read straight from it, without sorting
+        """
+        cursor.execute("CREATE INDEX IF NOT EXISTS person_surname ON person(surname, identity_document)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS person_phone ON person(phone_number, identity_document)")
+        cursor.execute("ANALYZE person")
+    # End of create_secondary_indexes
\ No newline at end of file
@@ -0,0 +1,181 @@
+import functools
+import logging
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+# Statements slower than the threshold are written here, one structured record each
+slow_query_logger = logging.getLogger("model.slow_queries")
+
+class LatencyHistogram:
+    """Latency histogram over fixed, roughly logarithmic buckets"""
+    # Upper bound of each bucket in milliseconds, a last bucket holds everything slower
+    BOUNDS_MS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+
+    def __init__(self):
+        self.buckets = [0] * (len(self.BOUNDS_MS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def record(self, milliseconds: float):
+        """Add one sample"""
+        index = 0
+        while index < len(self.BOUNDS_MS) and milliseconds > self.BOUNDS_MS[index]:
+            index += 1
+        self.buckets[index] += 1
+        self.count += 1
+        self.total_ms += milliseconds
+        self.max_ms = max(self.max_ms, milliseconds)
+    # End of record
+
+    def percentile(self, fraction: float) -> float:
+        """Return the upper bound of the bucket holding the given percentile, in milliseconds"""
+        if not self.count:
+            return 0.0
+        rank = fraction * self.count
+        seen = 0
+        for index, bucket in enumerate(self.buckets):
+            seen += bucket
+            if seen >= rank:
+                return self.BOUNDS_MS[index] if index < len(self.BOUNDS_MS) else self.max_ms
+        return self.max_ms
+    # End of percentile
+
+    def snapshot(self) -> dict:
+        """Return the histogram as plain data"""
+        return {
+            "count": self.count,
+            "mean_ms": self.total_ms / self.count if self.count else 0.0,
+            "p50_ms": self.percentile(0.50),
+            "p95_ms": self.percentile(0.95),
+            "p99_ms": self.percentile(0.99),
+            "max_ms": self.max_ms,
+            "buckets": dict(zip([*map(str, self.BOUNDS_MS), "inf"], self.buckets))
+        }
+    # End of snapshot
+
+class Instrumentation:
+    """
+    Collects timings for model operations and for every SQL statement run on the instrumented
+    connections, and logs statements slower than slow_query_ms to the slow-query log
+    """
+    SLOW_QUERY_MS = 100.0
+
+    def __init__(self, slow_query_ms: float = SLOW_QUERY_MS):
+        self.slow_query_ms = slow_query_ms
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._operations = {}
+        self._statements = {}
+
+    @contextmanager
+    def measure(self, operation: str):
+        """Time the block as one call of the operation, statements inside are attributed to it"""
+        previous = getattr(self._local, "operation", None)
+        self._local.operation = operation
+        start = time.perf_counter()
+        failed = False
+        try:
+            yield
+        except BaseException:
+            failed = True
+            raise
+        finally:
+            self._local.operation = previous
+            self._record(self._operations, operation, (time.perf_counter() - start) * 1000, failed)
+    # End of measure
+
+    def record_statement(self, sql: str, seconds: float, failed: bool = False):
+        """Record one statement run, logging it if it went over the slow-query threshold"""
+        statement = " ".join(sql.split())
+        milliseconds = seconds * 1000
+        self._record(self._statements, statement, milliseconds, failed)
+        if milliseconds >= self.slow_query_ms:
+            operation = getattr(self._local, "operation", None)
+            slow_query_logger.warning(
+                "Slow query (%.1f ms) in %s: %s", milliseconds, operation or "-", statement,
+                extra={"duration_ms": milliseconds, "operation": operation, "statement": statement}
+            )
+    # End of record_statement
+
+    def _record(self, table: dict, key: str, milliseconds: float, failed: bool):
+        """Add one sample to the counters of the key"""
+        with self._lock:
+            entry = table.get(key)
+            if entry is None:
+                entry = table[key] = {"calls": 0, "errors": 0, "latency": LatencyHistogram()}
+            entry["calls"] += 1
+            entry["errors"] += failed
+            entry["latency"].record(milliseconds)
+    # End of _record
+
+    def snapshot(self) -> dict:
+        """Return a copy of every counter and histogram, for dashboards and the benchmarks"""
+        with self._lock:
+            return {
+                "slow_query_ms": self.slow_query_ms,
+                "operations": {
+                    name: {"calls": entry["calls"], "errors": entry["errors"], **entry["latency"].snapshot()}
+                    for name, entry in self._operations.items()
+                },
+                "statements": {
+                    sql: {"calls": entry["calls"], "errors": entry["errors"], **entry["latency"].snapshot()}
+                    for sql, entry in self._statements.items()
+                }
+            }
+    # End of snapshot
+
+    def reset(self):
+        """Drop every counter"""
+        with self._lock:
+            self._operations.clear()
+            self._statements.clear()
+    # End of reset
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """Cursor that reports the duration of every statement to its connection's instrumentation"""
+    def execute(self, sql, parameters=()):
+        start = time.perf_counter()
+        failed = True
+        try:
+            result = super().execute(sql, parameters)
+            failed = False
+            return result
+        finally:
+            self.connection.instrumentation.record_statement(sql, time.perf_counter() - start, failed)
+
+    def executemany(self, sql, seq_of_parameters):
+        start = time.perf_counter()
+        failed = True
+        try:
+            result = super().executemany(sql, seq_of_parameters)
+            failed = False
+            return result
+        finally:
+            self.connection.instrumentation.record_statement(sql, time.perf_counter() - start, failed)
+
+class InstrumentedConnection(sqlite3.Connection):
+    """Connection whose cursors, and execute shortcuts, are all instrumented"""
+    instrumentation = None
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+def timed_operation(operation: str):
+    """Decorate a PersonModel method so each call is measured as the given operation"""
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            with self.db.measure(operation):
+                return method(self, *args, **kwargs)
+        return wrapper
+    return decorator
+# End of timed_operation
\ No newline at end of file
@@ -0,0 +1,185 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections.abc import Callable
+from model.database import Database
+
+logger = logging.getLogger(__name__)
+
+class BackupRestarted(Exception):
+    """Raised from the backup progress callback to give up on a page-step backup that keeps restarting"""
+
+class DatabaseMaintenance:
+    """
+    Online maintenance of a Database while registrations go on: page-step backups, incremental
+    vacuum and statistics refresh. Long work runs in small steps on the writer connection and the
+    writer lock is released between steps, so a write waits at most one step.
+    Every operation returns a report dict with its duration, progress goes to the progress
+    callback (operation, done, total), or to the log when there is none
+    """
+    # Pages copied per backup step and freed per incremental vacuum step
+    BACKUP_PAGES = 256
+    VACUUM_PAGES = 256
+    # Pause between steps, long enough for a waiting write to take the writer lock
+    STEP_PAUSE = 0.005
+    # Restarts caused by other processes writing before a backup falls back to one snapshot copy
+    MAX_RESTARTS = 5
+    # Rows ANALYZE samples per index, keeps it fast on big tables
+    ANALYSIS_LIMIT = 1000
+
+    def __init__(self, db: Database, progress: Callable[[str, int, int], None] | None = None):
+        self.db = db
+        self.progress = progress or self.log_progress
+
+    def log_progress(self, operation: str, done: int, total: int):
+        """Default progress callback, logs every step"""
+        logger.info("%s: %s of %s pages", operation, done, total)
+    # End of log_progress
+
+    def backup(self, target_path: str, pages: int = BACKUP_PAGES, pause: float = STEP_PAUSE) -> dict:
+        """
+        Copy the database to target_path while it is in use, pages at a time with the sqlite3 backup API.
+        The copy is made from the writer connection, so writes of this process made between steps go
+        into the backup too. Writes from other processes restart it; after MAX_RESTARTS the copy is taken
+        in one step from a read snapshot, which in WAL mode doesn't block writers either.
+        The copy is written next to target_path and renamed over it once complete, never leaving a torn file
+        """
+        start = time.perf_counter()
+        temporary = target_path + ".tmp"
+        restarts = 0
+        remaining_before = None
+
+        def on_progress(status, remaining, total):
+            nonlocal restarts, remaining_before
+            if remaining_before is not None and remaining > remaining_before:
+                restarts += 1
+                if restarts > self.MAX_RESTARTS:
+                    raise BackupRestarted()
+            remaining_before = remaining
+            self.progress("backup", total - remaining, total)
+            self.db.yield_writer(pause)
+
+        target = sqlite3.connect(temporary)
+        try:
+            try:
+                with self.db.writer() as connection:
+                    connection.backup(target, pages=pages, progress=on_progress)
+            except BackupRestarted:
+                logger.warning("The backup restarted %s times, copying a snapshot in one step", restarts)
+                with self.db.reader() as connection:
+                    connection.backup(target)
+            target.close()
+            os.replace(temporary, target_path)
+        except BaseException:
+            target.close()
+            if os.path.exists(temporary):
+                os.remove(temporary)
+            raise
+
+        report = {
+            "operation": "backup",
+            "target": target_path,
+            "bytes": os.path.getsize(target_path),
+            "restarts": restarts,
+            "seconds": time.perf_counter() - start
+        }
+        logger.info("Backup of '%s' to '%s' done in %.2fs", self.db.db_name, target_path, report["seconds"])
+        return report
+    # End of backup
+
+    def enable_incremental_vacuum(self) -> dict:
+        """
+        Switch a database created before incremental vacuum to it. This needs one full VACUUM,
+        which blocks writes for its whole duration: run it once, in a quiet moment
+        """
+        start = time.perf_counter()
+        with self.db.writer() as connection:
+            connection.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            connection.execute("VACUUM")
+        return {"operation": "enable_incremental_vacuum", "seconds": time.perf_counter() - start}
+    # End of enable_incremental_vacuum
+
+    def incremental_vacuum(self, pages: int = VACUUM_PAGES, pause: float = STEP_PAUSE) -> dict:
+        """
+        Give the free pages left by deletes back to the file system, pages at a time,
+        each step its own short write transaction
+        """
+        start = time.perf_counter()
+        freed = 0
+        with self.db.writer() as connection:
+            if connection.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+                logger.warning("'%s' doesn't use incremental vacuum, see enable_incremental_vacuum", self.db.db_name)
+                return {"operation": "incremental_vacuum", "pages": 0, "seconds": time.perf_counter() - start}
+            total = connection.execute("PRAGMA freelist_count").fetchone()[0]
+            while freed < total:
+                # Frees one page per step of the statement: execute() would stop after the first one,
+                # executescript() runs it to the end (and commits)
+                connection.executescript(f"PRAGMA incremental_vacuum({int(pages)})")
+                left = connection.execute("PRAGMA freelist_count").fetchone()[0]
+                freed = total - left
+                self.progress("incremental_vacuum", freed, total)
+                if not left:
+                    break
+                self.db.yield_writer(pause)
+        return {"operation": "incremental_vacuum", "pages": freed, "seconds": time.perf_counter() - start}
+    # End of incremental_vacuum
+
+    def analyze(self) -> dict:
+        """Refresh the query planner statistics of every table and index, sampling ANALYSIS_LIMIT rows each"""
+        start = time.perf_counter()
+        with self.db.writer() as connection:
+            connection.execute(f"PRAGMA analysis_limit={int(self.ANALYSIS_LIMIT)}")
+            connection.execute("ANALYZE")
+        return {"operation": "analyze", "seconds": time.perf_counter() - start}
+    # End of analyze
+
+    def optimize(self) -> dict:
+        """Let SQLite refresh the statistics that are out of date (PRAGMA optimize), cheap enough to run often"""
+        start = time.perf_counter()
+        with self.db.writer() as connection:
+            connection.execute(f"PRAGMA analysis_limit={int(self.ANALYSIS_LIMIT)}")
+            connection.execute("PRAGMA optimize")
+        return {"operation": "optimize", "seconds": time.perf_counter() - start}
+    # End of optimize
+
+class MaintenanceScheduler:
+    """Runs maintenance tasks every so many seconds on one background thread, one task at a time"""
+    def __init__(self):
+        self.tasks = []
+        self._stop = threading.Event()
+        self._thread = None
+
+    def every(self, seconds: float, task: Callable[[], dict]):
+        """Run task every seconds, the first time seconds after start()"""
+        self.tasks.append([seconds, time.monotonic() + seconds, task])
+    # End of every
+
+    def start(self):
+        """Start the background thread"""
+        self._thread = threading.Thread(target=self._run, name="maintenance", daemon=True)
+        self._thread.start()
+    # End of start
+
+    def _run(self):
+        while not self._stop.is_set():
+            task = min(self.tasks, key=lambda task: task[1], default=None)
+            if task is None or self._stop.wait(max(task[1] - time.monotonic(), 0)):
+                return
+            try:
+                report = task[2]()
+                logger.info("Scheduled maintenance: %s", report)
+            except Exception:
+                # Not only database errors: a backup can hit a full disk or fail to rename its file.
+                # The thread must survive them or every later task silently stops
+                logger.exception("Scheduled maintenance failed")
+            task[1] = time.monotonic() + task[0]
+    # End of _run
+
+    def stop(self):
+        """Stop the thread, waiting for the running task to finish"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+    # End of stop
@@ -0,0 +1,84 @@
+# Column order of the person table, shared by every person record
+PERSON_COLUMNS = ("identity_document", "name", "surname", "address", "phone_number")
+
+class Person:
+    """
+    One person record, as read from the person table and shown by the view.
+    Fields live in __slots__: a record takes 8 bytes less than the row tuple SQLite returns, about 2%
+    of a row once its strings are counted, and 56 and 112 bytes less than sqlite3.Row and a dict.
+    It still behaves as the (identity_document, name, surname, address, phone_number) sequence: it
+    can be indexed, sliced, unpacked and bound as the parameters of a query. Indexing and iterating
+    read the slots directly, no tuple is built. Records only compare equal to records
+    """
+    __slots__ = PERSON_COLUMNS
+
+    def __init__(self, identity_document: str, name: str, surname: str, address: str | None = None,
+                 phone_number: str | None = None):
+        self.identity_document = identity_document
+        self.name = name
+        self.surname = surname
+        self.address = address
+        self.phone_number = phone_number
+
+    @classmethod
+    def from_row(cls, cursor, row: tuple) -> "Person":
+        """Row factory for cursors selecting every person column (SELECT * FROM person)"""
+        return cls(*row)
+    # End of from_row
+
+    @classmethod
+    def from_mapping(cls, mapping) -> "Person":
+        """Build a record from a mapping holding every person column, e.g. a JSON object"""
+        return cls(*(mapping[column] for column in PERSON_COLUMNS))
+    # End of from_mapping
+
+    def as_tuple(self) -> tuple:
+        """Return the fields in column order"""
+        return self.identity_document, self.name, self.surname, self.address, self.phone_number
+    # End of as_tuple
+
+    def as_dict(self) -> dict:
+        """Return the fields by column name"""
+        return {column: getattr(self, column) for column in PERSON_COLUMNS}
+    # End of as_dict
+
+    def update_parameters(self) -> tuple:
+        """Return the parameters of PersonModel.UPDATE_SQL: the fields with the identity document last"""
+        return self.name, self.surname, self.address, self.phone_number, self.identity_document
+    # End of update_parameters
+
+    def replace(self, **changes) -> "Person":
+        """Return a copy with the given fields changed"""
+        fields = self.as_dict()
+        fields.update(changes)
+        return Person(**fields)
+    # End of replace
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return tuple(getattr(self, column) for column in PERSON_COLUMNS[index])
+        return getattr(self, PERSON_COLUMNS[index])
+
+    def __iter__(self):
+        yield self.identity_document
+        yield self.name
+        yield self.surname
+        yield self.address
+        yield self.phone_number
+
+    def __len__(self) -> int:
+        return 5
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, Person):
+            return NotImplemented
+        return (self.identity_document == other.identity_document and self.name == other.name
+                and self.surname == other.surname and self.address == other.address
+                and self.phone_number == other.phone_number)
+
+    # Equal records share their identity document, which is enough to spread them in a set or dict
+    def __hash__(self) -> int:
+        return hash(self.identity_document)
+
+    def __repr__(self) -> str:
+        return f"Person{self.as_tuple()!r}"
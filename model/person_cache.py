@@ -0,0 +1,89 @@
+import threading
+import time
+from collections import OrderedDict
+
+class PersonCache:
+    """
+    Bounded LRU cache of person rows keyed by identity document, with an optional TTL.
+    Misses are cached too (as None) so repeated lookups of unknown IDs are cheap.
+    Safe to share between threads
+    """
+    CAPACITY = 1024
+
+    def __init__(self, capacity: int = CAPACITY, ttl: float | None = None):
+        self.capacity = capacity
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+        # Bumped on every invalidation, a read that started before it must not fill the cache
+        self._generation = 0
+
+        # Counters
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, identity_document: str) -> tuple[bool, tuple | None]:
+        """Return (found, person). found is False when the ID isn't cached or its entry expired"""
+        with self._lock:
+            entry = self._entries.get(identity_document)
+            if entry is not None and self.ttl is not None and time.monotonic() - entry[1] > self.ttl:
+                del self._entries[identity_document]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return False, None
+            self._entries.move_to_end(identity_document)
+            self.hits += 1
+            return True, entry[0]
+    # End of get
+
+    def generation(self) -> int:
+        """Return the current generation, to pass to put after reading from the database"""
+        return self._generation
+    # End of generation
+
+    def put(self, identity_document: str, person: tuple | None, generation: int | None = None):
+        """
+        Store a person (or None for a miss), evicting the least recently used entry when full.
+        With a generation, nothing is stored if an invalidation happened since it was taken
+        """
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+            self._entries[identity_document] = (person, time.monotonic())
+            self._entries.move_to_end(identity_document)
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+    # End of put
+
+    def invalidate(self, *identity_documents: str):
+        """Forget the given IDs"""
+        with self._lock:
+            self._generation += 1
+            for identity_document in identity_documents:
+                self._entries.pop(identity_document, None)
+    # End of invalidate
+
+    def clear(self):
+        """Forget every entry"""
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+    # End of clear
+
+    def stats(self) -> dict:
+        """Return the counters and the current size"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "capacity": self.capacity,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": self.hits / lookups if lookups else 0.0
+            }
+    # End of stats
\ No newline at end of file
@@ -0,0 +1,163 @@
+import logging
+from collections.abc import Iterator
+from itertools import combinations, groupby
+from operator import itemgetter
+from sqlite3 import Error
+from model.blocking_keys import normalize_text, phone_key, surname_key
+from model.database import Database
+from model.instrumentation import timed_operation
+
+logger = logging.getLogger(__name__)
+
+class PersonDeduplicator:
+    """
+    Finds persons registered more than once, e.g. under a mistyped identity document.
+    Instead of comparing every pair, persons are grouped in blocks sharing a phonetic surname
+    code or a normalized phone number (the indexed person_blocking table) and only pairs inside
+    a block are scored. Scores go from 0 to 1, a weighted similarity of the person fields: the
+    Dice coefficient of their character bigrams, which set operations compute at C speed
+    """
+    # Weight of each person column in the similarity score. The identity document weighs little: a person
+    # registered again under a different one still crosses THRESHOLD on the other fields alone (0.9)
+    WEIGHTS = {"identity_document": 0.1, "name": 0.2, "surname": 0.2, "address": 0.2, "phone_number": 0.3}
+    # Pairs scoring at least this are reported as likely duplicates
+    THRESHOLD = 0.85
+    # Candidates of the surname block scored by check_person, bounds its latency on very common surnames.
+    # The phone block is read whole, a phone number is only shared by a household
+    MAX_CANDIDATES = 200
+    # Blocks bigger than this are split by the first letter of the name in batch mode,
+    # so a common surname doesn't turn into a quadratic number of comparisons
+    MAX_BLOCK_SIZE = 100
+
+    BLOCK_KEYS = ("surname_key", "phone_key")
+    # (column index, weight) heaviest first, the order _score compares the fields in
+    ORDER = sorted(enumerate(WEIGHTS.values()), key=itemgetter(1), reverse=True)
+
+    def __init__(self, db: Database, threshold: float = THRESHOLD):
+        self.db = db
+        self.threshold = threshold
+
+    def normalize(self, person_data: tuple) -> tuple[frozenset, ...]:
+        """
+        Return the person fields as they are compared: the set of character bigrams of the
+        accent-free lower case text, phones by their key. Empty fields give an empty set
+        """
+        fields = [normalize_text(value) for value in person_data[:len(self.WEIGHTS)]]
+        fields[4] = phone_key(fields[4]) or fields[4]
+        return tuple(
+            frozenset(text[start:start + 2] for start in range(len(text) - 1)) if len(text) > 1 else frozenset(text and [text])
+            for text in fields
+        )
+    # End of normalize
+
+    def similarity(self, first: tuple, second: tuple) -> float:
+        """Score how alike two person tuples are, fields empty in both are left out"""
+        return self._score(self.normalize(first), self.normalize(second))
+    # End of similarity
+
+    def _score(self, first: tuple[frozenset, ...], second: tuple[frozenset, ...], threshold: float = 0.0) -> float:
+        """
+        Score two normalized persons. Heaviest fields are compared first and 0 is returned as soon
+        as the pair can't reach threshold anymore, which skips most comparisons inside a block
+        """
+        weights = [(index, weight) for index, weight in self.ORDER if first[index] or second[index]]
+        total = sum(weight for _, weight in weights)
+        if not total:
+            return 0.0
+        score, remaining = 0.0, total
+        for index, weight in weights:
+            remaining -= weight
+            a, b = first[index], second[index]
+            if a == b:
+                score += weight
+            elif a and b:
+                score += weight * 2 * len(a & b) / (len(a) + len(b))
+            if score + remaining < threshold * total:
+                return 0.0
+        return score / total
+    # End of _score
+
+    @timed_operation("check_duplicates")
+    def check_person(self, person_data: tuple, limit: int = 5) -> list[tuple[tuple, float]]:
+        """
+        Return up to limit stored persons that are likely duplicates of person_data, as
+        (person, score) pairs best first. Only persons sharing a blocking key with it are
+        read: every one with its phone number and at most MAX_CANDIDATES with its surname code,
+        each block its own index lookup so a big surname block can't push the phone matches out.
+        Expects: (identity_document, name, surname, address, phone_number)
+        """
+        surname, phone = surname_key(person_data[2]), phone_key(person_data[4])
+        if surname is None and phone is None:
+            return []
+        query = """
+            SELECT p.* FROM person_blocking b
+            JOIN person p ON p.identity_document = b.identity_document
+            WHERE b.{} = ? AND b.identity_document <> ?
+        """
+        candidates = {}
+        try:
+            with self.db.reader() as connection:
+                if phone is not None:
+                    for row in connection.execute(query.format("phone_key"), (phone, person_data[0])):
+                        candidates[row[0]] = row
+                if surname is not None:
+                    for row in connection.execute(query.format("surname_key") + " LIMIT ?",
+                                                  (surname, person_data[0], self.MAX_CANDIDATES)):
+                        candidates.setdefault(row[0], row)
+        except Error as e:
+            logger.error("An error occurred while looking for duplicates: %s", e)
+            return []
+
+        normalized = self.normalize(person_data)
+        matches = [(candidate, self._score(normalized, self.normalize(candidate), self.threshold))
+                   for candidate in candidates.values()]
+        matches = [match for match in matches if match[1] >= self.threshold]
+        matches.sort(key=itemgetter(1), reverse=True)
+        return matches[:limit]
+    # End of check_person
+
+    def find_duplicates(self) -> Iterator[tuple[str, str, float]]:
+        """
+        Scan the whole registry and yield (identity_document, other_identity_document, score)
+        for every likely duplicate pair. One pass per blocking key reads the persons ordered by
+        that key and scores the pairs of each block; a pair found by both passes is yielded once.
+        Database errors are raised
+        """
+        reported = set()
+        for column in self.BLOCK_KEYS:
+            for block in self._blocks(column):
+                normalized = [(person[0], self.normalize(person)) for person in block]
+                for (first, first_fields), (second, second_fields) in combinations(normalized, 2):
+                    pair = (first, second) if first < second else (second, first)
+                    if pair in reported:
+                        continue
+                    score = self._score(first_fields, second_fields, self.threshold)
+                    if score >= self.threshold:
+                        reported.add(pair)
+                        yield (*pair, score)
+    # End of find_duplicates
+
+    def _blocks(self, column: str) -> Iterator[list[tuple]]:
+        """Yield the blocks of persons sharing a value of column, split when too big"""
+        with self.db.reader() as connection:
+            cursor = connection.execute(f"""
+                SELECT b.{column}, p.* FROM person_blocking b
+                JOIN person p ON p.identity_document = b.identity_document
+                WHERE b.{column} IS NOT NULL
+                ORDER BY b.{column}
+            """)
+            for key, rows in groupby(cursor, key=itemgetter(0)):
+                block = [row[1:] for row in rows]
+                if len(block) <= self.MAX_BLOCK_SIZE:
+                    yield block
+                    continue
+                # Split by the first letter of the name, still too big means a shared phone or
+                # a very common name: skipped, those pairs can't be told apart cheaply anyway
+                block.sort(key=lambda person: normalize_text(person[1])[:1])
+                for _, part in groupby(block, key=lambda person: normalize_text(person[1])[:1]):
+                    part = list(part)
+                    if len(part) <= self.MAX_BLOCK_SIZE:
+                        yield part
+                    else:
+                        logger.warning("Skipped a block of %s persons with %s '%s'", len(part), column, key)
+    # End of _blocks
@@ -0,0 +1,128 @@
+import csv
+import io
+import json
+import os
+import struct
+import zlib
+from collections.abc import Iterator
+from model.person_model import PersonModel, PERSON_COLUMNS
+
+EXPORT_FORMATS = ("csv", "jsonl", "columnar")
+
+# Columnar file layout: the magic line, then one block per row group. Each block is a 4-byte
+# big-endian length followed by a zlib-compressed JSON object {"rows": n, "columns": {name: [values]}}
+COLUMNAR_MAGIC = b"PERSONCOL1\n"
+BLOCK_HEADER = struct.Struct(">I")
+
+class CsvExportWriter:
+    """Encode pages of persons as CSV rows, with a header at the start of the file"""
+    def header(self) -> bytes:
+        return self.encode([PERSON_COLUMNS])
+
+    def encode(self, persons: list[tuple]) -> bytes:
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(persons)
+        return buffer.getvalue().encode("utf-8")
+
+class JsonlExportWriter:
+    """Encode pages of persons as one JSON object per line"""
+    def header(self) -> bytes:
+        return b""
+
+    def encode(self, persons: list[tuple]) -> bytes:
+        lines = (json.dumps(dict(zip(PERSON_COLUMNS, person)), ensure_ascii=False) for person in persons)
+        return "".join(line + "\n" for line in lines).encode("utf-8")
+
+class ColumnarExportWriter:
+    """Encode each page of persons as one compressed, column-oriented row group"""
+    def header(self) -> bytes:
+        return COLUMNAR_MAGIC
+
+    def encode(self, persons: list[tuple]) -> bytes:
+        columns = {column: [person[index] for person in persons] for index, column in enumerate(PERSON_COLUMNS)}
+        block = zlib.compress(json.dumps({"rows": len(persons), "columns": columns}).encode("utf-8"), 6)
+        return BLOCK_HEADER.pack(len(block)) + block
+
+WRITERS = {"csv": CsvExportWriter, "jsonl": JsonlExportWriter, "columnar": ColumnarExportWriter}
+
+def read_columnar(path: str) -> Iterator[tuple]:
+    """Yield the person tuples stored in a columnar export, one row group in memory at a time"""
+    with open(path, "rb") as file:
+        if file.read(len(COLUMNAR_MAGIC)) != COLUMNAR_MAGIC:
+            raise ValueError(f"'{path}' is not a columnar person export")
+        while header := file.read(BLOCK_HEADER.size):
+            group = json.loads(zlib.decompress(file.read(BLOCK_HEADER.unpack(header)[0])))
+            yield from zip(*(group["columns"][column] for column in PERSON_COLUMNS))
+# End of read_columnar
+
+def load_checkpoint(path: str) -> dict | None:
+    """Return the saved checkpoint, or None if there is none"""
+    try:
+        with open(path, encoding="utf-8") as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return None
+# End of load_checkpoint
+
+def save_checkpoint(path: str, checkpoint: dict):
+    """Write the checkpoint atomically, a crash leaves either the old or the new one"""
+    temporary = path + ".tmp"
+    with open(temporary, "w", encoding="utf-8") as file:
+        json.dump(checkpoint, file)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temporary, path)
+# End of save_checkpoint
+
+def export_persons(model: PersonModel, path: str, file_format: str = "csv", filters: dict[str, str] | None = None,
+                   checkpoint_path: str | None = None, page_size: int = 10000) -> int:
+    """
+    Stream the person table (or the rows matching filters) to path and return the rows written.
+    Rows are read in keyset pages ordered by identity document, each page its own short read, so
+    memory stays flat and no read transaction is held against live registrations. With a
+    checkpoint_path the position is saved after every page and an interrupted export resumes
+    from it: the file is truncated back to the last checkpointed page and appended to.
+    Database errors are raised, leaving the checkpoint in place
+    """
+    if file_format not in WRITERS:
+        raise ValueError(f"Unknown export format '{file_format}', expected one of {EXPORT_FORMATS}")
+    writer = WRITERS[file_format]()
+
+    checkpoint = load_checkpoint(checkpoint_path) if checkpoint_path else None
+    if checkpoint is not None and (checkpoint["format"] != file_format or checkpoint["filters"] != (filters or {})):
+        raise ValueError("The checkpoint belongs to an export with another format or other filters")
+
+    mode = "r+b" if checkpoint is not None and os.path.exists(path) else "wb"
+    with open(path, mode) as file:
+        if mode == "r+b":
+            file.truncate(checkpoint["offset"])
+            file.seek(checkpoint["offset"])
+            after_id, rows = checkpoint["after_id"], checkpoint["rows"]
+        else:
+            file.write(writer.header())
+            after_id, rows = None, 0
+
+        while True:
+            page = model.query_persons_page(after_id, page_size, filters=filters)
+            if not page:
+                break
+            file.write(writer.encode(page))
+            after_id, rows = page[-1][0], rows + len(page)
+            if checkpoint_path:
+                file.flush()
+                os.fsync(file.fileno())
+                save_checkpoint(checkpoint_path, {
+                    "format": file_format,
+                    "filters": filters or {},
+                    "after_id": after_id,
+                    "rows": rows,
+                    "offset": file.tell()
+                })
+            if len(page) < page_size:
+                break
+
+    # The export is complete, a later run starts over
+    if checkpoint_path and os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+    return rows
+# End of export_persons
\ No newline at end of file
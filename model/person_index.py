@@ -0,0 +1,344 @@
+import logging
+import threading
+from bisect import bisect_left, bisect_right, insort
+from collections.abc import Iterable, Iterator
+from sqlite3 import Error
+from model.database import Database
+from model.person import PERSON_COLUMNS, Person
+
+logger = logging.getLogger(__name__)
+
+# Stored for NULL: 0xFF never appears in UTF-8 text
+NULL = b"\xff"
+
+class PersonIndex:
+    """
+    In-memory sorted snapshot of the person table answering ID-prefix and range lookups without SQLite.
+    Each column is stored UTF-8 encoded and zero-padded to a fixed width, back to back in one bytearray,
+    rows in the same order as SQLite's BINARY collation of the identity documents. There is no per-row
+    Python object: a million persons take the sum of the column widths per row, about 80 MB for typical
+    data instead of some 400 MB as tuples. Lookups are binary searches over the identity document records.
+    Writes leave the arrays alone: new and changed rows go to a small sorted overflow and replaced or
+    deleted rows are marked, both are merged into the arrays in one pass every MERGE_SIZE changes
+    """
+    # Initial record width of the identity documents, every width grows automatically
+    WIDTH = 11
+    # Rows read per page while building
+    BUILD_PAGE_SIZE = 50000
+    # Overflow rows and deletion marks merged into the arrays at once
+    MERGE_SIZE = 1024
+
+    def __init__(self, width: int = WIDTH):
+        self.widths = dict.fromkeys(PERSON_COLUMNS, 1)
+        self.widths["identity_document"] = width
+        self._columns = {column: bytearray() for column in PERSON_COLUMNS}
+        self._lock = threading.RLock()
+
+        # Encoded identity documents of the rows not merged yet, sorted, and those rows
+        self._overflow = []
+        self._overflow_rows = {}
+        # Positions in the arrays of rows deleted or replaced since the last merge
+        self._deleted = set()
+
+        # Changes made while the index is being built, replayed once it is done
+        self._building = False
+        self._pending = []
+        self.ready = False
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._stored() - len(self._deleted) + len(self._overflow)
+
+    def _stored(self) -> int:
+        """Rows in the arrays, deleted ones included"""
+        return len(self._columns["identity_document"]) // self.widths["identity_document"]
+
+    def build(self, db: Database) -> bool:
+        """
+        Fill the index from the person table, one keyset page at a time.
+        Changes reported while it runs are replayed at the end, lookups are only served once ready
+        """
+        with self._lock:
+            self._building = True
+            self._pending = []
+            self.ready = False
+        columns = {column: bytearray() for column in PERSON_COLUMNS}
+        after_id = ""
+        try:
+            with db.reader() as connection:
+                # Widest value of each column in bytes, so no record has to be padded again
+                lengths = connection.execute(
+                    "SELECT " + ", ".join(f"MAX(LENGTH(CAST({column} AS BLOB)))" for column in PERSON_COLUMNS) + " FROM person"
+                ).fetchone()
+                widths = {column: max(self.widths[column], length or 0) for column, length in zip(PERSON_COLUMNS, lengths)}
+                while True:
+                    page = connection.execute(
+                        "SELECT * FROM person WHERE identity_document > ? ORDER BY identity_document LIMIT ?",
+                        (after_id, self.BUILD_PAGE_SIZE)
+                    ).fetchall()
+                    for column, values in zip(PERSON_COLUMNS, zip(*page)):
+                        width = widths[column]
+                        columns[column] += b"".join(
+                            NULL.ljust(width, b"\x00") if value is None else value.encode("utf-8").ljust(width, b"\x00")
+                            for value in values
+                        )
+                    if len(page) < self.BUILD_PAGE_SIZE:
+                        break
+                    after_id = page[-1][0]
+        except Error as e:
+            logger.error("An error occurred while building the person index: %s", e)
+            with self._lock:
+                self._building = False
+            return False
+
+        with self._lock:
+            self.widths = widths
+            self._columns = columns
+            self._overflow, self._overflow_rows, self._deleted = [], {}, set()
+            self._building = False
+            for method, persons in self._pending:
+                method(persons)
+            self._pending = []
+            self.ready = True
+        return True
+    # End of build
+
+    def _record(self, position: int) -> bytes:
+        """Identity document record at position, zero padded"""
+        width = self.widths["identity_document"]
+        return bytes(self._columns["identity_document"][position * width:(position + 1) * width])
+
+    def _bisect_left(self, record: bytes) -> int:
+        """Position of the first record not lower than record"""
+        low, high = 0, self._stored()
+        while low < high:
+            middle = (low + high) // 2
+            if self._record(middle) < record:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+    # End of _bisect_left
+
+    def _bisect_right(self, record: bytes) -> int:
+        """Position after the last record not greater than record"""
+        low, high = 0, self._stored()
+        while low < high:
+            middle = (low + high) // 2
+            if record < self._record(middle):
+                high = middle
+            else:
+                low = middle + 1
+        return low
+    # End of _bisect_right
+
+    def _position(self, key: bytes) -> int | None:
+        """Position in the arrays of the live row with the encoded identity document key, None if there is none"""
+        if len(key) > self.widths["identity_document"]:
+            return None
+        record = key.ljust(self.widths["identity_document"], b"\x00")
+        position = self._bisect_left(record)
+        if position < self._stored() and position not in self._deleted and self._record(position) == record:
+            return position
+        return None
+    # End of _position
+
+    def _person(self, position: int) -> Person:
+        """Decode the row stored at position"""
+        values = []
+        for column in PERSON_COLUMNS:
+            width = self.widths[column]
+            value = bytes(self._columns[column][position * width:(position + 1) * width])
+            values.append(None if value[:1] == NULL else value.rstrip(b"\x00").decode("utf-8"))
+        return Person(*values)
+    # End of _person
+
+    def put(self, *persons: Person):
+        """Add persons or replace the stored row of their identity document"""
+        self.put_many(persons)
+    # End of put
+
+    def put_many(self, persons: Iterable[Person]):
+        """
+        Add or replace a batch of persons. They wait in the overflow until the next merge.
+        Raises TypeError for a person whose values aren't text (or NULL besides the ID), the persons before it are kept
+        """
+        with self._lock:
+            if self._building:
+                # Checked now, a replay must not fail at the end of the build
+                persons = list(persons)
+                for person in persons:
+                    self._key(person)
+                self._pending.append((self.put_many, persons))
+                return
+            for person in persons:
+                key = self._key(person)
+                if key not in self._overflow_rows:
+                    position = self._position(key)
+                    if position is not None:
+                        # Rows stored as they are, e.g. this station's own writes coming back from the change feed
+                        if self._person(position) == person:
+                            continue
+                        self._deleted.add(position)
+                    insort(self._overflow, key)
+                self._overflow_rows[key] = person
+            self._merge_if_full()
+    # End of put_many
+
+    @staticmethod
+    def _key(person: Person) -> bytes:
+        """Return the encoded identity document of person, raising TypeError if its values aren't text"""
+        if not isinstance(person.identity_document, str) or not all(value is None or isinstance(value, str) for value in person):
+            raise TypeError(f"Person {person!r} can't be indexed, its values must be text")
+        return person.identity_document.encode("utf-8")
+    # End of _key
+
+    def remove(self, *identity_documents: str):
+        """Remove IDs, IDs not present are ignored"""
+        self.remove_many(identity_documents)
+    # End of remove
+
+    def remove_many(self, identity_documents: Iterable[str]):
+        """Remove a batch of IDs: overflow rows are dropped, rows in the arrays marked until the next merge"""
+        with self._lock:
+            if self._building:
+                identity_documents = list(identity_documents)
+                if not all(isinstance(identity_document, str) for identity_document in identity_documents):
+                    raise TypeError("Identity documents must be text")
+                self._pending.append((self.remove_many, identity_documents))
+                return
+            for identity_document in identity_documents:
+                if not isinstance(identity_document, str):
+                    raise TypeError(f"Identity document {identity_document!r} must be text")
+                key = identity_document.encode("utf-8")
+                if self._overflow_rows.pop(key, None) is not None:
+                    del self._overflow[bisect_left(self._overflow, key)]
+                else:
+                    position = self._position(key)
+                    if position is not None:
+                        self._deleted.add(position)
+            self._merge_if_full()
+    # End of remove_many
+
+    def _merge_if_full(self):
+        if len(self._overflow) + len(self._deleted) >= self.MERGE_SIZE:
+            self._merge()
+    # End of _merge_if_full
+
+    def _merge(self):
+        """
+        Merge the overflow rows into the arrays and drop the deleted ones, in one pass: each column is
+        rebuilt by joining the slices of the old array between changes, so a merge costs one copy
+        """
+        # Overflow rows go before the first stored record not lower than them, deleted positions are skipped
+        events = [(self._bisect_left(key.ljust(self.widths["identity_document"], b"\x00")), 0, key) for key in self._overflow]
+        events += [(position, 1, b"") for position in self._deleted]
+        events.sort()
+        rows = [self._overflow_rows[key] for key in self._overflow]
+
+        for column in PERSON_COLUMNS:
+            width = max([self.widths[column]] + [len(self._encode(getattr(person, column))) for person in rows])
+            stored = self._columns[column]
+            if width > self.widths[column]:
+                stored = self._widen(stored, self.widths[column], width)
+            # Slices of a memoryview don't copy, the join below is the only copy of the column
+            stored = memoryview(stored)
+            pieces, previous = [], 0
+            for position, kind, key in events:
+                pieces.append(stored[previous * width:position * width])
+                if kind:
+                    previous = position + 1
+                else:
+                    previous = position
+                    pieces.append(self._encode(getattr(self._overflow_rows[key], column)).ljust(width, b"\x00"))
+            pieces.append(stored[previous * width:])
+            self._columns[column] = bytearray().join(pieces)
+            stored.release()
+            self.widths[column] = width
+        self._overflow, self._overflow_rows, self._deleted = [], {}, set()
+    # End of _merge
+
+    @staticmethod
+    def _encode(value: str | None) -> bytes:
+        return NULL if value is None else value.encode("utf-8")
+
+    @staticmethod
+    def _widen(stored: bytearray, old_width: int, width: int) -> bytearray:
+        """Return the records of stored re-padded from old_width to width, copying one byte column at a time"""
+        widened = bytearray(len(stored) // old_width * width)
+        for offset in range(old_width):
+            widened[offset::width] = stored[offset::old_width]
+        return widened
+    # End of _widen
+
+    def _scan(self, start: int, end: int, low: int, high: int, limit: int) -> Iterator[Person]:
+        """
+        Yield up to limit rows in ID order, merging the live array rows at positions start to end
+        with the overflow rows low to high
+        """
+        if limit <= 0:
+            return
+        width = self.widths["identity_document"]
+        position, index = start, low
+        while True:
+            while position < end and position in self._deleted:
+                position += 1
+            if position >= end and index >= high:
+                return
+            if index < high and (position >= end or self._overflow[index] < self._record(position).rstrip(b"\x00")):
+                yield self._overflow_rows[self._overflow[index]]
+                index += 1
+            else:
+                yield self._person(position)
+                position += 1
+            limit -= 1
+            if not limit:
+                return
+    # End of _scan
+
+    def prefix(self, prefix: str, limit: int = 50) -> list[Person]:
+        """Return up to limit persons whose identity document starts with prefix, in ID order"""
+        encoded = prefix.encode("utf-8")
+        with self._lock:
+            width = self.widths["identity_document"]
+            start = end = 0
+            if len(encoded) <= width:
+                start = self._bisect_left(encoded.ljust(width, b"\x00"))
+                end = self._bisect_right(encoded.ljust(width, b"\xff"))
+            # Keys starting with prefix sort before prefix + 0xFF, a byte UTF-8 never uses
+            low, high = bisect_left(self._overflow, encoded), bisect_left(self._overflow, encoded + b"\xff")
+            return list(self._scan(start, end, low, high, limit))
+    # End of prefix
+
+    def count_prefix(self, prefix: str) -> int:
+        """Return how many IDs start with prefix"""
+        encoded = prefix.encode("utf-8")
+        with self._lock:
+            width = self.widths["identity_document"]
+            count = bisect_left(self._overflow, encoded + b"\xff") - bisect_left(self._overflow, encoded)
+            if len(encoded) <= width:
+                start = self._bisect_left(encoded.ljust(width, b"\x00"))
+                end = self._bisect_right(encoded.ljust(width, b"\xff"))
+                count += end - start - sum(start <= position < end for position in self._deleted)
+            return count
+    # End of count_prefix
+
+    def between(self, low: str, high: str, limit: int = 50) -> list[Person]:
+        """Return up to limit persons with an identity document from low to high, both included, in ID order"""
+        low_record, high_record = low.encode("utf-8"), high.encode("utf-8")
+        with self._lock:
+            width = self.widths["identity_document"]
+            # No stored ID is wider than the records, so a wider bound falls right after its truncation
+            if len(low_record) > width:
+                start = self._bisect_right(low_record[:width])
+            else:
+                start = self._bisect_left(low_record.ljust(width, b"\x00"))
+            end = self._bisect_right(high_record[:width].ljust(width, b"\x00"))
+            return list(self._scan(start, end, bisect_left(self._overflow, low_record),
+                                   bisect_right(self._overflow, high_record), limit))
+    # End of between
+
+    def memory_bytes(self) -> int:
+        """Return the size of the column arrays"""
+        return sum(len(stored) for stored in self._columns.values())
+    # End of memory_bytes
@@ -1,82 +1,756 @@
+import logging
+import re
+import threading
+from collections.abc import Callable, Iterable, Iterator
+from itertools import islice
 from model.database import Database
+from model.instrumentation import timed_operation
+from model.person import PERSON_COLUMNS, Person
+from model.person_cache import PersonCache
+from model.person_index import PersonIndex
+from model.write_queue import WriteQueue
 from sqlite3 import IntegrityError, Error
 
+logger = logging.getLogger(__name__)
+
 class PersonModel:
     """Create sentencies SQL to manipulate person data"""
-    def __init__(self):
-        self.db = Database()
-        
+    # Rows written per transaction by create_persons_bulk
+    BULK_CHUNK_SIZE = 5000
+    # Rows per page returned by read_persons_page
+    PAGE_SIZE = 100
+    # Most matches returned by search
+    SEARCH_LIMIT = 50
+    # Bound parameters per "IN (...)" list, kept under SQLite's variable limit
+    IN_LIST_SIZE = 500
+    # Most change log rows read by one changes_since call
+    CHANGES_LIMIT = 1000
+    # Change log rows kept by prune_changes
+    CHANGE_LOG_SIZE = 100000
+
+    # Columns the table declares NOT NULL, the others need their own page query for NULLs
+    NOT_NULL_COLUMNS = ("identity_document", "name", "surname")
+
+    # Per-row outcomes reported by create_persons_bulk, update_persons and delete_persons
+    INSERTED = "inserted"
+    DUPLICATE = "duplicate"
+    CONSTRAINT_ERROR = "constraint_error"
+    ERROR = "error"
+    UPDATED = "updated"
+    DELETED = "deleted"
+    NOT_FOUND = "not_found"
+    # Rejected by validation before reaching the database, or not text
+    INVALID = "invalid"
+
+    # Write statements, shared by the direct path and the group-commit queue
+    INSERT_SQL = """
+        INSERT INTO person(identity_document, name, surname, address, phone_number)
+        VALUES (?, ?, ?, ?, ?)
+    """
+    UPDATE_SQL = """
+        UPDATE person
+        SET name=?, surname=?, address=?, phone_number=?
+        WHERE identity_document=?
+    """
+    DELETE_SQL = "DELETE FROM person WHERE identity_document=?"
+
+    def __init__(self, db: Database, cache: PersonCache | None = None, write_queue: WriteQueue | None = None,
+                 index: PersonIndex | None = None):
+        self.db = db
+        # Optional read-through cache in front of read_person
+        self.cache = cache
+        # Optional group-commit queue that single-row writes go through
+        self.write_queue = write_queue
+        # Optional in-memory snapshot answering ID-prefix lookups, kept current by the writes
+        self.index = index
+        # The change feed and this station's writes update the cache and the index one at a time.
+        # The generation is bumped whenever the feed applied rows, a write that started before it
+        # reads its rows again rather than apply a version the feed may have replaced by a newer one
+        self._sync_lock = threading.Lock()
+        self._feed_generation = 0
+
+    def _write(self, sql: str, parameters) -> int:
+        """
+        Run one write statement and return its rowcount, in its own transaction
+        or through the group-commit queue when there is one. Errors are raised to the caller
+        """
+        if self.write_queue is not None:
+            return self.write_queue.submit(sql, parameters).result()
+        return self.db.write(lambda connection: connection.execute(sql, parameters).rowcount)
+    # End of _write
+
+    @staticmethod
+    def is_text_row(row: tuple) -> bool:
+        """
+        Return whether every value of a person row is text, or NULL outside the identity document.
+        SQLite would store numbers as text, but the cache and the index keep the values as they were given
+        """
+        return isinstance(row[0], str) and all(value is None or isinstance(value, str) for value in row)
+    # End of is_text_row
+
+    def _after_write(self, generation: int, invalidated: Iterable[str], stored: Iterable[Person] = (),
+                     removed: Iterable[str] = (), cached: Person | None = None):
+        """
+        Bring the cache and the index in line with a committed write, generation being the feed generation
+        taken before it started. Never raises, the write is done whatever happens here.
+        When the change feed applied rows since, the rows of the invalidated IDs are read again and
+        their current version is applied instead of stored, removed and cached
+        """
+        with self._sync_lock:
+            if generation != self._feed_generation and (self.cache is not None or self.index is not None):
+                invalidated = list(invalidated)
+                try:
+                    with self.db.reader() as connection:
+                        current = self._select_by_ids(connection, invalidated)
+                except Error as e:
+                    logger.error("Can't read back the rows of a write, rebuilding the person index: %s", e)
+                    self._apply_changes(invalidated)
+                    self._rebuild_index()
+                    return
+                stored = current.values()
+                removed = [identity_document for identity_document in invalidated if identity_document not in current]
+                cached = current.get(cached.identity_document) if cached is not None else None
+            self._apply_changes(invalidated, stored, removed, cached)
+    # End of _after_write
+
+    def _apply_changes(self, invalidated: Iterable[str], stored: Iterable[Person] = (), removed: Iterable[str] = (),
+                       cached: Person | None = None):
+        """
+        Drop the invalidated IDs from the cache, cache the cached person, and store and remove rows in the index.
+        Never raises: a cache that can't take the change is emptied, an index that can't take it is rebuilt
+        """
+        if self.cache is not None:
+            try:
+                self.cache.invalidate(*invalidated)
+                if cached is not None:
+                    self.cache.put(cached.identity_document, cached)
+            except Exception:
+                logger.exception("Couldn't update the cache after a write, clearing it")
+                self.cache.clear()
+        if self.index is not None:
+            try:
+                self.index.put_many(stored)
+                self.index.remove_many(removed)
+            except Exception:
+                logger.exception("Couldn't update the person index after a write, rebuilding it")
+                self._rebuild_index()
+    # End of _apply_changes
+
+    def _rebuild_index(self):
+        """Stop answering lookups from the index and build it again from the table in the background"""
+        self.index.ready = False
+        threading.Thread(target=self.index.build, args=(self.db,), name="person-index", daemon=True).start()
+    # End of _rebuild_index
+
+    def _select_by_ids(self, connection, identity_documents: list[str]) -> dict[str, Person]:
+        """Return the stored persons of the given identity documents by ID, the missing ones are left out"""
+        persons = {}
+        for start in range(0, len(identity_documents), self.IN_LIST_SIZE):
+            part = identity_documents[start:start + self.IN_LIST_SIZE]
+            placeholders = ", ".join("?" * len(part))
+            cursor = self.select_persons(connection, f"SELECT * FROM person WHERE identity_document IN ({placeholders})", part)
+            persons.update((person.identity_document, person) for person in cursor)
+        return persons
+    # End of _select_by_ids
+
     def create_person(self, person_data:tuple) -> bool:
         """Create a new person into the database. Expects: (identity_document, name, surname, address, phone_number)"""
-        with self.db.get_connection() as connection:
-            try:
-                cursor = connection.cursor()
-                cursor.execute("""
-                    INSERT INTO person(identity_document, name, surname, address, phone_number) 
-                    VALUES (?, ?, ?, ?, ?) 
-                """, person_data)
-                connection.commit()
-                return True
-            except IntegrityError as e:
-                print(f"Error: Person with ID '{person_data[0]}' already exists or a constraint was violated: {str(e)}")
-                return False
-            except Error as e:
-                print(f"Error: an error occurred while adding person data: {str(e)}")
-                return False
+        return self.create_person_outcome(person_data) == self.INSERTED
     # End of add_person
-    
-    def read_person(self, identity_document: str) -> tuple | None:
-        """Read the person data from the database by identity document"""
-        with self.db.get_connection() as connection:
+
+    @timed_operation("create_person")
+    def create_person_outcome(self, person_data: tuple) -> str:
+        """
+        Create a new person like create_person and return the outcome: INSERTED, DUPLICATE when the ID
+        already exists, CONSTRAINT_ERROR for another constraint, INVALID when its values aren't text, or ERROR
+        """
+        if not self.is_text_row(person_data):
+            logger.warning("Person with ID %r not created, its values must be text", person_data[0])
+            return self.INVALID
+        generation = self._feed_generation
+        try:
+            self._write(self.INSERT_SQL, person_data)
+        except IntegrityError as e:
+            logger.warning("Person with ID '%s' already exists or a constraint was violated: %s", person_data[0], e)
+            return self.DUPLICATE if e.sqlite_errorname == "SQLITE_CONSTRAINT_PRIMARYKEY" else self.CONSTRAINT_ERROR
+        except Error as e:
+            logger.error("An error occurred while adding person data: %s", e)
+            return self.ERROR
+
+        person = Person(*person_data)
+        self._after_write(generation, (person.identity_document,), (person,), cached=person)
+        return self.INSERTED
+    # End of create_person_outcome
+
+    def create_persons_bulk(self, persons: Iterable[tuple], chunk_size: int = BULK_CHUNK_SIZE) -> Iterator[tuple[str, str]]:
+        """
+        Create many persons, consuming the iterable in chunks of chunk_size rows.
+        Each chunk is written in a single transaction with executemany.
+        Yields (identity_document, outcome) for every row as its chunk is written,
+        outcome being INSERTED, DUPLICATE, CONSTRAINT_ERROR, INVALID (values not text) or ERROR.
+        Rows are only written while the result is consumed
+        """
+        iterator = iter(persons)
+        while True:
+            chunk = list(islice(iterator, chunk_size))
+            if not chunk:
+                return
+            yield from zip((row[0] for row in chunk), self._insert_chunk(chunk))
+    # End of create_persons_bulk
+
+    @timed_operation("create_persons_bulk")
+    def _insert_chunk(self, chunk: list[tuple]) -> list[str]:
+        """Insert one chunk of person tuples in a single transaction and return the outcome of each row"""
+        def insert(connection) -> list[str]:
+            outcomes = [self.INSERTED] * len(chunk)
+            connection.execute("BEGIN IMMEDIATE")
+
+            # IDs already stored, or repeated inside this chunk, are duplicates
+            valid = [self.is_text_row(row) for row in chunk]
+            seen = self._existing_ids(connection, [row[0] for row, text in zip(chunk, valid) if text])
+            pending = []
+            for index, row in enumerate(chunk):
+                if not valid[index]:
+                    outcomes[index] = self.INVALID
+                elif row[0] in seen:
+                    outcomes[index] = self.DUPLICATE
+                else:
+                    seen.add(row[0])
+                    pending.append(index)
+
+            # Fast path: the whole chunk at once. A constraint error rolls back
+            # to the savepoint and the chunk is retried row by row
+            connection.execute("SAVEPOINT bulk_chunk")
             try:
-                cursor = connection.cursor()
-                cursor.execute("SELECT * FROM person WHERE identity_document=?", (identity_document,))
-                person_data = cursor.fetchone()
+                connection.executemany(self.INSERT_SQL, (chunk[index] for index in pending))
+            except IntegrityError:
+                connection.execute("ROLLBACK TO bulk_chunk")
+                for index in pending:
+                    try:
+                        connection.execute(self.INSERT_SQL, chunk[index])
+                    except IntegrityError:
+                        outcomes[index] = self.CONSTRAINT_ERROR
+            connection.execute("RELEASE bulk_chunk")
+            return outcomes
+
+        generation = self._feed_generation
+        try:
+            outcomes = self.db.write(insert)
+        except Error as e:
+            logger.error("An error occurred while adding a chunk of %s persons: %s", len(chunk), e)
+            return [self.ERROR] * len(chunk)
+
+        # Drop cached misses for the new IDs and add them to the index
+        inserted = [row for row, outcome in zip(chunk, outcomes) if outcome == self.INSERTED]
+        self._after_write(generation, [row[0] for row in inserted], (Person(*row) for row in inserted))
+        return outcomes
+    # End of _insert_chunk
+
+    def _existing_ids(self, connection, identity_documents: list[str]) -> set[str]:
+        """Return which of the given identity documents are already stored"""
+        existing = set()
+        for start in range(0, len(identity_documents), self.IN_LIST_SIZE):
+            part = identity_documents[start:start + self.IN_LIST_SIZE]
+            placeholders = ", ".join("?" * len(part))
+            cursor = connection.execute(
+                f"SELECT identity_document FROM person WHERE identity_document IN ({placeholders})",
+                part
+            )
+            existing.update(row[0] for row in cursor)
+        return existing
+    # End of _existing_ids
+
+    @timed_operation("read_person")
+    def read_person(self, identity_document: str) -> Person | None:
+        """Read the person data from the database by identity document, through the cache if there is one"""
+        if self.cache is not None:
+            found, person_data = self.cache.get(identity_document)
+            if found:
                 return person_data
-            except Error as e:
-                print(f"Error: can't read the person data from the database: {str(e)}")
-                return None
+            generation = self.cache.generation()
+
+        try:
+            with self.db.reader() as connection:
+                person_data = self.select_persons(
+                    connection, "SELECT * FROM person WHERE identity_document=?", (identity_document,)
+                ).fetchone()
+        except Error as e:
+            logger.error("Can't read the person data from the database: %s", e)
+            return None
+
+        if self.cache is not None:
+            self.cache.put(identity_document, person_data, generation)
+        return person_data
     # End of read_person
-    
-    def read_all_persons(self) -> list[tuple]:
+
+    @timed_operation("read_all_persons")
+    def read_all_persons(self) -> list[Person]:
         """Read all person data from the database"""
-        with self.db.get_connection() as connection:
-            try:
-                cursor = connection.cursor()
-                cursor.execute("SELECT * FROM person")
-                all_persons = cursor.fetchall()
+        try:
+            with self.db.reader() as connection:
+                all_persons = self.select_persons(connection, "SELECT * FROM person").fetchall()
                 return all_persons
-            except Error as e:
-                print(f"Error: an error occurred while reading all persons from the database: {str(e)}")
-                return []
+        except Error as e:
+            logger.error("An error occurred while reading all persons from the database: %s", e)
+            return []
     # End of read_all_persons
-    
-    def update_person(self, person_data: tuple) -> bool:
-        """Update the person data into the database by identity document"""
-        with self.db.get_connection() as connection: 
-            try:
+
+    @timed_operation("read_persons_page")
+    def read_persons_page(self, after_id: str | None = None, limit: int = PAGE_SIZE, before_id: str | None = None,
+                          filters: dict[str, str] | None = None, order_by: str = "identity_document",
+                          descending: bool = False) -> list[Person]:
+        """
+        Read one page of persons ordered by the order_by column (then by identity document, so the
+        order is total), descending if asked. The page starts right after the person with ID after_id
+        (the last row of the previous page), or at the beginning when it is None. With before_id the
+        page ending right before that person is read instead.
+        filters maps person columns to the exact value they must have.
+        Pages are read by key from an index: identity document, surname (person_surname) and phone
+        number (person_phone) pages cost the same anywhere in the registry, other columns are sorted
+        """
+        try:
+            return self.query_persons_page(after_id, limit, before_id, filters, order_by, descending)
+        except Error as e:
+            logger.error("An error occurred while reading a page of persons from the database: %s", e)
+            return []
+    # End of read_persons_page
+
+    def query_persons_page(self, after_id: str | None = None, limit: int = PAGE_SIZE, before_id: str | None = None,
+                           filters: dict[str, str] | None = None, order_by: str = "identity_document",
+                           descending: bool = False) -> list[Person]:
+        """Same as read_persons_page, but database errors are raised instead of logged"""
+        anchor = before_id if before_id is not None else after_id
+        key = None
+        if anchor is not None:
+            key = self.page_key(anchor, order_by)
+            if key is None:
+                return []
+        # Reading backwards walks the order the other way
+        rows = self.query_persons_from(key, limit, descending != (before_id is not None), filters, order_by)
+        if before_id is not None:
+            rows.reverse()
+        return rows
+    # End of query_persons_page
+
+    def page_key(self, identity_document: str, order_by: str = "identity_document") -> tuple | None:
+        """Return the (order_by value, identity_document) position of a person in the order_by order, None if it doesn't exist"""
+        if order_by not in PERSON_COLUMNS:
+            raise ValueError(f"Unknown person column '{order_by}'")
+        if order_by == "identity_document":
+            return identity_document, identity_document
+        with self.db.reader() as connection:
+            row = connection.execute(
+                f"SELECT {order_by} FROM person WHERE identity_document = ?", (identity_document,)
+            ).fetchone()
+        return None if row is None else (row[0], identity_document)
+    # End of page_key
+
+    @staticmethod
+    def sort_key(order_by: str = "identity_document") -> Callable[[tuple], tuple]:
+        """Return the Python sort key matching SQLite's (order_by, identity_document) order, NULL first"""
+        column = PERSON_COLUMNS.index(order_by)
+        return lambda person: (person[column] is not None, person[column] or "", person[0])
+    # End of sort_key
+
+    def query_persons_from(self, key: tuple | None, limit: int = PAGE_SIZE, reverse: bool = False,
+                           filters: dict[str, str] | None = None, order_by: str = "identity_document") -> list[Person]:
+        """
+        Read up to limit persons past the (order_by value, identity_document) position key, or from the
+        start when it is None, walking the order_by order forwards or, when reverse, backwards.
+        Rows come in walk order. Database errors are raised
+        """
+        rows = []
+        with self.db.reader() as connection:
+            for query, params in self._page_queries(key, reverse, filters, order_by):
+                rows.extend(self.select_persons(connection, query, [*params, limit - len(rows)]))
+                if len(rows) >= limit:
+                    break
+        return rows
+    # End of query_persons_from
+
+    def explain_page_query(self, filters: dict[str, str] | None = None, order_by: str = "identity_document",
+                           descending: bool = False, after_id: str | None = None) -> list[str]:
+        """
+        Return the query plan of a read_persons_page call, one line per step, e.g.
+        "SEARCH person USING INDEX person_phone (phone_number=?)". A "USE TEMP B-TREE FOR ORDER BY"
+        line means the matching rows are sorted for every page instead of read in index order
+        """
+        key = None if after_id is None else self.page_key(after_id, order_by)
+        plan = []
+        with self.db.reader() as connection:
+            for query, params in self._page_queries(key, descending, filters, order_by):
+                plan.extend(row[3] for row in connection.execute(f"EXPLAIN QUERY PLAN {query}", [*params, self.PAGE_SIZE]))
+        return plan
+    # End of explain_page_query
+
+    def _page_queries(self, key: tuple | None, reverse: bool, filters: dict[str, str] | None,
+                      order_by: str) -> list[tuple[str, list]]:
+        """
+        Build the SQL of one page, as (query, params) pairs run in turn until the page is full; the
+        LIMIT parameter is left for the caller to add. Rows are sought by key instead of skipped with
+        OFFSET: (order_by, identity_document) is compared as a row value, which SQLite turns into an
+        index range when the column is indexed
+        """
+        if order_by not in PERSON_COLUMNS:
+            raise ValueError(f"Unknown person column '{order_by}'")
+        conditions, params = self._filter_conditions(filters)
+        direction = "DESC" if reverse else "ASC"
+        past = "<" if reverse else ">"
+
+        def query(*extra: str) -> str:
+            where = " AND ".join([*conditions, *extra])
+            order = f"identity_document {direction}"
+            if order_by != "identity_document":
+                order = f"{order_by} {direction}, {order}"
+            return f"SELECT * FROM person {'WHERE ' + where if where else ''} ORDER BY {order} LIMIT ?"
+
+        if key is None:
+            return [(query(), params)]
+        value, identity_document = key
+        if order_by == "identity_document":
+            return [(query(f"identity_document {past} ?"), [*params, identity_document])]
+
+        # SQLite sorts NULL first and a row value holding NULL never compares, so empty addresses and
+        # phone numbers are read by a query of their own, before or after the others.
+        # Splitting instead of OR-ing the conditions keeps each query an index range
+        if value is None:
+            own = (query(f"{order_by} IS NULL", f"identity_document {past} ?"), [*params, identity_document])
+            return [own] if reverse else [own, (query(f"{order_by} IS NOT NULL"), params)]
+        queries = [(query(f"({order_by}, identity_document) {past} (?, ?)"), [*params, value, identity_document])]
+        if reverse and order_by not in self.NOT_NULL_COLUMNS:
+            queries.append((query(f"{order_by} IS NULL"), params))
+        return queries
+    # End of _page_queries
+
+    @staticmethod
+    def select_persons(connection, sql: str, parameters=()):
+        """
+        Run a query selecting every person column (SELECT * FROM person) and return its cursor.
+        Rows come out of the cursor as Person records, with no tuple kept around to convert later
+        """
+        cursor = connection.cursor()
+        cursor.row_factory = Person.from_row
+        return cursor.execute(sql, parameters)
+    # End of select_persons
+
+    def _filter_conditions(self, filters: dict[str, str] | None) -> tuple[list[str], list]:
+        """Turn column filters into SQL conditions and their parameters, rejecting unknown columns"""
+        conditions, params = [], []
+        for column, value in (filters or {}).items():
+            if column not in PERSON_COLUMNS:
+                raise ValueError(f"Unknown person column '{column}'")
+            conditions.append(f"{column} = ?")
+            params.append(value)
+        return conditions, params
+    # End of _filter_conditions
+
+    def iter_persons(self, page_size: int = PAGE_SIZE, after_id: str | None = None,
+                     filters: dict[str, str] | None = None) -> Iterator[Person]:
+        """
+        Yield every person (matching the filters) ordered by identity document, starting after after_id.
+        Each page is its own short read, so no read transaction stays open between pages
+        """
+        while True:
+            page = self.read_persons_page(after_id, page_size, filters=filters)
+            yield from page
+            if len(page) < page_size:
+                return
+            after_id = page[-1][0]
+    # End of iter_persons
+
+    @timed_operation("find_by_id_prefix")
+    def find_by_id_prefix(self, prefix: str, limit: int = SEARCH_LIMIT) -> list[Person]:
+        """
+        Return the persons whose identity document starts with prefix, in ID order.
+        They are read from the in-memory index once it is ready, without a query, otherwise from a
+        range scan of the primary key
+        """
+        if self.index is not None and self.index.ready:
+            return self.index.prefix(prefix, limit)
+        try:
+            with self.db.reader() as connection:
+                return self.select_persons(
+                    connection,
+                    "SELECT * FROM person WHERE identity_document >= ? AND identity_document < ? "
+                    "ORDER BY identity_document LIMIT ?",
+                    (prefix, prefix + "\U0010ffff", limit)
+                ).fetchall()
+        except Error as e:
+            logger.error("An error occurred while looking up persons by ID prefix: %s", e)
+            return []
+    # End of find_by_id_prefix
+
+    @timed_operation("find_by_phone")
+    def find_by_phone(self, phone_number: str, limit: int = SEARCH_LIMIT) -> list[Person]:
+        """Return the persons registered with phone_number, in ID order. A lookup of the person_phone index"""
+        try:
+            with self.db.reader() as connection:
+                return self.select_persons(
+                    connection,
+                    "SELECT * FROM person WHERE phone_number = ? ORDER BY identity_document LIMIT ?",
+                    (phone_number, limit)
+                ).fetchall()
+        except Error as e:
+            logger.error("An error occurred while looking up persons by phone number: %s", e)
+            return []
+    # End of find_by_phone
+
+    @timed_operation("search")
+    def search(self, query: str, limit: int = SEARCH_LIMIT) -> list[Person]:
+        """
+        Search persons by name, surname and address through the full-text index.
+        Every word of the query must match the start of a word in one of those fields,
+        results are ranked best match first
+        """
+        return [person for _, person in self.search_ranked(query, limit)]
+    # End of search
+
+    def search_ranked(self, query: str, limit: int = SEARCH_LIMIT) -> list[tuple[float, Person]]:
+        """Same as search, but returns (rank, person) pairs, lower rank first, so results of several shards can be merged"""
+        words = re.findall(r"\w+", query)
+        if not words:
+            return []
+        match = " ".join(f'"{word}"*' for word in words)
+
+        try:
+            with self.db.reader() as connection:
                 cursor = connection.cursor()
                 cursor.execute("""
-                    UPDATE person
-                    SET name=?, surname=?, address=?, phone_number=?
-                    WHERE identity_document=?
-                """, person_data)
-                connection.commit()
-                return cursor.rowcount > 0
-            except Error as e:
-                print(f"Error: an error occurred while updating person data: {str(e)}")
-                return False
+                    SELECT person_fts.rank, person.* FROM person_fts
+                    JOIN person ON person.rowid = person_fts.rowid
+                    WHERE person_fts MATCH ?
+                    ORDER BY person_fts.rank
+                    LIMIT ?
+                """, (match, limit))
+                return [(row[0], Person(*row[1:])) for row in cursor]
+        except Error as e:
+            logger.error("An error occurred while searching persons: %s", e)
+            return []
+    # End of search_ranked
+
+    @timed_operation("update_person")
+    def update_person(self, person_data: tuple) -> bool:
+        """Update the person data into the database by identity document"""
+        person = Person(person_data[-1], *person_data[:-1])
+        if not self.is_text_row(person):
+            logger.warning("Person with ID %r not updated, its values must be text", person.identity_document)
+            return False
+        generation = self._feed_generation
+        try:
+            updated = self._write(self.UPDATE_SQL, person_data) > 0
+        except Error as e:
+            logger.error("An error occurred while updating person data: %s", e)
+            return False
+
+        self._after_write(generation, (person.identity_document,), (person,) if updated else ())
+        return updated
     # End of update_person
-    
+
+    @timed_operation("delete_person")
     def delete_person(self, identity_document: str) -> bool:
         """Delete the person data into the database by identity document"""
-        with self.db.get_connection() as connection:
-            try:
-                cursor = connection.cursor()
-                cursor.execute("DELETE FROM person WHERE identity_document=?", (identity_document,))
-                connection.commit()
-                return cursor.rowcount > 0
-            except Error as e:
-                print(f"Error: an error occurred while deleting person data: {str(e)}")
-                return False
-    # End of delete_person
\ No newline at end of file
+        if not isinstance(identity_document, str):
+            logger.warning("Person with ID %r not deleted, the ID must be text", identity_document)
+            return False
+        generation = self._feed_generation
+        try:
+            deleted = self._write(self.DELETE_SQL, (identity_document,)) > 0
+        except Error as e:
+            logger.error("An error occurred while deleting person data: %s", e)
+            return False
+
+        self._after_write(generation, (identity_document,), removed=(identity_document,) if deleted else ())
+        return deleted
+    # End of delete_person
+
+    def update_persons(self, persons: Iterable[tuple], chunk_size: int = BULK_CHUNK_SIZE) -> list[tuple[str, str]]:
+        """
+        Update many persons, in chunks of chunk_size rows each written in a single transaction
+        with executemany. Expects tuples like update_person: (name, surname, address, phone_number, identity_document).
+        Returns (identity_document, outcome) for every row, outcome being UPDATED, NOT_FOUND, INVALID (values not text) or ERROR
+        """
+        results = []
+        iterator = iter(persons)
+        while chunk := list(islice(iterator, chunk_size)):
+            results.extend(zip((row[-1] for row in chunk), self._update_chunk(chunk)))
+        return results
+    # End of update_persons
+
+    @timed_operation("update_persons")
+    def _update_chunk(self, chunk: list[tuple]) -> list[str]:
+        """Update one chunk of persons in a single transaction and return the outcome of each row"""
+        persons = [Person(row[-1], *row[:-1]) for row in chunk]
+        valid = [self.is_text_row(person) for person in persons]
+
+        def update(connection) -> set[str]:
+            connection.execute("BEGIN IMMEDIATE")
+            existing = self._existing_ids(connection, [person.identity_document for person, text in zip(persons, valid) if text])
+            connection.executemany(self.UPDATE_SQL, (row for row, text in zip(chunk, valid) if text and row[-1] in existing))
+            return existing
+
+        generation = self._feed_generation
+        try:
+            existing = self.db.write(update)
+        except Error as e:
+            logger.error("An error occurred while updating a chunk of %s persons: %s", len(chunk), e)
+            return [self.ERROR] * len(chunk)
+
+        self._after_write(generation, existing, (person for person, text in zip(persons, valid) if text and person.identity_document in existing))
+        return [self.INVALID if not text else self.UPDATED if person.identity_document in existing else self.NOT_FOUND
+                for person, text in zip(persons, valid)]
+    # End of _update_chunk
+
+    def set_columns(self, identity_documents: Iterable[str], changes: dict[str, str | None],
+                    chunk_size: int = BULK_CHUNK_SIZE) -> list[tuple[str, str]]:
+        """
+        Set only the changes columns (name, surname, address, phone_number) to the same values on many
+        persons, in chunks of chunk_size IDs each updated in a single transaction with "IN (...)" lists.
+        The other columns are left as they are in the database, nothing is read and written back.
+        Returns (identity_document, outcome) for every ID, outcome being UPDATED, NOT_FOUND, INVALID (ID not text) or ERROR
+        """
+        self._set_clause(changes)
+        results = []
+        iterator = iter(identity_documents)
+        while chunk := list(islice(iterator, chunk_size)):
+            results.extend(zip(chunk, self._set_columns_chunk(chunk, changes)))
+        return results
+    # End of set_columns
+
+    @staticmethod
+    def _set_clause(changes: dict[str, str | None]) -> str:
+        """Return the SET clause of changes, rejecting unknown columns and the identity document"""
+        if not changes:
+            raise ValueError("No columns to set")
+        for column in changes:
+            if column not in PERSON_COLUMNS or column == "identity_document":
+                raise ValueError(f"Can't set person column '{column}'")
+            if changes[column] is not None and not isinstance(changes[column], str):
+                raise ValueError(f"Person column '{column}' must be text")
+        return ", ".join(f"{column}=?" for column in changes)
+    # End of _set_clause
+
+    @timed_operation("set_columns")
+    def _set_columns_chunk(self, chunk: list[str], changes: dict[str, str | None]) -> list[str]:
+        """Set the changes columns on one chunk of IDs in a single transaction and return the outcome of each one"""
+        set_clause = self._set_clause(changes)
+
+        def update(connection) -> tuple[set[str], list[Person]]:
+            connection.execute("BEGIN IMMEDIATE")
+            existing = self._existing_ids(connection, [identity_document for identity_document in chunk if isinstance(identity_document, str)])
+            found = sorted(existing)
+            persons = []
+            for start in range(0, len(found), self.IN_LIST_SIZE):
+                part = found[start:start + self.IN_LIST_SIZE]
+                placeholders = ", ".join("?" * len(part))
+                connection.execute(f"UPDATE person SET {set_clause} WHERE identity_document IN ({placeholders})",
+                                   [*changes.values(), *part])
+                # The index holds whole rows, read them back as they are now
+                if self.index is not None:
+                    persons.extend(self.select_persons(
+                        connection, f"SELECT * FROM person WHERE identity_document IN ({placeholders})", part
+                    ))
+            return existing, persons
+
+        generation = self._feed_generation
+        try:
+            existing, persons = self.db.write(update)
+        except Error as e:
+            logger.error("An error occurred while updating a chunk of %s persons: %s", len(chunk), e)
+            return [self.ERROR] * len(chunk)
+
+        self._after_write(generation, existing, persons)
+        return [self.INVALID if not isinstance(identity_document, str) else self.UPDATED if identity_document in existing
+                else self.NOT_FOUND for identity_document in chunk]
+    # End of _set_columns_chunk
+
+    def delete_persons(self, identity_documents: Iterable[str], chunk_size: int = BULK_CHUNK_SIZE) -> list[tuple[str, str]]:
+        """
+        Delete many persons by identity document, in chunks of chunk_size IDs each deleted in a
+        single transaction with "IN (...)" lists. Returns (identity_document, outcome) for every ID,
+        outcome being DELETED, NOT_FOUND, INVALID (ID not text) or ERROR
+        """
+        results = []
+        iterator = iter(identity_documents)
+        while chunk := list(islice(iterator, chunk_size)):
+            results.extend(zip(chunk, self._delete_chunk(chunk)))
+        return results
+    # End of delete_persons
+
+    @timed_operation("delete_persons")
+    def _delete_chunk(self, chunk: list[str]) -> list[str]:
+        """Delete one chunk of IDs in a single transaction and return the outcome of each one"""
+        def delete(connection) -> set[str]:
+            connection.execute("BEGIN IMMEDIATE")
+            existing = self._existing_ids(connection, [identity_document for identity_document in chunk if isinstance(identity_document, str)])
+            found = sorted(existing)
+            for start in range(0, len(found), self.IN_LIST_SIZE):
+                part = found[start:start + self.IN_LIST_SIZE]
+                placeholders = ", ".join("?" * len(part))
+                connection.execute(f"DELETE FROM person WHERE identity_document IN ({placeholders})", part)
+            return existing
+
+        generation = self._feed_generation
+        try:
+            existing = self.db.write(delete)
+        except Error as e:
+            logger.error("An error occurred while deleting a chunk of %s persons: %s", len(chunk), e)
+            return [self.ERROR] * len(chunk)
+
+        self._after_write(generation, existing, removed=existing)
+        return [self.INVALID if not isinstance(identity_document, str) else self.DELETED if identity_document in existing
+                else self.NOT_FOUND for identity_document in chunk]
+    # End of _delete_chunk
+
+    def current_change_seq(self) -> int:
+        """Return the seq of the last change logged, 0 if there is none. Database errors are raised"""
+        with self.db.reader() as connection:
+            row = connection.execute("SELECT seq FROM sqlite_sequence WHERE name = 'person_change'").fetchone()
+            return row[0] if row else 0
+    # End of current_change_seq
+
+    @timed_operation("changes_since")
+    def changes_since(self, seq: int, limit: int = CHANGES_LIMIT) -> tuple[int, list[tuple[str, Person | None]] | None]:
+        """
+        Return (new seq, changes) for what changed after seq: one (identity_document, person) pair per
+        changed ID, person being its current data or None if it was deleted. At most limit log rows
+        are read, call again with the new seq for the rest. The changes are None when seq can't be
+        followed and the caller has to reload everything: the log was pruned past it, or it is ahead
+        of the log (e.g. after restoring a backup). Database errors are raised
+        """
+        # Read and applied under the sync lock, so a write applying its rows meanwhile re-reads them
+        with self._sync_lock:
+            with self.db.reader() as connection:
+                oldest = connection.execute("SELECT MIN(seq) FROM person_change").fetchone()[0]
+                latest = self.current_change_seq()
+                # A seq ahead of the log never sees a row, one before the oldest row kept missed the pruned ones
+                if seq > latest or (seq < latest and (oldest is None or oldest > seq + 1)):
+                    return latest, None
+                rows = connection.execute(
+                    "SELECT seq, identity_document FROM person_change WHERE seq > ? ORDER BY seq LIMIT ?",
+                    (seq, limit)
+                ).fetchall()
+                if not rows:
+                    return seq, []
+
+                # Only the current state of each ID matters, however many times it changed
+                identity_documents = list(dict.fromkeys(identity_document for _, identity_document in rows))
+                persons = self._select_by_ids(connection, identity_documents)
+
+            # Changes may come from other stations, drop what the cache holds for them and bring
+            # the index up to date, it is only kept current by this station's own writes
+            self._feed_generation += 1
+            self._apply_changes(identity_documents, persons.values(),
+                                [identity_document for identity_document in identity_documents if identity_document not in persons])
+        return rows[-1][0], [(identity_document, persons.get(identity_document)) for identity_document in identity_documents]
+    # End of changes_since
+
+    def prune_changes(self, keep: int = CHANGE_LOG_SIZE) -> int:
+        """Delete all but the last keep change log rows and return how many were deleted"""
+        try:
+            return self.db.write(lambda connection: connection.execute(
+                "DELETE FROM person_change WHERE seq <= (SELECT MAX(seq) FROM person_change) - ?", (keep,)
+            ).rowcount)
+        except Error as e:
+            logger.error("An error occurred while pruning the change log: %s", e)
+            return 0
+    # End of prune_changes
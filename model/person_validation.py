@@ -0,0 +1,170 @@
+import re
+import unicodedata
+from functools import lru_cache
+from collections.abc import Iterable, Iterator
+from itertools import islice
+from model.person import PERSON_COLUMNS, Person
+
+# Field limits of the person table (see Database.create_person_table), SQLite doesn't enforce them
+ID_LENGTH = 11
+NAME_LENGTH = 20
+ADDRESS_LENGTH = 100
+PHONE_LENGTH = 11
+
+# Compiled once, shared by every record
+ID_SEPARATORS = re.compile(r"[\s.\-]")
+PHONE_SEPARATORS = re.compile(r"[\s.\-()/+]")
+DIGITS = re.compile(r"[0-9]+")
+NAME_WORD_PARTS = re.compile(r"[^\s\-']+")
+# Types a person value may have, None standing for NULL
+TEXT_TYPES = {str, type(None)}
+# Words kept in lower case inside names and surnames, unless they come first
+NAME_PARTICLES = frozenset(("de", "del", "la", "las", "los", "y", "e", "da", "do", "dos", "van", "von"))
+
+def normalize_text(value: str | None) -> str | None:
+    """Unicode NFC form with single spaces and no surrounding whitespace"""
+    if value is None:
+        return None
+    return " ".join(unicodedata.normalize("NFC", str(value)).split())
+# End of normalize_text
+
+# Names repeat a lot across a registry, most of them are normalized only once
+@lru_cache(maxsize=65536)
+def normalize_name(value: str | None) -> str | None:
+    """Normalized text with each word capitalized, particles like "de la" in lower case"""
+    value = normalize_text(value)
+    if not value:
+        return value
+    words = value.lower().split(" ")
+    return " ".join(
+        word if index and word in NAME_PARTICLES else NAME_WORD_PARTS.sub(lambda part: part[0].capitalize(), word)
+        for index, word in enumerate(words)
+    )
+# End of normalize_name
+
+def normalize_identity_document(value: str | None) -> str | None:
+    """Normalized text without the spaces, dots and dashes IDs are often typed with"""
+    if value is None or (value.isascii() and value.isdigit()):
+        return value
+    value = normalize_text(value)
+    return ID_SEPARATORS.sub("", value) if value else value
+# End of normalize_identity_document
+
+def normalize_phone_number(value: str | None) -> str | None:
+    """Normalized text without separators, parentheses or a leading +"""
+    if value is None or (value.isascii() and value.isdigit()):
+        return value
+    value = normalize_text(value)
+    return PHONE_SEPARATORS.sub("", value) if value else value
+# End of normalize_phone_number
+
+class PersonValidator:
+    """
+    Normalizes person records and checks them against the table limits before they are stored.
+    Records are processed a whole batch at a time, one column after the other, with rules built
+    once: a column is normalized with map() and checked as a whole, only columns holding an invalid
+    value are looked at row by row.
+    Errors are reported as (column, message) pairs per record
+    """
+    # Records validated together by validate_stream
+    BATCH_SIZE = 5000
+
+    # column: (normalizer, required, max length, only digits)
+    RULES = {
+        "identity_document": (normalize_identity_document, True, ID_LENGTH, True),
+        "name": (normalize_name, True, NAME_LENGTH, False),
+        "surname": (normalize_name, True, NAME_LENGTH, False),
+        "address": (normalize_text, False, ADDRESS_LENGTH, False),
+        "phone_number": (normalize_phone_number, False, PHONE_LENGTH, True)
+    }
+
+    def check(self, column: str, value: str | None) -> str | None:
+        """Return the error message of a normalized value, None if it is valid"""
+        _, required, max_length, digits = self.RULES[column]
+        if not value:
+            return "is required" if required else None
+        if len(value) > max_length:
+            return f"is longer than {max_length} characters"
+        if digits and not DIGITS.fullmatch(value):
+            return "must contain only digits"
+        return None
+    # End of check
+
+    def validate_batch(self, persons: list[tuple]) -> list[tuple[tuple, tuple[tuple[str, str], ...]]]:
+        """
+        Normalize and check a batch of person tuples in table order.
+        Returns (normalized person, errors) for each one, errors being empty when it is valid.
+        A row without one value per column is reported as given, cut or padded with None to the columns,
+        values that aren't text (or None) are reported and left as they are
+        """
+        if not persons:
+            return []
+        width = len(PERSON_COLUMNS)
+        # Errors of the invalid rows by position, the valid ones share an empty tuple
+        errors = {}
+        # Only rows with every column are transposed, positions maps them back to the batch
+        positions = range(len(persons))
+        if set(map(len, persons)) != {width}:
+            errors = {row: [("record", f"has {len(person)} values instead of {width}")]
+                      for row, person in enumerate(persons) if len(person) != width}
+            positions = [row for row in positions if row not in errors]
+        columns = []
+        for column, values in zip(PERSON_COLUMNS, zip(*(persons[row] for row in positions))):
+            normalizer, required, max_length, digits = self.RULES[column]
+            text = set(map(type, values)) <= TEXT_TYPES
+            if text:
+                values = list(map(normalizer, values))
+            else:
+                values = [normalizer(value) if value is None or isinstance(value, str) else value for value in values]
+            columns.append(values)
+
+            # Checked for the whole column at once with C-level builtins, usually every value is valid
+            present = list(filter(None, values)) if text else []
+            joined = "".join(present) if digits else ""
+            if text and ((not required or len(present) == len(values))
+                    and (not present or max(map(len, present)) <= max_length)
+                    and (joined.isascii() and joined.isdigit() or not joined)):
+                continue
+
+            # Otherwise one pass finds the values that need a message
+            for row, value in enumerate(values):
+                if not (value is None or isinstance(value, str)):
+                    message = "must be text"
+                elif (not value and required) or (value and (len(value) > max_length or (digits and not DIGITS.fullmatch(value)))):
+                    message = self.check(column, value)
+                else:
+                    continue
+                errors.setdefault(positions[row], []).append((column, message))
+
+        if not errors:
+            return [(person, ()) for person in zip(*columns)]
+        normalized = [tuple(person[:width]) + (None,) * (width - len(person)) for person in persons]
+        for row, person in zip(positions, zip(*columns)):
+            normalized[row] = person
+        return [(person, tuple(errors.get(row, ()))) for row, person in enumerate(normalized)]
+    # End of validate_batch
+
+    def validate(self, person_data: tuple) -> tuple[Person, tuple[tuple[str, str], ...]]:
+        """Normalize and check one person, see validate_batch. The normalized person comes back as a Person record"""
+        person, errors = self.validate_batch([person_data])[0]
+        return Person(*person), errors
+    # End of validate
+
+    def validate_fields(self, fields: dict[str, str]) -> tuple[dict[str, str], list[tuple[str, str]]]:
+        """Normalize and check only the given columns, for partial updates"""
+        normalized = {column: self.RULES[column][0](value) for column, value in fields.items()}
+        errors = [(column, message) for column, value in normalized.items() if (message := self.check(column, value))]
+        return normalized, errors
+    # End of validate_fields
+
+    def validate_stream(self, persons: Iterable[tuple], batch_size: int = BATCH_SIZE) -> Iterator[tuple[tuple, tuple[tuple[str, str], ...]]]:
+        """Validate an iterable of persons lazily, one batch at a time, yielding (normalized person, errors)"""
+        iterator = iter(persons)
+        while batch := list(islice(iterator, batch_size)):
+            yield from self.validate_batch(batch)
+    # End of validate_stream
+
+def format_errors(errors: Iterable[tuple[str, str]]) -> str:
+    """Join validation errors into one readable message"""
+    return "; ".join(f"{column.replace('_', ' ').capitalize()} {message}" for column, message in errors)
+# End of format_errors
@@ -0,0 +1,204 @@
+import json
+import logging
+from collections.abc import Iterable, Iterator
+from urllib.error import HTTPError, URLError
+from urllib.parse import quote, urlencode
+from urllib.request import Request, urlopen
+from model.person import PERSON_COLUMNS, Person
+from model.person_model import PersonModel
+
+logger = logging.getLogger(__name__)
+
+class RemotePersonModel:
+    """
+    Same interface as PersonModel, backed by the HTTP/JSON service of server.py
+    so several stations can share one registry
+    """
+    TIMEOUT = 10
+
+    def __init__(self, base_url: str, timeout: float = TIMEOUT):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+
+    def request(self, method: str, path: str, payload: dict | None = None):
+        """
+        Send a request and return (status, decoded JSON body).
+        Raises URLError when the server can't be reached
+        """
+        data = json.dumps(payload).encode("utf-8") if payload is not None else None
+        request = Request(self.base_url + path, data=data, method=method)
+        request.add_header("Content-Type", "application/json")
+        try:
+            with urlopen(request, timeout=self.timeout) as response:
+                return response.status, json.loads(response.read() or b"null")
+        except HTTPError as e:
+            return e.code, json.loads(e.read() or b"null")
+    # End of request
+
+    def person_path(self, identity_document: str) -> str:
+        """Return the URL path of one person"""
+        return "/persons/" + quote(identity_document, safe="")
+    # End of person_path
+
+    # Outcome of each status answered to POST /persons
+    CREATE_OUTCOMES = {201: PersonModel.INSERTED, 409: PersonModel.DUPLICATE, 400: PersonModel.INVALID}
+
+    def create_person(self, person_data: tuple) -> bool:
+        """Create a new person. Expects: (identity_document, name, surname, address, phone_number)"""
+        return self.create_person_outcome(person_data) == PersonModel.INSERTED
+    # End of create_person
+
+    def create_person_outcome(self, person_data: tuple) -> str:
+        """Create a new person and return the outcome, see PersonModel.create_person_outcome"""
+        try:
+            status, _ = self.request("POST", "/persons", dict(zip(PERSON_COLUMNS, person_data)))
+            return self.CREATE_OUTCOMES.get(status, PersonModel.ERROR)
+        except (URLError, OSError, ValueError) as e:
+            logger.error("An error occurred while adding person data: %s", e)
+            return PersonModel.ERROR
+    # End of create_person_outcome
+
+    def read_person(self, identity_document: str) -> Person | None:
+        """Read the person data by identity document"""
+        try:
+            status, body = self.request("GET", self.person_path(identity_document))
+            return Person.from_mapping(body) if status == 200 else None
+        except (URLError, OSError, ValueError) as e:
+            logger.error("Can't read the person data from the server: %s", e)
+            return None
+    # End of read_person
+
+    def read_persons_page(self, after_id: str | None = None, limit: int = PersonModel.PAGE_SIZE, before_id: str | None = None,
+                          filters: dict[str, str] | None = None, order_by: str = "identity_document",
+                          descending: bool = False) -> list[Person]:
+        """Read one page of persons in order_by order, see PersonModel.read_persons_page"""
+        query = {"limit": limit, **(filters or {})}
+        if after_id is not None:
+            query["after"] = after_id
+        if before_id is not None:
+            query["before"] = before_id
+        if order_by != "identity_document":
+            query["sort"] = order_by
+        if descending:
+            query["desc"] = 1
+        return self.read_list("/persons?" + urlencode(query))
+    # End of read_persons_page
+
+    def iter_persons(self, page_size: int = PersonModel.PAGE_SIZE) -> Iterator[Person]:
+        """Yield every person ordered by identity document, reading one page at a time"""
+        after_id = None
+        while True:
+            page = self.read_persons_page(after_id, page_size)
+            yield from page
+            if len(page) < page_size:
+                return
+            after_id = page[-1][0]
+    # End of iter_persons
+
+    def read_all_persons(self) -> list[Person]:
+        """Read all persons, page by page"""
+        return list(self.iter_persons())
+    # End of read_all_persons
+
+    def search(self, query: str, limit: int = PersonModel.SEARCH_LIMIT) -> list[Person]:
+        """Search persons by name, surname and address"""
+        return self.read_list("/search?" + urlencode({"q": query, "limit": limit}))
+    # End of search
+
+    def find_by_id_prefix(self, prefix: str, limit: int = PersonModel.SEARCH_LIMIT) -> list[Person]:
+        """Return the persons whose identity document starts with prefix"""
+        return self.read_list("/persons?" + urlencode({"prefix": prefix, "limit": limit}))
+    # End of find_by_id_prefix
+
+    def find_by_phone(self, phone_number: str, limit: int = PersonModel.SEARCH_LIMIT) -> list[Person]:
+        """Return the persons registered with phone_number"""
+        return self.read_list("/persons?" + urlencode({"phone": phone_number, "limit": limit}))
+    # End of find_by_phone
+
+    def read_list(self, path: str) -> list[Person]:
+        """GET a list of persons and return them as tuples"""
+        try:
+            status, body = self.request("GET", path)
+            if status != 200:
+                return []
+            return [Person.from_mapping(person) for person in body]
+        except (URLError, OSError, ValueError) as e:
+            logger.error("An error occurred while reading persons from the server: %s", e)
+            return []
+    # End of read_list
+
+    def update_person(self, person_data: tuple) -> bool:
+        """Update the person data by identity document. Expects: (name, surname, address, phone_number, identity_document)"""
+        person = dict(zip(PERSON_COLUMNS, (person_data[-1], *person_data[:-1])))
+        try:
+            status, _ = self.request("PUT", self.person_path(person_data[-1]), person)
+            return status == 200
+        except (URLError, OSError, ValueError) as e:
+            logger.error("An error occurred while updating person data: %s", e)
+            return False
+    # End of update_person
+
+    def delete_person(self, identity_document: str) -> bool:
+        """Delete the person data by identity document"""
+        try:
+            status, _ = self.request("DELETE", self.person_path(identity_document))
+            return status == 200
+        except (URLError, OSError, ValueError) as e:
+            logger.error("An error occurred while deleting person data: %s", e)
+            return False
+    # End of delete_person
+
+    def update_persons(self, persons: Iterable[tuple]) -> list[tuple[str, str]]:
+        """Update many persons in one request, see PersonModel.update_persons"""
+        persons = list(persons)
+        payload = [dict(zip(PERSON_COLUMNS, (person[-1], *person[:-1]))) for person in persons]
+        return self.batch("/batch/update", payload, [person[-1] for person in persons])
+    # End of update_persons
+
+    def set_columns(self, identity_documents: Iterable[str], changes: dict[str, str | None]) -> list[tuple[str, str]]:
+        """Set columns on many persons in one request, see PersonModel.set_columns"""
+        identity_documents = list(identity_documents)
+        return self.batch("/batch/set", {"identity_documents": identity_documents, "changes": changes}, identity_documents)
+    # End of set_columns
+
+    def delete_persons(self, identity_documents: Iterable[str]) -> list[tuple[str, str]]:
+        """Delete many persons in one request, see PersonModel.delete_persons"""
+        identity_documents = list(identity_documents)
+        return self.batch("/batch/delete", {"identity_documents": identity_documents}, identity_documents)
+    # End of delete_persons
+
+    def batch(self, path: str, payload, identity_documents: list[str]) -> list[tuple[str, str]]:
+        """POST a batch and return its (identity_document, outcome) pairs, ERROR for all if it fails"""
+        try:
+            status, body = self.request("POST", path, payload)
+            if status == 200:
+                return [tuple(outcome) for outcome in body["outcomes"]]
+            logger.error("The server rejected the batch: %s", body)
+        except (URLError, OSError, ValueError) as e:
+            logger.error("An error occurred while sending a batch to the server: %s", e)
+        return [(identity_document, PersonModel.ERROR) for identity_document in identity_documents]
+    # End of batch
+
+    def current_change_seq(self):
+        """Return the seq of the last change, see PersonModel.current_change_seq. Raises URLError when unreachable"""
+        status, body = self.request("GET", "/changes")
+        if status != 200:
+            raise URLError(f"The server answered {status} reading the change seq")
+        return body["seq"]
+    # End of current_change_seq
+
+    def changes_since(self, seq, limit: int = PersonModel.CHANGES_LIMIT):
+        """Return what changed after seq, see PersonModel.changes_since. Raises URLError when unreachable"""
+        since = ",".join(map(str, seq)) if isinstance(seq, (list, tuple)) else str(seq)
+        status, body = self.request("GET", "/changes?" + urlencode({"since": since, "limit": limit}))
+        if status != 200:
+            raise URLError(f"The server answered {status} reading the changes")
+        changes = body["changes"]
+        if changes is not None:
+            changes = [
+                (change["identity_document"],
+                 Person.from_mapping(change["person"]) if change["person"] else None)
+                for change in changes
+            ]
+        return body["seq"], changes
+    # End of changes_since
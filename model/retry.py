@@ -0,0 +1,87 @@
+import logging
+import random
+import sqlite3
+import threading
+import time
+from collections.abc import Callable
+from typing import TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Error codes of another connection (usually another station) holding the lock
+BUSY_ERROR_CODES = frozenset((sqlite3.SQLITE_BUSY, sqlite3.SQLITE_LOCKED))
+
+def is_busy_error(error: BaseException) -> bool:
+    """True if error is SQLite's "database is locked" / "database is busy"""
+    if not isinstance(error, sqlite3.OperationalError):
+        return False
+    code = getattr(error, "sqlite_errorcode", None)
+    if code is not None:
+        # Extended codes like SQLITE_BUSY_SNAPSHOT keep the primary code in the low byte
+        return code & 0xFF in BUSY_ERROR_CODES
+    message = str(error)
+    return "locked" in message or "busy" in message
+# End of is_busy_error
+
+class RetryPolicy:
+    """
+    Retries a write transaction that failed because another connection held the database lock.
+    SQLite already waits up to the busy timeout before giving up; this covers what the timeout
+    doesn't: contention longer than it, and the busy errors SQLite returns at once without
+    waiting (a read snapshot that went stale before its write could start).
+    Waits grow exponentially with full jitter, so retrying stations don't collide again in step.
+    Counts busy errors, retries and give-ups for the load test and the stats
+    """
+    # Attempts in total, the first one included
+    ATTEMPTS = 5
+    # Wait before the first retry, doubled on each following one up to MAX_DELAY, in seconds
+    BASE_DELAY = 0.01
+    MAX_DELAY = 1.0
+
+    def __init__(self, attempts: int = ATTEMPTS, base_delay: float = BASE_DELAY, max_delay: float = MAX_DELAY):
+        if attempts < 1:
+            raise ValueError("A retry policy needs at least one attempt")
+        self.attempts = attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._lock = threading.Lock()
+        self.busy_errors = 0
+        self.retries = 0
+        self.gave_up = 0
+
+    def delay(self, retry: int) -> float:
+        """Seconds to wait before the retry-th retry (from 1)"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (retry - 1)))
+    # End of delay
+
+    def run(self, work: Callable[[], T]) -> T:
+        """Call work until it doesn't raise a busy error or the attempts run out, then raise it"""
+        for attempt in range(1, self.attempts + 1):
+            try:
+                return work()
+            except sqlite3.OperationalError as e:
+                if not is_busy_error(e):
+                    raise
+                with self._lock:
+                    self.busy_errors += 1
+                    if attempt == self.attempts:
+                        self.gave_up += 1
+                        raise
+                    self.retries += 1
+                logger.debug("Database busy, retry %s of %s: %s", attempt, self.attempts - 1, e)
+                time.sleep(self.delay(attempt))
+    # End of run
+
+    def snapshot(self) -> dict:
+        """Return the counters as plain data"""
+        with self._lock:
+            return {"busy_errors": self.busy_errors, "retries": self.retries, "gave_up": self.gave_up}
+    # End of snapshot
+
+    def reset(self):
+        """Drop the counters"""
+        with self._lock:
+            self.busy_errors = self.retries = self.gave_up = 0
+    # End of reset
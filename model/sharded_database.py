@@ -0,0 +1,81 @@
+import glob
+import logging
+import os
+import zlib
+from contextlib import nullcontext
+from model.database import Database
+from model.instrumentation import Instrumentation
+from model.retry import RetryPolicy
+
+logger = logging.getLogger(__name__)
+
+class ShardedDatabase:
+    """
+    Person registry split over several SQLite files, each with its own connection pool and writer lock.
+    A person lives in the shard picked by a stable hash of the identity document, so writes to
+    different shards don't wait on each other. The shard count is fixed once the files exist
+    """
+    SHARDS = 4
+
+    def __init__(self, db_name="database.db", shards: int = SHARDS, cache_size_kib=Database.CACHE_SIZE_KIB,
+                 journal_mode="WAL", synchronous="NORMAL", instrumentation: Instrumentation | None = None,
+                 busy_timeout_ms: float = Database.BUSY_TIMEOUT_MS, retry_policy: RetryPolicy | None = None):
+        if shards < 1:
+            raise ValueError("A sharded database needs at least one shard")
+        self.db_name = db_name
+        # Shared by every shard, so statement stats and busy counters cover the whole registry
+        self.instrumentation = instrumentation
+        self.retry_policy = retry_policy or RetryPolicy()
+
+        stem, extension = os.path.splitext(db_name)
+        self.pattern = f"{glob.escape(stem)}.shard*{glob.escape(extension)}"
+        self.shards = [
+            Database(self.shard_path(db_name, index), cache_size_kib, journal_mode, synchronous, instrumentation,
+                     busy_timeout_ms, self.retry_policy)
+            for index in range(shards)
+        ]
+
+    def __len__(self) -> int:
+        return len(self.shards)
+
+    @staticmethod
+    def shard_path(path: str, index: int) -> str:
+        """File name of shard index for path: database.db is stored as database.shard0.db, database.shard1.db, ..."""
+        stem, extension = os.path.splitext(path)
+        return f"{stem}.shard{index}{extension}"
+    # End of shard_path
+
+    def shard_index(self, identity_document: str) -> int:
+        """Return the number of the shard holding identity_document, the same in every process"""
+        return zlib.crc32(identity_document.encode("utf-8")) % len(self.shards)
+    # End of shard_index
+
+    def shard_for(self, identity_document: str) -> Database:
+        """Return the shard holding identity_document"""
+        return self.shards[self.shard_index(identity_document)]
+    # End of shard_for
+
+    def measure(self, operation: str):
+        """Context manager timing one model operation, a no-op without instrumentation"""
+        if self.instrumentation is None:
+            return nullcontext()
+        return self.instrumentation.measure(operation)
+    # End of measure
+
+    def create_tables(self) -> bool:
+        """
+        Create the tables in every shard. Refuses to open files written with another shard
+        count, their persons would be looked up in the wrong shard
+        """
+        existing = glob.glob(self.pattern)
+        if existing and sorted(existing) != sorted(shard.db_name for shard in self.shards):
+            logger.error("'%s' has %s shard files, expected %s", self.db_name, len(existing), len(self.shards))
+            return False
+        return all([shard.create_tables() for shard in self.shards])
+    # End of create_tables
+
+    def close(self):
+        """Close the connection pools of every shard"""
+        for shard in self.shards:
+            shard.close()
+    # End of close
@@ -0,0 +1,255 @@
+import heapq
+import logging
+from collections.abc import Callable, Iterable, Iterator
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain, islice
+from operator import itemgetter
+from sqlite3 import Error
+from model.instrumentation import timed_operation
+from model.person_cache import PersonCache
+from model.person import PERSON_COLUMNS, Person
+from model.person_model import PersonModel
+from model.sharded_database import ShardedDatabase
+
+logger = logging.getLogger(__name__)
+
+class ShardedPersonModel:
+    """
+    Same interface as PersonModel over a ShardedDatabase.
+    Operations on one person go to the shard holding it. Listing, search and export ask every
+    shard at once on a thread pool and merge the answers: sqlite3 releases the GIL while a
+    statement runs, so the shards are scanned in parallel.
+    Point operations and the per-shard work are timed by the shard models, the merged reads here
+    """
+    # Rows asked to each shard on top of its even share of a page, so one round is usually enough
+    PAGE_MARGIN = 16
+
+    def __init__(self, db: ShardedDatabase, cache: PersonCache | None = None):
+        self.db = db
+        # One model per shard, sharing the cache since an ID is only ever stored in one shard
+        self.models = [PersonModel(shard, cache) for shard in db.shards]
+        self.executor = ThreadPoolExecutor(max_workers=len(self.models), thread_name_prefix="shard")
+
+    def model_for(self, identity_document: str) -> PersonModel:
+        """Return the model of the shard holding identity_document"""
+        return self.models[self.db.shard_index(identity_document)]
+    # End of model_for
+
+    def scatter(self, work: Callable[[PersonModel], object]) -> list:
+        """Run work on every shard model in parallel and return the results in shard order"""
+        futures = [self.executor.submit(work, model) for model in self.models]
+        return [future.result() for future in futures]
+    # End of scatter
+
+    def close(self):
+        """Stop the shard threads, the database pools are closed by the ShardedDatabase"""
+        self.executor.shutdown(wait=True)
+    # End of close
+
+    def create_person(self, person_data: tuple) -> bool:
+        """Create a new person in its shard. Expects: (identity_document, name, surname, address, phone_number)"""
+        return self.model_for(person_data[0]).create_person(person_data)
+    # End of create_person
+
+    def create_person_outcome(self, person_data: tuple) -> str:
+        """Create a new person in its shard and return the outcome, see PersonModel.create_person_outcome"""
+        return self.model_for(person_data[0]).create_person_outcome(person_data)
+    # End of create_person_outcome
+
+    def create_persons_bulk(self, persons: Iterable[tuple],
+                            chunk_size: int = PersonModel.BULK_CHUNK_SIZE) -> Iterator[tuple[str, str]]:
+        """
+        Create many persons, see PersonModel.create_persons_bulk. Each chunk is split by shard
+        and the parts are written concurrently, one transaction per shard.
+        Outcomes are yielded in input order
+        """
+        iterator = iter(persons)
+        while True:
+            chunk = list(islice(iterator, chunk_size))
+            if not chunk:
+                return
+            outcomes = self._write_chunk(PersonModel._insert_chunk, chunk, [row[0] for row in chunk])
+            yield from zip((row[0] for row in chunk), outcomes)
+    # End of create_persons_bulk
+
+    def _write_chunk(self, method: Callable[[PersonModel, list], list[str]], chunk: list,
+                     identity_documents: list[str]) -> list[str]:
+        """
+        Split chunk by the shard of each row's identity document, run method on every shard
+        model with its part concurrently and return the outcomes in chunk order
+        """
+        positions = [[] for _ in self.models]
+        for position, identity_document in enumerate(identity_documents):
+            positions[self.db.shard_index(identity_document)].append(position)
+        futures = [
+            (part, self.executor.submit(method, model, [chunk[position] for position in part]))
+            for model, part in zip(self.models, positions) if part
+        ]
+
+        outcomes = [None] * len(chunk)
+        for part, future in futures:
+            for position, outcome in zip(part, future.result()):
+                outcomes[position] = outcome
+        return outcomes
+    # End of _write_chunk
+
+    def read_person(self, identity_document: str) -> Person | None:
+        """Read the person data from its shard by identity document"""
+        return self.model_for(identity_document).read_person(identity_document)
+    # End of read_person
+
+    def read_all_persons(self) -> list[Person]:
+        """Read all person data from every shard"""
+        return list(chain.from_iterable(self.scatter(PersonModel.read_all_persons)))
+    # End of read_all_persons
+
+    @timed_operation("read_persons_page")
+    def read_persons_page(self, after_id: str | None = None, limit: int = PersonModel.PAGE_SIZE,
+                          before_id: str | None = None, filters: dict[str, str] | None = None,
+                          order_by: str = "identity_document", descending: bool = False) -> list[Person]:
+        """Read one page of persons in order_by order, see PersonModel.read_persons_page"""
+        try:
+            return self.query_persons_page(after_id, limit, before_id, filters, order_by, descending)
+        except Error as e:
+            logger.error("An error occurred while reading a page of persons from the database: %s", e)
+            return []
+    # End of read_persons_page
+
+    def query_persons_page(self, after_id: str | None = None, limit: int = PersonModel.PAGE_SIZE,
+                           before_id: str | None = None, filters: dict[str, str] | None = None,
+                           order_by: str = "identity_document", descending: bool = False) -> list[Person]:
+        """
+        Same as read_persons_page, but database errors are raised instead of logged.
+        The anchor person's position in the order is read from its shard, then every shard reads
+        about its even share of the page past that position and the sorted parts are merged.
+        The merge is only exact up to the earliest last row among the shards that filled their part,
+        so when a shard runs out early the rest of the page is read in another round from there
+        """
+        backward = before_id is not None
+        anchor = before_id if backward else after_id
+        key = None
+        if anchor is not None:
+            key = self.model_for(anchor).page_key(anchor, order_by)
+            if key is None:
+                return []
+        reverse = descending != backward
+        sort_key = PersonModel.sort_key(order_by)
+        column = PERSON_COLUMNS.index(order_by)
+
+        page = []
+        while len(page) < limit:
+            wanted = limit - len(page)
+            share = min(wanted, -(-wanted // len(self.models)) + self.PAGE_MARGIN)
+            parts = self.scatter(lambda model: model.query_persons_from(key, share, reverse, filters, order_by))
+            full = [part for part in parts if len(part) == share]
+            rows = list(heapq.merge(*parts, key=sort_key, reverse=reverse))
+            if full:
+                ends = [sort_key(part[-1]) for part in full]
+                if reverse:
+                    bound = max(ends)
+                    rows = [row for row in rows if sort_key(row) >= bound]
+                else:
+                    bound = min(ends)
+                    rows = [row for row in rows if sort_key(row) <= bound]
+            page.extend(rows[:wanted])
+            if page:
+                key = (page[-1][column], page[-1][0])
+            if not full:
+                break
+        if backward:
+            page.reverse()
+        return page
+    # End of query_persons_page
+
+    def iter_persons(self, page_size: int = PersonModel.PAGE_SIZE, after_id: str | None = None,
+                     filters: dict[str, str] | None = None) -> Iterator[Person]:
+        """Yield every person (matching the filters) ordered by identity document, starting after after_id"""
+        while True:
+            page = self.read_persons_page(after_id, page_size, filters=filters)
+            yield from page
+            if len(page) < page_size:
+                return
+            after_id = page[-1][0]
+    # End of iter_persons
+
+    def find_by_phone(self, phone_number: str, limit: int = PersonModel.SEARCH_LIMIT) -> list[Person]:
+        """Return the persons registered with phone_number in every shard, in ID order"""
+        parts = self.scatter(lambda model: model.find_by_phone(phone_number, limit))
+        return list(islice(heapq.merge(*parts, key=itemgetter(0)), limit))
+    # End of find_by_phone
+
+    def find_by_id_prefix(self, prefix: str, limit: int = PersonModel.SEARCH_LIMIT) -> list[Person]:
+        """Return the persons whose identity document starts with prefix, in ID order"""
+        parts = self.scatter(lambda model: model.find_by_id_prefix(prefix, limit))
+        return list(islice(heapq.merge(*parts, key=itemgetter(0)), limit))
+    # End of find_by_id_prefix
+
+    @timed_operation("search")
+    def search(self, query: str, limit: int = PersonModel.SEARCH_LIMIT) -> list[Person]:
+        """Search persons by name, surname and address in every shard, best match first"""
+        parts = self.scatter(lambda model: model.search_ranked(query, limit))
+        return [person for _, person in islice(heapq.merge(*parts, key=itemgetter(0)), limit)]
+    # End of search
+
+    def update_person(self, person_data: tuple) -> bool:
+        """Update the person data in its shard by identity document"""
+        return self.model_for(person_data[-1]).update_person(person_data)
+    # End of update_person
+
+    def delete_person(self, identity_document: str) -> bool:
+        """Delete the person data from its shard by identity document"""
+        return self.model_for(identity_document).delete_person(identity_document)
+    # End of delete_person
+
+    def update_persons(self, persons: Iterable[tuple],
+                       chunk_size: int = PersonModel.BULK_CHUNK_SIZE) -> list[tuple[str, str]]:
+        """Update many persons, each chunk split by shard and written concurrently, see PersonModel.update_persons"""
+        results = []
+        iterator = iter(persons)
+        while chunk := list(islice(iterator, chunk_size)):
+            identity_documents = [row[-1] for row in chunk]
+            results.extend(zip(identity_documents, self._write_chunk(PersonModel._update_chunk, chunk, identity_documents)))
+        return results
+    # End of update_persons
+
+    def set_columns(self, identity_documents: Iterable[str], changes: dict[str, str | None],
+                    chunk_size: int = PersonModel.BULK_CHUNK_SIZE) -> list[tuple[str, str]]:
+        """Set columns on many persons, each chunk split by shard and written concurrently, see PersonModel.set_columns"""
+        PersonModel._set_clause(changes)
+        results = []
+        iterator = iter(identity_documents)
+        while chunk := list(islice(iterator, chunk_size)):
+            outcomes = self._write_chunk(lambda model, part: model._set_columns_chunk(part, changes), chunk, chunk)
+            results.extend(zip(chunk, outcomes))
+        return results
+    # End of set_columns
+
+    def delete_persons(self, identity_documents: Iterable[str],
+                       chunk_size: int = PersonModel.BULK_CHUNK_SIZE) -> list[tuple[str, str]]:
+        """Delete many persons, each chunk split by shard and deleted concurrently, see PersonModel.delete_persons"""
+        results = []
+        iterator = iter(identity_documents)
+        while chunk := list(islice(iterator, chunk_size)):
+            results.extend(zip(chunk, self._write_chunk(PersonModel._delete_chunk, chunk, chunk)))
+        return results
+    # End of delete_persons
+
+    def current_change_seq(self) -> tuple[int, ...]:
+        """Return the seq of the last change of every shard, the seq is a tuple with one per shard"""
+        return tuple(self.scatter(PersonModel.current_change_seq))
+    # End of current_change_seq
+
+    def changes_since(self, seq: tuple[int, ...], limit: int = PersonModel.CHANGES_LIMIT) -> tuple[tuple[int, ...], list | None]:
+        """Return what changed in every shard after seq, see PersonModel.changes_since"""
+        futures = [self.executor.submit(model.changes_since, shard_seq, limit) for model, shard_seq in zip(self.models, seq)]
+        results = [future.result() for future in futures]
+        seqs = tuple(shard_seq for shard_seq, _ in results)
+        if any(changes is None for _, changes in results):
+            return seqs, None
+        return seqs, list(chain.from_iterable(changes for _, changes in results))
+    # End of changes_since
+
+    def prune_changes(self, keep: int = PersonModel.CHANGE_LOG_SIZE) -> int:
+        """Prune the change log of every shard, see PersonModel.prune_changes"""
+        return sum(self.scatter(lambda model: model.prune_changes(keep)))
+    # End of prune_changes
@@ -0,0 +1,117 @@
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from sqlite3 import Error
+from model.database import Database
+from model.retry import is_busy_error
+
+logger = logging.getLogger(__name__)
+
+class WriteQueue:
+    """
+    Group-commit queue for single-statement writes.
+    Callers submit a statement and get a Future. A background thread applies everything queued
+    in one transaction, so concurrent writes share a single commit (and fsync). Each Future
+    resolves only after its batch is committed: to the statement rowcount, or to the error
+    that statement (or the commit) raised
+    """
+    # Most statements applied in one transaction
+    MAX_BATCH = 256
+    # Extra time to wait for more writes once the first one arrives, 0 only takes what is queued
+    MAX_DELAY = 0.0
+
+    def __init__(self, db: Database, max_batch: int = MAX_BATCH, max_delay: float = MAX_DELAY):
+        self.db = db
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._queue = queue.Queue()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="write-queue", daemon=True)
+        self._thread.start()
+
+    def submit(self, sql: str, parameters) -> Future:
+        """Queue one write statement and return the Future of its rowcount"""
+        if self._closed:
+            raise RuntimeError("The write queue is closed")
+        future = Future()
+        self._queue.put((future, sql, parameters))
+        return future
+    # End of submit
+
+    def _run(self):
+        """Background loop: wait for a write, collect a batch and apply it"""
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            stop = self._collect(batch)
+            self._apply(batch)
+            if stop:
+                return
+    # End of _run
+
+    def _collect(self, batch: list) -> bool:
+        """Add queued writes to the batch until it is full or max_delay runs out. Returns True on close"""
+        deadline = time.monotonic() + self.max_delay
+        while len(batch) < self.max_batch:
+            try:
+                remaining = deadline - time.monotonic()
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                return False
+            if item is None:
+                return True
+            batch.append(item)
+        return False
+    # End of _collect
+
+    def _apply(self, batch: list):
+        """
+        Run the batch in one transaction and resolve every Future once it is committed.
+        The write lock is taken up front, so a busy database fails (and is retried by the
+        database retry policy) before any statement runs
+        """
+        batch = [item for item in batch if item[0].set_running_or_notify_cancel()]
+        if not batch:
+            return
+
+        def apply(connection) -> list:
+            outcomes = []
+            connection.execute("BEGIN IMMEDIATE")
+            for future, sql, parameters in batch:
+                try:
+                    outcomes.append((future, connection.execute(sql, parameters).rowcount, None))
+                except Error as e:
+                    if is_busy_error(e):
+                        raise
+                    # Only the failing statement is undone, the rest of the batch goes on
+                    outcomes.append((future, None, e))
+            return outcomes
+
+        try:
+            with self.db.measure("write_batch"):
+                outcomes = self.db.write(apply)
+        except Error as e:
+            logger.error("An error occurred while committing a batch of %s writes: %s", len(batch), e)
+            for future, _, _ in batch:
+                future.set_exception(e)
+            return
+
+        for future, rowcount, error in outcomes:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(rowcount)
+    # End of _apply
+
+    def close(self):
+        """Apply what is still queued and stop the background thread"""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join()
+    # End of close
\ No newline at end of file
@@ -0,0 +1,377 @@
+"""
+Headless HTTP/JSON service exposing the person registry to several registration stations.
+Usage: python server.py --db database.db --host 0.0.0.0 --port 8080
+Add --backup backups/database-%Y%m%d-%H.db for hourly online backups, see maintenance.py for one-off runs
+
+Endpoints (persons are JSON objects with the person columns as keys):
+    GET    /persons?after=&before=&limit=   page of persons ordered by identity document
+           &sort=&desc=1&<column>=          ordered by another column (then by ID), descending, only
+                                            persons whose columns have the given values
+    GET    /persons?prefix=&limit=          persons whose identity document starts with prefix
+    GET    /persons?phone=&limit=           persons registered with a phone number
+    GET    /persons/<id>                    one person, 404 if it doesn't exist
+    POST   /persons                         create a person, 409 if the ID already exists
+                                            Person values must be strings or null, anything else answers 400
+    PUT    /persons/<id>                    update a person, 404 if it doesn't exist
+    DELETE /persons/<id>                    delete a person, 404 if it doesn't exist
+    POST   /batch/update                    update a list of persons, answers {"outcomes": [[id, outcome], ...]}
+    POST   /batch/delete                    delete {"identity_documents": [...]}, answers the outcome of each
+    GET    /search?q=&limit=                full-text search over name, surname and address
+    GET    /changes?since=&limit=           {"seq": new seq, "changes": [{"identity_document", "person"}, ...]}
+                                            person is null for deletes, changes is null when a full reload is needed.
+                                            Without since only the current seq is returned
+    GET    /stats                           instrumentation snapshot and busy database counters
+"""
+import argparse
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from sqlite3 import Error
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from model.database import Database
+from model.instrumentation import Instrumentation
+from model.maintenance import DatabaseMaintenance, MaintenanceScheduler
+from model.person_index import PersonIndex
+from model.person_model import PersonModel, PERSON_COLUMNS
+from model.retry import RetryPolicy
+from model.sharded_database import ShardedDatabase
+from model.sharded_person_model import ShardedPersonModel
+from model.write_queue import WriteQueue
+
+logger = logging.getLogger("server")
+
+def person_to_json(person: tuple) -> dict:
+    """Turn a person tuple into its JSON object"""
+    return dict(zip(PERSON_COLUMNS, person))
+# End of person_to_json
+
+def check_text(name: str, value, required: bool = False):
+    """Raise ValueError unless value is a string, or null when not required"""
+    if not isinstance(value, str) and (required or value is not None):
+        raise ValueError(f"{name} must be a string" if required else f"{name} must be a string or null")
+# End of check_text
+
+def json_to_person(body) -> tuple:
+    """Turn a JSON person object into a person tuple, raising ValueError if it isn't one"""
+    if not isinstance(body, dict):
+        raise ValueError("a person must be a JSON object")
+    for column in PERSON_COLUMNS:
+        check_text(column, body.get(column), column == "identity_document")
+    return tuple(body.get(column) for column in PERSON_COLUMNS)
+# End of json_to_person
+
+class PooledHTTPServer(HTTPServer):
+    """
+    HTTP server answering requests on a fixed pool of threads.
+    Each pooled thread keeps its own reader connection, writes all go through the single writer
+    """
+    WORKERS = 8
+
+    def __init__(self, address, handler, model: PersonModel, workers: int = WORKERS):
+        super().__init__(address, handler)
+        self.model = model
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="http")
+
+    def process_request(self, request, client_address):
+        self.executor.submit(self.process_request_thread, request, client_address)
+
+    def process_request_thread(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        self.executor.shutdown(wait=True)
+
+class PersonRequestHandler(BaseHTTPRequestHandler):
+    """Routes the JSON endpoints to the PersonModel shared by the server"""
+    server_version = "PersonRegistry/1.0"
+    # Largest limit a client may ask for, so one request can't read an unbounded page
+    MAX_LIMIT = 1000
+
+    @property
+    def model(self) -> PersonModel:
+        return self.server.model
+
+    def do_GET(self):
+        path, query = self.route()
+        if path == ["persons"] and "prefix" in query:
+            limit = self.int_param(query, "limit", PersonModel.SEARCH_LIMIT)
+            persons = self.model.find_by_id_prefix(query["prefix"], limit)
+            self.send_json(200, [person_to_json(person) for person in persons])
+        elif path == ["persons"] and "phone" in query:
+            limit = self.int_param(query, "limit", PersonModel.SEARCH_LIMIT)
+            persons = self.model.find_by_phone(query["phone"], limit)
+            self.send_json(200, [person_to_json(person) for person in persons])
+        elif path == ["persons"]:
+            self.persons_page(query)
+        elif len(path) == 2 and path[0] == "persons":
+            person = self.model.read_person(path[1])
+            if person:
+                self.send_json(200, person_to_json(person))
+            else:
+                self.send_json(404, {"error": "Person not found"})
+        elif path == ["search"]:
+            limit = self.int_param(query, "limit", PersonModel.SEARCH_LIMIT)
+            persons = self.model.search(query.get("q", ""), limit)
+            self.send_json(200, [person_to_json(person) for person in persons])
+        elif path == ["changes"]:
+            self.changes(query)
+        elif path == ["stats"]:
+            instrumentation = self.model.db.instrumentation
+            stats = instrumentation.snapshot() if instrumentation else {}
+            self.send_json(200, {**stats, "busy": self.model.db.retry_policy.snapshot()})
+        else:
+            self.send_json(404, {"error": "Unknown endpoint"})
+    # End of do_GET
+
+    def do_POST(self):
+        path, _ = self.route()
+        if path in (["batch", "update"], ["batch", "set"], ["batch", "delete"]):
+            self.batch(path[1])
+            return
+        if path != ["persons"]:
+            self.send_json(404, {"error": "Unknown endpoint"})
+            return
+        person = self.read_person_json()
+        if person is None:
+            return
+        outcome = self.model.create_person_outcome(person)
+        if outcome == PersonModel.INSERTED:
+            self.send_json(201, person_to_json(person))
+        elif outcome == PersonModel.DUPLICATE:
+            self.send_json(409, {"error": "Couldn't create person (ID already exist)"})
+        elif outcome == PersonModel.ERROR:
+            self.send_json(500, {"error": "Couldn't create person"})
+        else:
+            self.send_json(400, {"error": "Invalid person: a required value is missing or a value isn't valid"})
+    # End of do_POST
+
+    def do_PUT(self):
+        path, _ = self.route()
+        if len(path) != 2 or path[0] != "persons":
+            self.send_json(404, {"error": "Unknown endpoint"})
+            return
+        person = self.read_person_json(path[1])
+        if person is None:
+            return
+        if self.model.update_person((*person[1:], person[0])):
+            self.send_json(200, person_to_json(person))
+        else:
+            self.send_json(404, {"error": "Person ID no exists"})
+    # End of do_PUT
+
+    def do_DELETE(self):
+        path, _ = self.route()
+        if len(path) != 2 or path[0] != "persons":
+            self.send_json(404, {"error": "Unknown endpoint"})
+            return
+        if self.model.delete_person(path[1]):
+            self.send_json(200, {"identity_document": path[1]})
+        else:
+            self.send_json(404, {"error": "Person ID no exists"})
+    # End of do_DELETE
+
+    def batch(self, operation: str):
+        """Run a batch update, column set or delete from the request body and answer the outcome of each person"""
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            body = json.loads(self.rfile.read(length) or b"null")
+            if operation == "update":
+                if not isinstance(body, list):
+                    raise ValueError("the body must be a JSON list of persons")
+                persons = [json_to_person(person) for person in body]
+                outcomes = self.model.update_persons((*person[1:], person[0]) for person in persons)
+            else:
+                identity_documents = body["identity_documents"]
+                if not isinstance(identity_documents, list):
+                    raise ValueError("identity_documents must be a JSON list")
+                for identity_document in identity_documents:
+                    check_text("identity_document", identity_document, required=True)
+                if operation == "set":
+                    if not isinstance(body["changes"], dict):
+                        raise ValueError("changes must be a JSON object")
+                    for column, value in body["changes"].items():
+                        check_text(column, value)
+                    outcomes = self.model.set_columns(identity_documents, body["changes"])
+                else:
+                    outcomes = self.model.delete_persons(identity_documents)
+        except (ValueError, AttributeError, KeyError, TypeError) as e:
+            self.send_json(400, {"error": f"Invalid batch: {str(e)}"})
+            return
+        self.send_json(200, {"outcomes": outcomes})
+    # End of batch
+
+    def persons_page(self, query: dict):
+        """Answer one page of persons, sorted by the sort column and filtered by the person columns in the query"""
+        limit = self.int_param(query, "limit", PersonModel.PAGE_SIZE)
+        order_by = query.get("sort", "identity_document")
+        if order_by not in PERSON_COLUMNS:
+            self.send_json(400, {"error": f"sort must be one of: {', '.join(PERSON_COLUMNS)}"})
+            return
+        filters = {column: query[column] for column in PERSON_COLUMNS if column in query}
+        persons = self.model.read_persons_page(query.get("after"), limit, query.get("before"), filters,
+                                               order_by, query.get("desc") in ("1", "true"))
+        self.send_json(200, [person_to_json(person) for person in persons])
+    # End of persons_page
+
+    def changes(self, query: dict):
+        """Answer the changes after the since seq, a comma separated list when the registry is sharded"""
+        try:
+            if "since" not in query:
+                self.send_json(200, {"seq": self.model.current_change_seq()})
+                return
+            seq = [int(part) for part in query["since"].split(",")]
+            seq, changes = self.model.changes_since(seq[0] if len(seq) == 1 else tuple(seq),
+                                                    self.int_param(query, "limit", PersonModel.CHANGES_LIMIT))
+        except ValueError:
+            self.send_json(400, {"error": "since must be a change seq"})
+            return
+        except Error as e:
+            logger.error("An error occurred while reading the change log: %s", e)
+            self.send_json(500, {"error": "Can't read the change log"})
+            return
+        if changes is not None:
+            changes = [{"identity_document": identity_document, "person": person and person_to_json(person)}
+                       for identity_document, person in changes]
+        self.send_json(200, {"seq": seq, "changes": changes})
+    # End of changes
+
+    def route(self) -> tuple[list[str], dict]:
+        """Split the request path into unquoted segments and the query string into single values"""
+        url = urlsplit(self.path)
+        path = [unquote(segment) for segment in url.path.split("/") if segment]
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        return path, query
+    # End of route
+
+    def int_param(self, query: dict, name: str, default: int) -> int:
+        """Return a positive integer query parameter up to MAX_LIMIT, or the default when missing or invalid"""
+        try:
+            return min(max(1, int(query[name])), self.MAX_LIMIT)
+        except (KeyError, ValueError):
+            return default
+    # End of int_param
+
+    def read_person_json(self, identity_document: str | None = None) -> tuple | None:
+        """
+        Read the request body as a person object and return it as a person tuple.
+        The ID comes from the URL when given. Answers 400 and returns None if the body is invalid
+        """
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            body = json.loads(self.rfile.read(length) or b"{}")
+            if not isinstance(body, dict):
+                raise ValueError("the body must be a JSON object")
+            if identity_document is not None:
+                body["identity_document"] = identity_document
+            if not body.get("identity_document"):
+                raise ValueError("identity_document is required")
+            return json_to_person(body)
+        except ValueError as e:
+            self.send_json(400, {"error": f"Invalid person: {str(e)}"})
+            return None
+    # End of read_person_json
+
+    def send_json(self, status: int, payload):
+        """Answer with the payload encoded as JSON"""
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    # End of send_json
+
+    def log_message(self, format, *args):
+        logger.info("%s %s", self.address_string(), format % args)
+
+def schedule_maintenance(db: Database | ShardedDatabase, args) -> MaintenanceScheduler:
+    """Start the background backups, vacuums and statistics refreshes asked for on the command line, shard by shard"""
+    scheduler = MaintenanceScheduler()
+    shards = db.shards if isinstance(db, ShardedDatabase) else [db]
+    for index, shard in enumerate(shards):
+        maintenance = DatabaseMaintenance(shard)
+        if args.backup and args.backup_every > 0:
+            def backup(maintenance=maintenance, index=index):
+                target = datetime.now().strftime(args.backup)
+                if len(shards) > 1:
+                    target = ShardedDatabase.shard_path(target, index)
+                return maintenance.backup(target)
+            scheduler.every(args.backup_every * 60, backup)
+        if args.vacuum_every > 0:
+            scheduler.every(args.vacuum_every * 60, maintenance.incremental_vacuum)
+        if args.optimize_every > 0:
+            scheduler.every(args.optimize_every * 60, maintenance.optimize)
+    scheduler.start()
+    return scheduler
+# End of schedule_maintenance
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the person registry as HTTP/JSON")
+    parser.add_argument("--db", default="database.db", help="Database file (default: database.db)")
+    parser.add_argument("--host", default="127.0.0.1", help="Address to listen on")
+    parser.add_argument("--port", type=int, default=8080, help="Port to listen on")
+    parser.add_argument("--workers", type=int, default=PooledHTTPServer.WORKERS, help="Request threads (one reader connection each)")
+    parser.add_argument("--shards", type=int, default=0,
+                        help="Split the registry over this many database files (default: a single file)")
+    parser.add_argument("--group-commit-ms", type=float, default=WriteQueue.MAX_DELAY * 1000,
+                        help="Time to wait for more writes to share a commit (0 only batches writes already queued)")
+    parser.add_argument("--busy-timeout-ms", type=float, default=Database.BUSY_TIMEOUT_MS,
+                        help="How long a write waits for another process holding the database lock")
+    parser.add_argument("--retry-attempts", type=int, default=RetryPolicy.ATTEMPTS,
+                        help="Attempts of a write transaction that keeps finding the database busy")
+    parser.add_argument("--backup", metavar="PATH",
+                        help="Take online backups to this file, strftime codes allowed (e.g. backups/database-%%Y%%m%%d-%%H.db)")
+    parser.add_argument("--backup-every", type=float, default=60, metavar="MINUTES", help="Minutes between backups (default: 60)")
+    parser.add_argument("--vacuum-every", type=float, default=0, metavar="MINUTES",
+                        help="Minutes between incremental vacuums giving deleted space back (default: never)")
+    parser.add_argument("--optimize-every", type=float, default=60, metavar="MINUTES",
+                        help="Minutes between query planner statistics refreshes (default: 60, 0 for never)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    write_queue = None
+    if args.shards:
+        # Each shard has its own writer, so writes to different shards already run side by side
+        db = ShardedDatabase(args.db, args.shards, instrumentation=Instrumentation(), busy_timeout_ms=args.busy_timeout_ms,
+                             retry_policy=RetryPolicy(args.retry_attempts))
+        if not db.create_tables():
+            raise SystemExit(1)
+        model = ShardedPersonModel(db)
+    else:
+        db = Database(args.db, instrumentation=Instrumentation(), busy_timeout_ms=args.busy_timeout_ms,
+                      retry_policy=RetryPolicy(args.retry_attempts))
+        db.create_tables()
+        write_queue = WriteQueue(db, max_delay=args.group_commit_ms / 1000)
+        index = PersonIndex()
+        index.build(db)
+        model = PersonModel(db, write_queue=write_queue, index=index)
+    model.prune_changes()
+    scheduler = schedule_maintenance(db, args)
+    server = PooledHTTPServer((args.host, args.port), PersonRequestHandler, model, args.workers)
+    logger.info("Serving %s on http://%s:%s", args.db, args.host, args.port)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        scheduler.stop()
+        if write_queue is not None:
+            write_queue.close()
+        if args.shards:
+            model.close()
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
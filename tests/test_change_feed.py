@@ -0,0 +1,60 @@
+import os
+import tempfile
+import unittest
+
+from model.database import Database
+from model.person import Person
+from model.person_cache import PersonCache
+from model.person_index import PersonIndex
+from model.person_model import PersonModel
+
+class ChangeFeedTest(unittest.TestCase):
+    """A station follows the change feed of another one and never keeps an older version of a row"""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.db = Database(os.path.join(self.directory.name, "test.db"))
+        self.db.create_tables()
+        self.index = PersonIndex()
+        self.index.build(self.db)
+        self.model = PersonModel(self.db, PersonCache(), index=self.index)
+        # Another station writing to the same registry
+        self.other = PersonModel(self.db)
+        self.model.create_person(("00000000001", "Ana", "Ruiz", None, None))
+
+    def tearDown(self):
+        self.db.close()
+        self.directory.cleanup()
+
+    def test_seq_ahead_of_the_log_asks_for_a_reload(self):
+        latest = self.model.current_change_seq()
+        self.assertEqual(self.model.changes_since(latest + 10), (latest, None))
+
+    def test_seq_before_the_pruned_log_asks_for_a_reload(self):
+        for number in range(2, 6):
+            self.other.create_person((f"{number:011d}", "Eva", "Gil", None, None))
+        self.model.prune_changes(keep=2)
+        self.assertEqual(self.model.changes_since(1), (self.model.current_change_seq(), None))
+
+    def test_feed_applies_the_changes_of_other_stations(self):
+        seq = self.model.current_change_seq()
+        self.other.update_person(("Eva", "Ruiz", None, None, "00000000001"))
+        self.other.create_person(("00000000002", "Leo", "Gil", None, None))
+        seq, changes = self.model.changes_since(seq)
+        self.assertEqual(seq, self.model.current_change_seq())
+        self.assertEqual([person.name for _, person in changes], ["Eva", "Leo"])
+        self.assertEqual([person.name for person in self.index.prefix("0000000000")], ["Eva", "Leo"])
+
+    def test_write_overtaken_by_the_feed_keeps_the_newer_row(self):
+        # A write that started before the feed applied a newer version of its row
+        generation = self.model._feed_generation
+        stale = Person("00000000001", "Old", "Ruiz")
+        self.other.update_person(("New", "Ruiz", None, None, "00000000001"))
+        self.model.changes_since(0)
+        self.model._after_write(generation, [stale.identity_document], [stale], cached=stale)
+        self.assertEqual(self.index.prefix("00000000001")[0].name, "New")
+        self.assertEqual(self.model.read_person("00000000001").name, "New")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,44 @@
+import os
+import tempfile
+import unittest
+
+from model.database import Database
+from model.person import Person
+from model.person_model import PersonModel
+
+class PageQueryPlanTest(unittest.TestCase):
+    """Sorted and filtered pages are read from the secondary indexes, not sorted or scanned"""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.db = Database(os.path.join(self.directory.name, "test.db"))
+        self.db.create_tables()
+        self.model = PersonModel(self.db)
+        for number in range(50):
+            self.model.create_person(Person(f"{number:011d}", "Ana", f"Surname {number % 7}", None, f"6000000{number % 5:04d}"))
+
+    def tearDown(self):
+        self.db.close()
+        self.directory.cleanup()
+
+    def assertUsesIndex(self, plan: list[str], index: str):
+        self.assertTrue(any(f"USING INDEX {index}" in step or f"USING COVERING INDEX {index}" in step for step in plan), plan)
+        self.assertFalse(any("USE TEMP B-TREE FOR ORDER BY" in step for step in plan), plan)
+
+    def test_surname_order_uses_person_surname(self):
+        self.assertUsesIndex(self.model.explain_page_query(order_by="surname"), "person_surname")
+
+    def test_surname_order_past_a_key_uses_person_surname(self):
+        plan = self.model.explain_page_query(order_by="surname", descending=True, after_id="00000000010")
+        self.assertUsesIndex(plan, "person_surname")
+
+    def test_phone_filter_searches_person_phone(self):
+        plan = self.model.explain_page_query(filters={"phone_number": "60000000001"})
+        self.assertTrue(any(step.startswith("SEARCH") and "person_phone" in step for step in plan), plan)
+
+    def test_phone_order_uses_person_phone(self):
+        self.assertUsesIndex(self.model.explain_page_query(order_by="phone_number"), "person_phone")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,33 @@
+import unittest
+
+from model.person_validation import PersonValidator
+
+class ValidateBatchTest(unittest.TestCase):
+    """Malformed rows are reported as validation errors of their own row, the rest of the batch is unaffected"""
+
+    def setUp(self):
+        self.validator = PersonValidator()
+
+    def test_rows_with_missing_or_extra_values_are_reported(self):
+        results = self.validator.validate_batch([
+            ("1", "ana", "ruiz", None, None),
+            ("2", "eva"),
+            ("3", "jo", "li", None, None, "extra")
+        ])
+        self.assertEqual(results[0], (("1", "Ana", "Ruiz", None, None), ()))
+        self.assertEqual(results[1], (("2", "eva", None, None, None), (("record", "has 2 values instead of 5"),)))
+        self.assertEqual(results[2][1], (("record", "has 6 values instead of 5"),))
+
+    def test_values_that_are_not_text_are_reported(self):
+        results = self.validator.validate_batch([
+            (12345, "ana", "ruiz", None, 600000000),
+            ("2", "eva", ["li"], None, None),
+            ("3", "jo", "li", None, None)
+        ])
+        self.assertEqual(results[0][1], (("identity_document", "must be text"), ("phone_number", "must be text")))
+        self.assertEqual(results[1][1], (("surname", "must be text"),))
+        self.assertEqual(results[2], (("3", "Jo", "Li", None, None), ()))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,81 @@
+import json
+import os
+import tempfile
+import threading
+import unittest
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+
+from model.database import Database
+from model.person_index import PersonIndex
+from model.person_model import PersonModel
+from server import PersonRequestHandler, PooledHTTPServer
+
+class NonTextIdTest(unittest.TestCase):
+    """Persons whose values aren't text are answered with an error and never reach the table, the cache or the index"""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.db = Database(os.path.join(self.directory.name, "test.db"))
+        self.db.create_tables()
+        self.index = PersonIndex()
+        self.index.build(self.db)
+        self.model = PersonModel(self.db, index=self.index)
+        self.server = PooledHTTPServer(("127.0.0.1", 0), PersonRequestHandler, self.model, workers=2)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.db.close()
+        self.directory.cleanup()
+
+    def request(self, method: str, path: str, body=None) -> tuple[int, object]:
+        """Send a JSON request and return the status and the decoded answer"""
+        host, port = self.server.server_address
+        data = None if body is None else json.dumps(body).encode("utf-8")
+        request = Request(f"http://{host}:{port}{path}", data=data, method=method,
+                          headers={"Content-Type": "application/json"})
+        try:
+            with urlopen(request, timeout=5) as response:
+                return response.status, json.load(response)
+        except HTTPError as e:
+            return e.code, json.load(e)
+
+    def test_create_with_number_id_is_rejected(self):
+        status, _ = self.request("POST", "/persons", {"identity_document": 12345, "name": "Ana", "surname": "Ruiz"})
+        self.assertEqual(status, 400)
+        self.assertIsNone(self.model.read_person("12345"))
+        self.assertEqual(self.request("GET", "/persons?prefix=123"), (200, []))
+
+    def test_create_with_list_name_is_rejected(self):
+        status, _ = self.request("POST", "/persons", {"identity_document": "12345", "name": ["Ana"], "surname": "Ruiz"})
+        self.assertEqual(status, 400)
+
+    def test_create_conflicts_only_on_the_id(self):
+        person = {"identity_document": "12345", "name": "Ana", "surname": "Ruiz", "address": None, "phone_number": None}
+        self.assertEqual(self.request("POST", "/persons", person), (201, person))
+        with self.assertLogs("model.person_model", "WARNING"):
+            self.assertEqual(self.request("POST", "/persons", person)[0], 409)
+            self.assertEqual(self.request("POST", "/persons", {**person, "identity_document": "54321", "name": None})[0], 400)
+
+    def test_batch_update_with_number_id_is_rejected(self):
+        self.assertTrue(self.model.create_person(("12345", "Ana", "Ruiz", None, None)))
+        status, _ = self.request("POST", "/batch/update", [{"identity_document": 12345, "name": "Eva", "surname": "Ruiz"}])
+        self.assertEqual(status, 400)
+        self.assertEqual(self.request("POST", "/batch/delete", {"identity_documents": [12345]})[0], 400)
+        self.assertEqual(self.request("POST", "/batch/set", {"identity_documents": ["12345"], "changes": {"name": 1}})[0], 400)
+        self.assertEqual(self.model.read_person("12345").name, "Ana")
+        self.assertEqual(self.index.prefix("123")[0].name, "Ana")
+
+    def test_model_reports_values_that_are_not_text(self):
+        with self.assertLogs("model.person_model", "WARNING"):
+            self.assertFalse(self.model.create_person((12345, "Ana", "Ruiz", None, None)))
+        self.assertEqual(self.model.update_persons([("Eva", "Ruiz", None, None, 12345)]), [(12345, PersonModel.INVALID)])
+        self.assertEqual(len(self.index), 0)
+        self.assertEqual(self.model.read_all_persons(), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
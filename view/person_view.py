@@ -1,9 +1,28 @@
-from tkinter import ttk
+from bisect import bisect_left
+from tkinter import messagebox, ttk
 import customtkinter as ctk
+from model.person import Person
 
 class PersonView:
     BUTTON_RADIUS = 6
     BUTTON_WIDTH = 20
+    # Rows requested per page and most rows kept in the table at once
+    TABLE_PAGE_SIZE = 100
+    TABLE_WINDOW_SIZE = 300
+    # Fraction of the scroll range from either end that triggers loading the next page
+    TABLE_PREFETCH = 0.1
+    # Quiet time after the last keystroke before the search runs
+    SEARCH_DEBOUNCE_MS = 250
+    # Interval between two polls of the change feed, for changes made by other stations
+    CHANGE_POLL_MS = 2000
+    # Table headings and the person column each one sorts by
+    TABLE_COLUMNS = {
+        "ID Document": "identity_document",
+        "Name": "name",
+        "Surname": "surname",
+        "Address": "address",
+        "Phone Number": "phone_number"
+    }
     
     """
     A GUI class from person registrity using customtkinter.
@@ -25,6 +44,9 @@ class PersonView:
         # Store commands callbacks (set by the controller)
         self.commands = {}
         
+        # CRUD buttons by operation, to show requests in flight
+        self.buttons = {}
+        
         # Common font for all labels
         self.label_font = ctk.CTkFont(size=16, family="Times New Roman", weight="bold")
 
@@ -35,10 +57,21 @@ class PersonView:
         self.address_var = ctk.StringVar(value="")
         self.phone_number_var = ctk.StringVar(value="")
         self.message_var = ctk.StringVar(value="")
+        self.search_var = ctk.StringVar(value="")
         
         # Label to display messages
         self.message_label = None
         
+        # Table window state: rows are paged in as the user scrolls
+        self._table_offset = 0
+        self._table_at_end = False
+        self._table_load_pending = False
+        # Column the table is sorted by and whether descending, set by clicking the headings
+        self._table_sort = ("identity_document", False)
+        
+        # Pending debounced search (id returned by window.after)
+        self._search_job = None
+        
         # Show app
         self.form_frame()
         self.crud_frame()
@@ -53,6 +86,58 @@ class PersonView:
         self.commands["update"] = update_command
         self.commands["delete"] = delete_command
     
+    def set_batch_command_callbacks(self, update_selected_command, delete_selected_command):
+        """
+        Receives the controller's handlers for the rows selected in the table.
+        They are used by Update and Delete when the Identity document field is empty
+        """
+        self.commands["update_selected"] = update_selected_command
+        self.commands["delete_selected"] = delete_selected_command
+    
+    def set_table_loader(self, load_page_command):
+        """
+        Receives the controller's page loader used to fill the table.
+        load_page_command(after_id, before_id, limit, order_by, descending) returns a list of person tuples
+        """
+        self.commands["load_page"] = load_page_command
+    
+    def set_search_command(self, search_command):
+        """
+        Receives the controller's search handler.
+        search_command(query) is called with the search box text once the user stops typing
+        """
+        self.commands["search"] = search_command
+    
+    def set_change_poller(self, poll_changes_command):
+        """
+        Receives the controller's change feed handler and starts calling it every CHANGE_POLL_MS.
+        poll_changes_command() hands what changed to apply_changes
+        """
+        self.commands["poll_changes"] = poll_changes_command
+        self.window.after(self.CHANGE_POLL_MS, self.poll_changes)
+    
+    def poll_changes(self):
+        """Ask the controller for the latest changes and schedule the next poll"""
+        self.commands["poll_changes"]()
+        self.window.after(self.CHANGE_POLL_MS, self.poll_changes)
+    # End of poll_changes
+    
+    def set_in_flight(self, operation: str, in_flight: bool):
+        """
+        Show whether a request for the operation is running.
+        Write buttons are disabled meanwhile so the same change isn't sent twice,
+        the Read button stays enabled because a newer read supersedes the running one
+        """
+        button = self.buttons.get(operation)
+        if button is None:
+            return
+        
+        text = operation.capitalize()
+        button.configure(text=f"{text}..." if in_flight else text)
+        if operation != "read":
+            button.configure(state="disabled" if in_flight else "normal")
+    # End of set_in_flight
+    
     def display_message(self, message: str, color: str = "8ecae6"):
         """Update the message label with a message and a specific color"""
         # Update the text displayed via the variableS
@@ -63,36 +148,33 @@ class PersonView:
         
         
     
-    def get_inputs(self):
+    def get_person(self) -> Person:
         """
-        Get the values from entry fields, also create a dictionary and return it the values
+        Get the values from entry fields as a Person record, the same record the model reads and stores
         """
-        return {
-            "identity_document": self.identity_document_var.get().strip(),
-            "name": self.name_var.get().strip(),
-            "surname": self.surname_var.get().strip(),
-            "address": self.address_var.get().strip(),
-            "phone_number": self.phone_number_var.get().strip()
-        }
-    
-    def set_inputs(self, identity_document, name, surname, address, phone_number):
+        return Person(
+            self.identity_document_var.get().strip(),
+            self.name_var.get().strip(),
+            self.surname_var.get().strip(),
+            self.address_var.get().strip(),
+            self.phone_number_var.get().strip()
+        )
+    # End of get_person
+    
+    def set_person(self, person: Person):
         """Set the values of the input fields.
         Used by the Controller's read handler to display data
         """
-        self.identity_document_var.set(identity_document)
-        self.name_var.set(name)
-        self.surname_var.set(surname)
-        self.address_var.set(address)
-        self.phone_number_var.set(phone_number)
-    # End of set_inputs
+        self.identity_document_var.set(person.identity_document)
+        self.name_var.set(person.name)
+        self.surname_var.set(person.surname)
+        self.address_var.set(person.address)
+        self.phone_number_var.set(person.phone_number)
+    # End of set_person
     
     def clear_all_inputs(self):       
         """Clear all inputs fields and update message label"""
-        empty = {}
-        for key, value in self.get_inputs().items():
-            if value == "":
-                empty[key] = value
-        if len(empty) == 5:
+        if not any(self.get_person()):
             return 
             
         self.identity_document_var.set("")
@@ -126,15 +208,40 @@ class PersonView:
     # End of read_person
     
     def update_person(self):
-        """Calls the controller to update person"""
+        """Calls the controller to update person, or the rows selected in the table when no ID is typed"""
+        if self.batch_selected("update_selected"):
+            return
         if 'update' in self.commands:
             self.commands["update"]()
     # End of update_person
         
     def delete_person(self):
-        """Calls the controller to delete a person""" 
+        """Calls the controller to delete a person, or the rows selected in the table when no ID is typed""" 
+        if self.batch_selected("delete_selected"):
+            return
         if 'delete' in self.commands:
             self.commands["delete"]()
+    # End of delete_person
+    
+    def batch_selected(self, command: str) -> bool:
+        """Run the batch command if rows are selected and no ID is typed, return whether it ran"""
+        if self.identity_document_var.get().strip() or not self.data_table.selection():
+            return False
+        if command not in self.commands:
+            return False
+        self.commands[command]()
+        return True
+    # End of batch_selected
+    
+    def get_selected_ids(self) -> list[str]:
+        """Return the identity documents of the rows selected in the table"""
+        return list(self.data_table.selection())
+    # End of get_selected_ids
+    
+    def confirm(self, message: str) -> bool:
+        """Ask the user to confirm an action"""
+        return messagebox.askyesno("Confirm", message, parent=self.window)
+    # End of confirm
     
     def form_frame(self):
         """Creating the form frame"""
@@ -215,17 +322,18 @@ class PersonView:
         for i in range(5):
             crud_frame.grid_columnconfigure(i, weight=1)
         
-        # List of button configurations
+        # List of button configurations, with the name of the method each one calls
         buttons = [
-            ("Create", "#219ebc", self.create_person, 0, 0),
-            ("Read", "#8ecae6", self.read_person, 0, 1),
-            ("Update", "#ffb703", self.update_person, 0, 2),
-            ("Delete", "#fb8500", self.delete_person, 0, 3),
-            ("Clean", "#5c528f", self.clear_all_inputs, 0, 4)
+            ("Create", "#219ebc", "create_person", 0, 0),
+            ("Read", "#8ecae6", "read_person", 0, 1),
+            ("Update", "#ffb703", "update_person", 0, 2),
+            ("Delete", "#fb8500", "delete_person", 0, 3),
+            ("Clean", "#5c528f", "clear_all_inputs", 0, 4)
         ]
         
-        # Create buttons in a loop
-        for (name, color, command, row, column) in buttons:
+        # Create buttons in a loop. The method is looked up on every click, so a method
+        # replaced on the instance afterwards (e.g. timed by the GUI profiler) is the one called
+        for (name, color, method, row, column) in buttons:
             btn = ctk.CTkButton(
                 crud_frame,
                 text=name,
@@ -234,9 +342,10 @@ class PersonView:
                 text_color="black",
                 corner_radius=self.BUTTON_RADIUS,
                 width=self.BUTTON_WIDTH,
-                command=command
+                command=lambda method=method: getattr(self, method)()
             )
             btn.grid(row=row, column=column, padx=5, pady=3, sticky="nsew")
+            self.buttons[name.lower()] = btn
     
     def table(self):
         """Create and configure the Treeview table for displaying person data."""
@@ -244,23 +353,36 @@ class PersonView:
         # Create a frame to hold the Treeview and Scrollbar
         table_frame = ctk.CTkFrame(self.window, fg_color="transparent")
         table_frame.grid(row=2, column=0, pady=(10, 20), padx=20, sticky="nsew")
-        table_frame.grid_rowconfigure(0, weight=1)
+        table_frame.grid_rowconfigure(1, weight=1)
         table_frame.grid_columnconfigure(0, weight=1)
         
+        # Search box, filters the table as the user types
+        search_entry = ctk.CTkEntry(
+            table_frame,
+            textvariable=self.search_var,
+            placeholder_text="Search by ID, name, surname or address",
+            fg_color="transparent"
+        )
+        search_entry.grid(row=0, column=0, columnspan=2, pady=(0, 10), sticky="ew")
+        self.search_var.trace_add("write", self.on_search_changed)
+        
         # Columns definition (Matching model/DB order)
         columns = ("#", "ID Document", "Name", "Surname", "Address", "Phone Number")
         
+        # Several rows can be selected (shift/ctrl click) for batch Update and Delete
         self.data_table = ttk.Treeview(
             table_frame,
             columns=columns,
             show='headings',
-            height=10
+            height=10,
+            selectmode="extended"
         )
+        self.data_table.bind("<Delete>", lambda event: self.batch_selected("delete_selected"))
         
         #  Configure Scrollbar 
-        scrollbar = ctk.CTkScrollbar(table_frame, orientation="vertical", command=self.data_table.yview)
-        self.data_table.configure(yscrollcommand=scrollbar.set)
-        scrollbar.grid(row=0, column=1, sticky='ns')
+        self.table_scrollbar = ctk.CTkScrollbar(table_frame, orientation="vertical", command=self.data_table.yview)
+        self.data_table.configure(yscrollcommand=self.on_table_scroll)
+        self.table_scrollbar.grid(row=1, column=1, sticky='ns')
 
         # --- Configure Columns ---
         
@@ -270,20 +392,213 @@ class PersonView:
         
         # ID Document (Primary key field, often wider)
         self.data_table.column("ID Document", width=100, anchor="w")
-        self.data_table.heading("ID Document", text="ID Document")
-        
         self.data_table.column("Name", width=100, anchor="w")
-        self.data_table.heading("Name", text="Name")
-
         self.data_table.column("Surname", width=100, anchor="w")
-        self.data_table.heading("Surname", text="Surname")
-
         self.data_table.column("Address", width=120, anchor="w")
-        self.data_table.heading("Address", text="Address")
-
         self.data_table.column("Phone Number", width=100, anchor="w")
-        self.data_table.heading("Phone Number", text="Phone Number")
+        
+        # Clicking a heading sorts the table by that column, again reverses the order
+        for heading, column in self.TABLE_COLUMNS.items():
+            self.data_table.heading(heading, text=heading, command=lambda column=column: self.sort_table(column))
+        self.show_sort_indicator()
         
         # Grid the table inside the frame
-        self.data_table.grid(row=0, column=0, sticky="nsew")
-        
\ No newline at end of file
+        self.data_table.grid(row=1, column=0, sticky="nsew")
+    # End of table
+    
+    def reload_table(self):
+        """Ask for the first page of the table again, or re-run the search if there is one"""
+        if self.search_var.get().strip() and "search" in self.commands:
+            self.commands["search"](self.search_var.get().strip())
+            return
+        
+        if "load_page" in self.commands:
+            self._table_load_pending = True
+            self.commands["load_page"](None, None, self.TABLE_PAGE_SIZE, *self._table_sort)
+    # End of reload_table
+    
+    def sort_table(self, column: str):
+        """Sort the table by column, descending if it was already sorted ascending by it, from the first page"""
+        order_by, descending = self._table_sort
+        self._table_sort = (column, not descending if column == order_by else False)
+        self.show_sort_indicator()
+        self.reload_table()
+    # End of sort_table
+    
+    def show_sort_indicator(self):
+        """Mark the heading of the sort column with the direction of the order"""
+        order_by, descending = self._table_sort
+        for heading, column in self.TABLE_COLUMNS.items():
+            arrow = (" \u25bc" if descending else " \u25b2") if column == order_by else ""
+            self.data_table.heading(heading, text=heading + arrow)
+    # End of show_sort_indicator
+    
+    def on_table_scroll(self, first, last):
+        """
+        Mirror the table position in the scrollbar.
+        Near the bottom (or the top) schedule loading the next (or previous) page
+        """
+        self.table_scrollbar.set(first, last)
+        if self._table_load_pending:
+            return
+        
+        if float(last) >= 1 - self.TABLE_PREFETCH and not self._table_at_end:
+            forward = True
+        elif float(first) <= self.TABLE_PREFETCH and self._table_offset > 0:
+            forward = False
+        else:
+            return
+        self._table_load_pending = True
+        self.window.after_idle(self.load_table_page, forward)
+    # End of on_table_scroll
+    
+    def load_table_page(self, forward: bool = True):
+        """Ask the controller for the page after the last row, or before the first one"""
+        items = self.data_table.get_children()
+        if "load_page" not in self.commands or (not forward and not items):
+            self._table_load_pending = False
+            return
+        
+        if forward:
+            self.commands["load_page"](items[-1] if items else None, None, self.TABLE_PAGE_SIZE, *self._table_sort)
+        else:
+            self.commands["load_page"](None, items[0], self.TABLE_PAGE_SIZE, *self._table_sort)
+    # End of load_table_page
+    
+    def show_table_page(self, persons: list[Person], after_id: str | None, before_id: str | None):
+        """
+        Add a page of persons delivered by the controller to the table.
+        A first page (no after_id nor before_id) replaces the content. A page whose anchor row
+        is no longer at that end of the table is stale and dropped. Rows falling outside
+        TABLE_WINDOW_SIZE on the opposite end are removed, so the widget only ever holds
+        a window of the registry. A row the table already shows, e.g. changed in place by the change
+        feed in a table sorted by another column than the ID, is moved to its place in the page
+        """
+        self._table_load_pending = False
+        if after_id is None and before_id is None:
+            self.data_table.delete(*self.data_table.get_children())
+            self._table_offset = 0
+        
+        items = self.data_table.get_children()
+        if before_id is None:
+            if (items[-1] if items else None) != after_id:
+                return
+            self._table_at_end = len(persons) < self.TABLE_PAGE_SIZE
+            
+            number = self._table_offset + len(items)
+            moved = False
+            for person in persons:
+                number += 1
+                moved |= self.place_row("end", person, number)
+            
+            # Trim the top and scroll back so the visible rows stay in place
+            items = self.data_table.get_children()
+            overflow = len(items) - self.TABLE_WINDOW_SIZE
+            if overflow > 0:
+                self.data_table.delete(*items[:overflow])
+                self._table_offset += overflow
+                self.data_table.yview_scroll(-overflow, "units")
+        else:
+            if not items or items[0] != before_id:
+                return
+            self._table_offset = max(self._table_offset - len(persons), 0)
+            if len(persons) < self.TABLE_PAGE_SIZE:
+                self._table_offset = 0
+            
+            moved = False
+            for index, person in enumerate(persons):
+                moved |= self.place_row(index, person, self._table_offset + index + 1)
+            # Scrolled by the rows added above the visible ones, moved rows were already there
+            added = len(self.data_table.get_children()) - len(items)
+            self.data_table.yview_scroll(added, "units")
+            
+            # Trim the bottom, the next forward load will bring those rows back
+            items = self.data_table.get_children()
+            overflow = len(items) - self.TABLE_WINDOW_SIZE
+            if overflow > 0:
+                self.data_table.delete(*items[-overflow:])
+                self._table_at_end = False
+        
+        # A row left its old place, the ones after it moved up
+        if moved:
+            self.number_rows(self.data_table.get_children())
+    # End of show_table_page
+    
+    def place_row(self, index, person: Person, number: int) -> bool:
+        """Insert the row of person at index, or move it there if the table already shows it. Returns whether it moved"""
+        if self.data_table.exists(person.identity_document):
+            # move takes a number, one past the last row moves it to the end
+            self.data_table.move(person.identity_document, "", len(self.data_table.get_children()) if index == "end" else index)
+            self.data_table.item(person.identity_document, values=(number, *person))
+            return True
+        self.data_table.insert("", index, iid=person.identity_document, values=(number, *person))
+        return False
+    # End of place_row
+    
+    def number_rows(self, items: list[str]):
+        """Number the rows in table order, from the position of the first one in the registry"""
+        for number, identity_document in enumerate(items, start=self._table_offset + 1):
+            self.data_table.set(identity_document, "#", number)
+    # End of number_rows
+    
+    def apply_changes(self, changes: list[tuple[str, Person | None]]):
+        """
+        Apply (identity_document, person) changes from the change feed to the rows shown: changed rows
+        are updated in place, deleted ones (person None) removed and new ones inserted in ID order when
+        they fall inside the window of the registry on screen. Search results only get updates and
+        removals, whether a new person matches is up to the next search. The same goes for a table sorted
+        by another column than the ID, where changed rows also keep their place until the next reload.
+        The cost depends on the number of changes, not on the size of the registry
+        """
+        # New rows are only placed in a table of the whole registry in ID order
+        insert_new = not self.search_var.get().strip() and self._table_sort == ("identity_document", False)
+        items = list(self.data_table.get_children())
+        moved = False
+        for identity_document, person in changes:
+            if self.data_table.exists(identity_document):
+                if person is None:
+                    self.data_table.delete(identity_document)
+                    items.remove(identity_document)
+                    moved = True
+                else:
+                    number = self.data_table.set(identity_document, "#")
+                    self.data_table.item(identity_document, values=(number, *person))
+            elif person is not None and insert_new and self.in_table_window(identity_document, items):
+                position = bisect_left(items, identity_document)
+                self.data_table.insert("", position, iid=identity_document, values=(0, *person))
+                items.insert(position, identity_document)
+                moved = True
+        
+        # Rows were added or removed, number them again
+        if moved:
+            self.number_rows(items)
+    # End of apply_changes
+    
+    def in_table_window(self, identity_document: str, items: list[str]) -> bool:
+        """Whether identity_document falls between the first and last rows the table holds"""
+        after_first = self._table_offset == 0 or (items and identity_document > items[0])
+        before_last = self._table_at_end or (items and identity_document < items[-1])
+        return bool(after_first and before_last)
+    # End of in_table_window
+    
+    def on_search_changed(self, *args):
+        """Restart the debounce timer every time the search box changes"""
+        if self._search_job is not None:
+            self.window.after_cancel(self._search_job)
+        self._search_job = self.window.after(self.SEARCH_DEBOUNCE_MS, self.run_search)
+    # End of on_search_changed
+    
+    def run_search(self):
+        """Run the search for the current text, an empty search box shows the whole registry again"""
+        self._search_job = None
+        self.reload_table()
+    # End of run_search
+    
+    def show_search_results(self, persons: list[Person]):
+        """Replace the table content with the search matches, paging is off until the search is cleared"""
+        self.data_table.delete(*self.data_table.get_children())
+        self._table_offset = 0
+        self._table_at_end = True
+        for number, person in enumerate(persons, start=1):
+            self.data_table.insert("", "end", iid=person.identity_document, values=(number, *person))
+    # End of show_search_results
\ No newline at end of file